@@ -1,3 +1,48 @@
+from decimal import Decimal
+
 from django.test import TestCase
+from django.urls import reverse
+
+from cart.tests import make_products
+from orders.models import Order, OrderItem
+from .models import User
+from .views import ORDERS_PER_PAGE
+
+
+class OrderHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("shopper", "shopper@example.com", "pass")
+        cls.products = make_products(5)
+        for n in range(ORDERS_PER_PAGE + 3):
+            order = Order.objects.create(user=cls.user, total_price=Decimal("10.00"))
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, price=product.price) for product in cls.products[: n % 5 + 1]
+            ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_pages_newest_first(self):
+        response = self.client.get(reverse("accounts:profile"), secure=True)
+        page = response.context["orders"]
+        self.assertEqual(len(page), ORDERS_PER_PAGE)
+        self.assertEqual(page.paginator.count, ORDERS_PER_PAGE + 3)
+        newest = Order.objects.latest("pk")
+        self.assertEqual(page[0].pk, newest.pk)
+        self.assertEqual(page[0].item_count, newest.items.count())
+        self.assertEqual(page[0].first_item_name, "Product 0")
+
+        response = self.client.get(reverse("accounts:profile"), {"page": 2}, secure=True)
+        self.assertEqual(len(response.context["orders"]), 3)
 
-# Create your tests here.
+    def test_queries_do_not_grow_with_orders_or_items(self):
+        url = reverse("accounts:profile")
+        # session, user, count, one page of orders, its items with products
+        with self.assertNumQueries(5):
+            self.client.get(url, secure=True)
+        order = Order.objects.create(user=self.user, total_price=Decimal("10.00"))
+        OrderItem.objects.bulk_create([OrderItem(order=order, product=p, price=p.price) for p in self.products])
+        with self.assertNumQueries(5):
+            response = self.client.get(url, secure=True)
+        self.assertContains(response, "Product 0 and 4 more")
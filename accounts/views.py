@@ -3,11 +3,15 @@ from django.contrib.auth import login, logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from orders.services import order_history
 from .forms import SignUpForm, LoginForm, AddressForm
 from .models import Address
 
 User = get_user_model()
 
+ORDERS_PER_PAGE = 10
+
 # ---------------- Auth Views ----------------
 def signup_view(request):
     if request.method == 'POST':
@@ -51,7 +55,7 @@ def logout_view(request):
 @login_required
 def profile_view(request):
     user = request.user
-    orders = user.orders.all().order_by("-created_at") if hasattr(user, 'orders') else []
+    orders = Paginator(order_history(user), ORDERS_PER_PAGE).get_page(request.GET.get("page"))
     addresses = user.addresses.all()  # Fetch all addresses for the profile
     return render(request, "accounts/profile.html", {"user": user, "orders": orders, "addresses": addresses})
 
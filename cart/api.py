@@ -0,0 +1,108 @@
+# cart/api.py
+"""
+JSON cart API for the cart page.
+
+A POST carries a batch of line operations:
+
+    {"ops": [{"op": "set", "product_id": 3, "quantity": 2},
+             {"op": "add", "product_id": 7},
+             {"op": "remove", "product_id": 9}]}
+
+The batch is checked as a whole before anything changes: the operations
+are validated, then every product id with one query. If any of it is
+invalid, nothing is applied and the errors come back with a 400. A valid
+batch is applied in order and answered with cart_state(), which prices
+the cart in a single pass.
+"""
+from products.models import Product
+
+OPS = ("add", "set", "remove")
+# "set" needs an explicit quantity; 0 removes the line.
+DEFAULT_QUANTITY = {"add": 1, "remove": 0}
+MAX_OPS = 100
+
+
+class InvalidOperations(Exception):
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+def _parse(n, op):
+    if not isinstance(op, dict) or op.get("op") not in OPS:
+        raise ValueError(f"ops[{n}]: op must be one of {', '.join(OPS)}")
+    try:
+        product_id = int(op.get("product_id"))
+        quantity = int(op.get("quantity", DEFAULT_QUANTITY.get(op["op"])))
+    except (TypeError, ValueError):
+        raise ValueError(f"ops[{n}]: product_id and quantity must be integers")
+    if quantity < 0 or (op["op"] == "add" and quantity < 1):
+        raise ValueError(f"ops[{n}]: quantity out of range")
+    return op["op"], product_id, quantity
+
+
+def parse_ops(payload):
+    """
+    [(op, product id, quantity)] from a decoded request body; raises
+    InvalidOperations listing every bad operation.
+    """
+    ops = payload.get("ops") if isinstance(payload, dict) else None
+    if not isinstance(ops, list) or not ops:
+        raise InvalidOperations(["ops must be a non-empty list"])
+    if len(ops) > MAX_OPS:
+        raise InvalidOperations([f"at most {MAX_OPS} ops per request"])
+
+    parsed, errors = [], []
+    for n, op in enumerate(ops):
+        try:
+            parsed.append(_parse(n, op))
+        except ValueError as exc:
+            errors.append(str(exc))
+    if errors:
+        raise InvalidOperations(errors)
+    return parsed
+
+
+def apply_ops(cart, ops):
+    """
+    Apply parsed ``ops`` to ``cart`` after checking all their product ids
+    with one query. The result goes in with one Cart.update(), so stock
+    holds are taken for the whole batch at once.
+    """
+    products = Product.objects.only("id", *Product.PRICE_FIELDS).in_bulk({product_id for _, product_id, _ in ops})
+    missing = sorted({product_id for _, product_id, _ in ops} - products.keys())
+    if missing:
+        raise InvalidOperations([f"unknown product_id {product_id}" for product_id in missing])
+
+    quantities = {}
+    for op, product_id, quantity in ops:
+        product = products[product_id]
+        if op == "add":
+            quantity += quantities.get(product, cart.lines.get(product_id, 0))
+        quantities[product] = quantity
+    cart.update(quantities)
+
+
+def cart_state(cart, changes=()):
+    """
+    Every line with its price and total, the cart totals and the price
+    changes found by Cart.revalidate().
+    """
+    pricing = cart.pricing()
+    return {
+        "price_changes": [
+            {"product_id": change.product_id, "name": change.name, "old": float(change.old), "new": float(change.new)}
+            for change in changes
+        ],
+        "lines": [
+            {
+                "product_id": line.product.id,
+                "name": line.product.name,
+                "quantity": line.quantity,
+                "price": float(line.price),
+                "total_price": float(line.total_price),
+            }
+            for line in pricing.lines
+        ],
+        **pricing.as_dict(),
+    }
@@ -1,113 +1,212 @@
 # cart/cart.py
+import secrets
+from dataclasses import dataclass
 from decimal import Decimal
+
+from django.conf import settings
+from django.contrib import messages
+
+from core.cache import get_version
+from products.inventory import OutOfStock, available_stock, hold_stock, release_holds
 from products.models import Product
+from .pricing import price_cart, to_cents
+from .stores import get_store
+
+HOLD_SESSION_KEY = "cart_hold"
+
+
+@dataclass(frozen=True)
+class PriceChange:
+    product_id: int
+    name: str
+    old: Decimal
+    new: Decimal
+
 
 class Cart:
     def __init__(self, request):
         """
-        Initialize the cart from the session.
+        Initialize the cart from the request's cart store.
         """
-        self.session = request.session
-        cart = self.session.get("cart")
-        if not cart:
-            cart = self.session["cart"] = {}
-        self.cart = cart
+        self.store = get_store(request)
+        self.lines = self.store.load()
+        self.prices = self.store.prices
+        self._pricing = None
+
+    @property
+    def holder(self):
+        """
+        The key this cart's stock holds are kept under, or None when
+        STOCK_HOLDS is off. Kept in the session so it survives login.
+        """
+        if not settings.STOCK_HOLDS:
+            return None
+        session = self.store.session
+        if HOLD_SESSION_KEY not in session:
+            session[HOLD_SESSION_KEY] = secrets.token_urlsafe(16)
+        return session[HOLD_SESSION_KEY]
 
     def add(self, product, quantity=1, override_quantity=False):
         """
         Add a product to the cart or update its quantity.
-        Price is stored as string for JSON serialization.
         """
-        product_id = str(product.id)
-        if product_id not in self.cart:
-            self.cart[product_id] = {"quantity": 0, "price": str(product.price)}
-
-        if override_quantity:
-            self.cart[product_id]["quantity"] = quantity
-        else:
-            self.cart[product_id]["quantity"] += quantity
-
-        self.save()
+        if not override_quantity:
+            quantity += self.lines.get(product.id, 0)
+        self.update({product: quantity})
 
     def remove(self, product):
         """
         Remove a product from the cart.
         """
-        product_id = str(product.id)
-        if product_id in self.cart:
-            del self.cart[product_id]
+        if product.id in self.lines:
+            self.update({product: 0})
+
+    def update(self, quantities):
+        """
+        Set the quantity of several lines at once ({product: quantity}; 0
+        removes the line). A new line remembers the price the shopper saw.
+        With STOCK_HOLDS on, the stock is held in one batch first, and
+        OutOfStock leaves the cart unchanged.
+        """
+        if self.holder:
+            hold_stock(self.holder, {product.id: quantity for product, quantity in quantities.items()})
+        if not self.lines:
+            # Every snapshot in a new cart is current.
+            self.store.checked = get_version("prices")
+        for product, quantity in quantities.items():
+            if quantity > 0:
+                self.prices.setdefault(product.id, to_cents(product.sale_price))
+                self.lines[product.id] = quantity
+            else:
+                self.lines.pop(product.id, None)
+                self.prices.pop(product.id, None)
+        self.save()
+
+    def hold_all(self):
+        """
+        Hold stock for every line, e.g. once the saved cart has been merged
+        in at login. Lines short of stock are cut to what is available, or
+        dropped; returns {product id: new quantity} for those.
+        """
+        trimmed = {}
+        while self.holder and self.lines:
+            try:
+                hold_stock(self.holder, dict(self.lines))
+                break
+            except OutOfStock as exc:
+                available = available_stock(exc.product_ids, self.holder)
+                for product_id in exc.product_ids:
+                    trimmed[product_id] = quantity = available.get(product_id, 0)
+                    if quantity > 0:
+                        self.lines[product_id] = quantity
+                    else:
+                        self.lines.pop(product_id, None)
+                        self.prices.pop(product_id, None)
+        if trimmed:
             self.save()
+        return trimmed
 
     def clear(self):
         """
-        Remove all items from the cart.
+        Remove all items from the cart and release its stock holds.
+        """
+        if self.holder:
+            release_holds(self.holder)
+        self.lines.clear()
+        self.prices.clear()
+        self.save(sync=True)
+
+    def save(self, sync=False):
+        """
+        Mark the cart as changed and drop any cached pricing.
         """
-        self.session["cart"] = {}
+        self.store.save(sync)
+        self._pricing = None
+
+    def revalidate(self):
+        """
+        Compare every line's price snapshot with the catalog and refresh it;
+        returns a PriceChange for each line whose price moved. Runs one query,
+        and only when the "prices" version has moved since the last check.
+        """
+        version = get_version("prices")
+        if not self.lines or self.store.checked == version:
+            return []
+
+        changes = []
+        current = Product.objects.filter(id__in=self.lines).values_list("id", "name", "price", "discount_price")
+        current = {product_id: (name, discount_price or price) for product_id, name, price, discount_price in current}
+        for product_id in self.lines:
+            if product_id not in current:
+                continue
+            name, price = current[product_id]
+            cents, seen = to_cents(price), self.prices.get(product_id)
+            if seen is not None and seen != cents:
+                changes.append(PriceChange(product_id, name, Decimal(seen).scaleb(-2), price))
+            self.prices[product_id] = cents
+        self.store.checked = version
         self.save()
+        return changes
 
-    def save(self):
+    def pricing(self):
         """
-        Mark the session as modified.
+        Price the whole cart once and reuse the result until it changes.
         """
-        self.session.modified = True
+        if self._pricing is None:
+            self._pricing = price_cart(self.lines)
+        return self._pricing
 
     def __iter__(self):
         """
-        Iterate over items in the cart and attach Product instances.
-        Convert price from string to Decimal for calculations, but do not save Decimal in session.
+        Iterate over priced cart lines (product, quantity, price, total_price).
         """
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-        cart_copy = self.cart.copy()  # avoid modifying session
-
-        for product in products:
-            product_id = str(product.id)
-            item = cart_copy[product_id]
-            item["product"] = product
-            item["price"] = Decimal(item["price"])
-            item["total_price"] = item["price"] * item["quantity"]
-            yield item
+        return iter(self.pricing().lines)
 
     def __len__(self):
         """
         Count total quantity of all items in the cart.
         """
-        return sum(item["quantity"] for item in self.cart.values())
+        return sum(self.lines.values())
 
     def subtotal(self):
         """
         Total price of all items before tax and shipping.
         """
-        return sum(item["total_price"] for item in self.__iter__())
+        return self.pricing().subtotal
 
     def shipping(self):
         """
         Flat shipping fee; return 0 if cart is empty.
         """
-        return Decimal("10.00") if len(self) > 0 else Decimal("0.00")
+        return self.pricing().shipping
 
-    def tax(self, tax_rate=0.1):
+    def tax(self):
         """
-        Calculate tax (default 10%).
+        Calculate tax (10%).
         """
-        return self.subtotal() * Decimal(tax_rate)
+        return self.pricing().tax
 
     def total(self):
         """
         Total including subtotal + shipping + tax.
         """
-        return self.subtotal() + self.shipping() + self.tax()
+        return self.pricing().total
 
     def as_dict(self):
         """
         Return cart totals as JSON-serializable dict (for AJAX).
         """
-        return {
-            "subtotal": float(self.subtotal()),
-            "shipping": float(self.shipping()),
-            "tax": float(self.tax()),
-            "total": float(self.total()),
-            "count": self.__len__(),
-        }
+        return self.pricing().as_dict()
 
 
+def check_prices(request, cart):
+    """
+    Revalidate ``cart`` and tell the shopper about every changed price;
+    returns the changes.
+    """
+    changes = cart.revalidate()
+    for change in changes:
+        messages.warning(
+            request, f"The price of {change.name} changed from Rs. {change.old:.2f} to Rs. {change.new:.2f}."
+        )
+    return changes
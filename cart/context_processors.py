@@ -1,22 +1,58 @@
+from decimal import Decimal
+
+from django.utils.functional import cached_property, lazy
+
 from products.models import Product
+from .stores import get_store
 
-def cart_summary(request):
-    cart = request.session.get("cart", {})
-    count = 0
-    total = 0
-
-    for pid, item in cart.items():
-        try:
-            product = Product.objects.get(id=pid)
-            qty = int(item.get("quantity", 0))
-            count += qty
-            total += product.price * qty
-        except Product.DoesNotExist:
-            continue
 
-    return {
-        "cart_item_count": count,
-        "cart_total_amount": total,
-    }
+class CartSummary:
+    """
+    Cart badge totals for the current request.
+
+    Nothing is queried until a value is read; the first read prices every
+    line with a single ``id__in`` query and the result is kept for the
+    rest of the request.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    @cached_property
+    def totals(self):
+        quantities = get_store(self.request).load()
+        count = 0
+        total = Decimal("0.00")
+        if quantities:
+            prices = Product.objects.filter(id__in=quantities).values_list("id", "price", "discount_price")
+            for pid, price, discount_price in prices:
+                qty = quantities[pid]
+                count += qty
+                total += (discount_price or price) * qty
+        return count, total
 
+    @property
+    def item_count(self):
+        return self.totals[0]
 
+    @property
+    def total_amount(self):
+        return self.totals[1]
+
+
+def get_cart_summary(request):
+    """
+    Return the request's CartSummary, creating it on first use.
+    """
+    summary = getattr(request, "_cart_summary", None)
+    if summary is None:
+        summary = request._cart_summary = CartSummary(request)
+    return summary
+
+
+def cart_summary(request):
+    summary = get_cart_summary(request)
+    return {
+        "cart_item_count": lazy(lambda: summary.item_count, int)(),
+        "cart_total_amount": lazy(lambda: summary.total_amount, Decimal)(),
+    }
@@ -60,7 +60,13 @@ class Product(models.Model):
 # Cart + CartItem
 # ------------------------------
 class Cart(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, blank=True, null=True)
+    """
+    A logged-in user's saved cart; written behind from the live cart by
+    cart.persistence.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, related_name="saved_cart", on_delete=models.CASCADE, blank=True, null=True
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     def subtotal(self):
@@ -81,9 +87,15 @@ class Cart(models.Model):
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name="items", on_delete=models.CASCADE)
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    product = models.ForeignKey("products.Product", on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            # One row per product, so a whole cart saves as one upsert.
+            models.UniqueConstraint(fields=["cart", "product"], name="cart_item_unique_product"),
+        ]
+
     def subtotal(self):
         return self.product.price * self.quantity
 
@@ -0,0 +1,55 @@
+# cart/persistence.py
+"""
+Saved carts for logged-in users (cart.models.Cart/CartItem).
+
+The live cart stays in the CART_STORE store; these functions copy it to
+the database in one batch, so it survives logout and follows the user to
+other devices. merge_cart() runs once per login session, save_cart()
+whenever cart.stores.UserCartStore decides a write is due.
+"""
+from django.db import transaction
+
+from products.models import Product
+from .models import Cart as SavedCart, CartItem
+
+
+def _existing(lines):
+    # Session carts can name products deleted since they were added.
+    return set(Product.objects.filter(id__in=lines).values_list("id", flat=True)) if lines else set()
+
+
+def _upsert(cart, lines):
+    CartItem.objects.bulk_create(
+        [CartItem(cart=cart, product_id=pid, quantity=quantity) for pid, quantity in lines.items()],
+        update_conflicts=True, unique_fields=["cart", "product"], update_fields=["quantity"],
+    )
+
+
+@transaction.atomic
+def merge_cart(user, lines):
+    """
+    Add ``lines`` ({product id: quantity}) to the user's saved cart with a
+    single upsert; returns the merged {product id: quantity}, saved lines
+    first.
+    """
+    cart, _ = SavedCart.objects.get_or_create(user=user)
+    merged = dict(CartItem.objects.filter(cart=cart).order_by("pk").values_list("product_id", "quantity"))
+    existing = _existing(lines)
+    added = {pid: merged.get(pid, 0) + quantity for pid, quantity in lines.items() if pid in existing}
+    if added:
+        _upsert(cart, added)
+        merged.update(added)
+    return merged
+
+
+@transaction.atomic
+def save_cart(user, lines):
+    """
+    Make the user's saved cart match ``lines``: one DELETE for dropped
+    lines and one upsert for the rest.
+    """
+    cart, _ = SavedCart.objects.get_or_create(user=user)
+    existing = _existing(lines)
+    CartItem.objects.filter(cart=cart).exclude(product_id__in=existing).delete()
+    if existing:
+        _upsert(cart, {pid: quantity for pid, quantity in lines.items() if pid in existing})
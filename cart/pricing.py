@@ -0,0 +1,95 @@
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from products.models import Product
+
+SHIPPING_FEE = Decimal("10.00")
+TAX_RATE = Decimal("0.10")
+ZERO = Decimal("0.00")
+
+
+def to_cents(amount):
+    """
+    An amount (Decimal or string) as whole cents, as carts store prices.
+    """
+    return int(Decimal(str(amount)) * 100)
+
+
+@dataclass(frozen=True)
+class CartLine:
+    product: Product
+    quantity: int
+    price: Decimal
+    total_price: Decimal
+
+
+@dataclass(frozen=True)
+class PriceBreakdown:
+    """
+    Immutable result of pricing a cart: every line plus the order totals.
+    """
+    lines: tuple = field(default_factory=tuple)
+    subtotal: Decimal = ZERO
+    shipping: Decimal = ZERO
+    tax: Decimal = ZERO
+    total: Decimal = ZERO
+    count: int = 0
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def as_dict(self):
+        """
+        JSON-serializable totals (for AJAX).
+        """
+        return {
+            "subtotal": float(self.subtotal),
+            "shipping": float(self.shipping),
+            "tax": float(self.tax),
+            "total": float(self.total),
+            "count": self.count,
+        }
+
+
+def price_cart(quantities, queryset=None):
+    """
+    Price a cart ({product id: quantity}) in a single pass.
+
+    Products are loaded with one ``id__in`` query; lines whose product no
+    longer exists are dropped. Line prices come from the catalog, so the
+    cart page, checkout and the created order all agree. Lines are charged
+    the product's sale_price.
+    """
+    if not quantities:
+        return PriceBreakdown()
+
+    if queryset is None:
+        queryset = Product.objects.all()
+    products = queryset.in_bulk(quantities)
+
+    lines = []
+    subtotal = ZERO
+    count = 0
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if product is None:
+            continue
+        price = product.sale_price
+        total_price = price * quantity
+        lines.append(CartLine(product, quantity, price, total_price))
+        subtotal += total_price
+        count += quantity
+
+    shipping = SHIPPING_FEE if lines else ZERO
+    tax = (subtotal * TAX_RATE).quantize(Decimal("0.01"))
+    return PriceBreakdown(
+        lines=tuple(lines),
+        subtotal=subtotal,
+        shipping=shipping,
+        tax=tax,
+        total=subtotal + shipping + tax,
+        count=count,
+    )
@@ -0,0 +1,44 @@
+# cart/signals.py
+"""
+Move the live cart between the session and the user's saved cart at
+login and logout.
+"""
+from django.contrib import messages
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.dispatch import receiver
+
+from products.models import Product
+from .cart import Cart
+from .stores import UserCartStore, get_store
+
+
+@receiver(user_logged_in)
+def merge_saved_cart(sender, request, user, **kwargs):
+    """
+    Merge the anonymous cart into the user's saved cart now, so the page
+    after login shows both. With STOCK_HOLDS on, the saved lines are held
+    too; any the stock no longer covers are cut down, with a message.
+    """
+    store = getattr(request, "_cart_store", None)
+    if store is not None and not isinstance(store, UserCartStore):
+        store.flush()
+    store = request._cart_store = UserCartStore(request, user)
+    store.load()
+    trimmed = Cart(request).hold_all()
+    for name in Product.objects.filter(id__in=trimmed).values_list("name", flat=True):
+        messages.error(request, f"Sorry, not enough {name} is left in stock.", fail_silently=True)
+    store.flush()
+
+
+@receiver(user_logged_out)
+def save_cart_on_logout(sender, request, user, **kwargs):
+    """
+    Save unsaved changes before logout clears the session.
+    """
+    if user is None:
+        return
+    store = getattr(request, "_cart_store", None) or UserCartStore(request, user)
+    if isinstance(store, UserCartStore):
+        store.load()
+        store.flush(sync=True)
+    request._cart_store = None
@@ -0,0 +1,284 @@
+# cart/stores.py
+"""
+Where the cart lives between requests.
+
+A store hands Cart a {product id: quantity} dict and persists it once per
+request: mutations only mark the store dirty, and CartStoreMiddleware
+flushes it after the view, so a view adding ten products writes once and
+a request that changes nothing (or changes and reverts) writes nothing.
+
+Carts are kept compact: {"i": [ids], "q": [quantities], "p": [prices],
+"v": version}. Prices are the shopper's last seen price of each line, in
+cents, and "v" the catalog price version they were checked against (see
+Cart.revalidate). Carts saved in the old
+{"<id>": {"quantity": n, "price": "..."}} session format are read as well
+and rewritten on the next flush.
+
+SessionCartStore keeps the cart in the session. CacheCartStore keeps it
+in the cache under a random token, so only the first mutation touches the
+session row. Pick one with the CART_STORE setting.
+
+Logged-in users get a UserCartStore: the same store, written behind to
+their saved cart (cart.persistence) at most every CART_SYNC_SECONDS, and
+right away when the cart is emptied or they log out.
+"""
+import secrets
+import time
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from .persistence import merge_cart, save_cart
+from .pricing import to_cents
+
+CACHE_KEY = "cart:{}"
+TOKEN_SESSION_KEY = "cart_token"
+SYNC_SESSION_KEY = "cart_sync"
+
+
+def encode(lines, prices=None, checked=None):
+    """
+    Compact form of {product id: quantity}, with {product id: cents} price
+    snapshots and the price version they were checked against.
+    """
+    data = {"i": list(lines), "q": list(lines.values())}
+    if prices:
+        data["p"] = [prices.get(pid) for pid in lines]
+    if checked is not None:
+        data["v"] = checked
+    return data
+
+
+def decode(data):
+    """
+    {product id: quantity} from the compact or the old session format;
+    malformed lines are dropped.
+    """
+    if not data:
+        return {}
+    if "i" in data and "q" in data:
+        pairs = zip(data["i"], data["q"])
+    else:
+        pairs = ((pid, item.get("quantity", 0)) for pid, item in data.items() if isinstance(item, dict))
+    lines = {}
+    for pid, quantity in pairs:
+        try:
+            pid, quantity = int(pid), int(quantity)
+        except (TypeError, ValueError):
+            continue
+        if quantity > 0:
+            lines[pid] = quantity
+    return lines
+
+
+def decode_prices(data, lines):
+    """
+    ({product id: cents}, checked version) for the decoded ``lines``.
+    """
+    if not data:
+        return {}, None
+    if "i" in data and "q" in data:
+        pairs = zip(data["i"], data.get("p", ()))
+        checked = data.get("v")
+    else:
+        pairs = ((pid, item.get("price")) for pid, item in data.items() if isinstance(item, dict))
+        checked = None
+    prices = {}
+    for pid, price in pairs:
+        try:
+            pid, cents = int(pid), price if isinstance(price, int) else to_cents(price)
+        except (ArithmeticError, TypeError, ValueError):
+            continue
+        if pid in lines:
+            prices[pid] = cents
+    return prices, checked
+
+
+class CartStore(ABC):
+    """
+    Loads the cart once per request and writes it back only if it changed.
+    """
+
+    def __init__(self, request):
+        self.session = request.session
+        self.prices = {}
+        self.checked = None
+        self._lines = None
+        self._saved = None
+
+    def load(self):
+        """
+        The request's {product id: quantity}; mutate it (and ``prices``
+        and ``checked``) in place and call save().
+        """
+        if self._lines is None:
+            data, in_place = self.read()
+            self._lines = decode(data)
+            self.prices, self.checked = decode_prices(data, self._lines)
+            self._saved = self.encode() if in_place else None
+        return self._lines
+
+    def encode(self):
+        return encode(self._lines, self.prices, self.checked)
+
+    def save(self, sync=False):
+        """
+        Mark the cart as changed; the write happens in flush(). ``sync``
+        asks for any saved copy to be updated in the same flush.
+        """
+        self.load()
+
+    def flush(self):
+        """
+        Write the cart if it differs from what was loaded; returns the
+        written data, or None.
+        """
+        if self._lines is None:
+            return None
+        data = self.encode()
+        if data == self._saved:
+            return None
+        self.write(data)
+        self._saved = data
+        return data
+
+    @abstractmethod
+    def read(self):
+        """
+        (stored data, whether it is already compact and where it belongs).
+        """
+
+    @abstractmethod
+    def write(self, data):
+        """
+        Persist ``data`` in the compact format; no lines means delete.
+        """
+
+
+class SessionCartStore(CartStore):
+    def read(self):
+        data = self.session.get(settings.CART_SESSION_ID)
+        return data, not data or "i" in data
+
+    def write(self, data):
+        if data["i"]:
+            self.session[settings.CART_SESSION_ID] = data
+        else:
+            self.session.pop(settings.CART_SESSION_ID, None)
+
+
+class CacheCartStore(CartStore):
+    """
+    The cart in the cache, keyed by a token kept in the session. A cart
+    still in the session (either format) moves to the cache on first
+    flush.
+    """
+
+    def read(self):
+        token = self.session.get(TOKEN_SESSION_KEY)
+        data = cache.get(CACHE_KEY.format(token)) if token else None
+        if data is not None:
+            return data, True
+        legacy = self.session.get(settings.CART_SESSION_ID)
+        return legacy, not legacy
+
+    def write(self, data):
+        self.session.pop(settings.CART_SESSION_ID, None)
+        token = self.session.get(TOKEN_SESSION_KEY)
+        if not data["i"]:
+            if token:
+                cache.delete(CACHE_KEY.format(token))
+            return
+        if token is None:
+            token = self.session[TOKEN_SESSION_KEY] = secrets.token_urlsafe(16)
+        cache.set(CACHE_KEY.format(token), data, settings.SESSION_COOKIE_AGE)
+
+
+class UserCartStore(CartStore):
+    """
+    A logged-in user's cart: kept in the CART_STORE store, merged with the
+    saved cart on the first load of a login session, and saved back once
+    it has had unsaved changes for CART_SYNC_SECONDS.
+
+    The session holds [user id, time of the oldest unsaved change or None],
+    so it is written only when the cart goes from saved to unsaved and back.
+    """
+
+    def __init__(self, request, user):
+        super().__init__(request)
+        self.user = user
+        self.buffer = import_string(settings.CART_STORE)(request)
+        self.dirty_since = None
+        self._synced = None
+        self._sync = False
+
+    def read(self):
+        state = self.session.get(SYNC_SESSION_KEY)
+        if state and state[0] == self.user.pk:
+            self.dirty_since = state[1]
+            data, in_place = self.buffer.read()
+            self._synced = encode(decode(data)) if self.dirty_since is None else None
+            return data, in_place
+        data, _ = self.buffer.read()
+        self._synced = encode(merge_cart(self.user, decode(data)))
+        return self._synced, False
+
+    def write(self, data):
+        self.buffer.write(data)
+
+    def save(self, sync=False):
+        super().save()
+        self._sync = self._sync or sync
+
+    def flush(self, sync=False):
+        if self._lines is None:
+            return None
+        data = super().flush()
+        now = int(time.time())
+        if self.dirty_since is None and encode(self._lines) != self._synced:
+            self.dirty_since = now
+        if self.dirty_since is not None and (
+            sync or self._sync or now - self.dirty_since >= settings.CART_SYNC_SECONDS
+        ):
+            save_cart(self.user, self._lines)
+            self._synced = encode(self._lines)
+            self.dirty_since = None
+        self._sync = False
+        state = [self.user.pk, self.dirty_since]
+        if self.session.get(SYNC_SESSION_KEY) != state:
+            self.session[SYNC_SESSION_KEY] = state
+        return data
+
+
+def get_store(request):
+    """
+    The request's cart store, shared by every Cart built for it.
+    """
+    store = getattr(request, "_cart_store", None)
+    if store is None:
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            store = UserCartStore(request, user)
+        else:
+            store = import_string(settings.CART_STORE)(request)
+        request._cart_store = store
+    return store
+
+
+class CartStoreMiddleware:
+    """
+    Flush the cart store once, after the view. Must come after
+    SessionMiddleware so session writes are saved with the response.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        store = getattr(request, "_cart_store", None)
+        if store is not None:
+            store.flush()
+        return response
@@ -1,3 +1,427 @@
-from django.test import TestCase
+from dataclasses import FrozenInstanceError
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User
+from products.models import Category, Product
+from .cart import Cart
+from .context_processors import cart_summary
+from .models import Cart as SavedCart, CartItem
+from .stores import CACHE_KEY, TOKEN_SESSION_KEY, CartStore, decode, encode, get_store
+
+
+def make_products(count, price="10.00", stock=100):
+    category, _ = Category.objects.get_or_create(name="Test")
+    return Product.objects.bulk_create([
+        Product(category=category, name=f"Product {i}", slug=f"product-{i}",
+                price=Decimal(price), stock=stock, image="products/test.jpg")
+        for i in range(count)
+    ])
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def make_request(self, products, quantity=2):
+        request = self.factory.get("/")
+        request.session = {"cart": {
+            str(p.id): {"quantity": quantity, "price": str(p.price)} for p in products
+        }}
+        return request
+
+    def test_no_queries_until_read(self):
+        request = self.make_request(make_products(3))
+        with self.assertNumQueries(0):
+            cart_summary(request)
+
+    def test_empty_cart_costs_nothing(self):
+        request = self.make_request([])
+        with self.assertNumQueries(0):
+            context = cart_summary(request)
+            self.assertEqual(int(context["cart_item_count"]), 0)
+
+    def test_query_count_constant_as_cart_grows(self):
+        products = make_products(30)
+        for size in (1, 5, 30):
+            request = self.make_request(products[:size])
+            with self.assertNumQueries(1):
+                context = cart_summary(request)
+                self.assertEqual(int(context["cart_item_count"]), size * 2)
+                self.assertEqual(Decimal(str(context["cart_total_amount"])), Decimal("20.00") * size)
+                # Memoized for the rest of the request.
+                str(cart_summary(request)["cart_total_amount"])
+
+    def test_missing_products_are_skipped(self):
+        products = make_products(2)
+        request = self.make_request(products)
+        products[0].delete()
+        context = cart_summary(request)
+        self.assertEqual(int(context["cart_item_count"]), 2)
+        self.assertEqual(Decimal(str(context["cart_total_amount"])), Decimal("20.00"))
+
+
+class CartPricingTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.products = make_products(5, price="12.50")
+        request = self.factory.get("/")
+        request.session = SessionStore()
+        self.cart = Cart(request)
+        for product in self.products:
+            self.cart.add(product, quantity=2)
+
+    def test_one_catalog_query_for_all_totals(self):
+        with self.assertNumQueries(1):
+            lines = list(self.cart)
+            self.cart.subtotal()
+            self.cart.shipping()
+            self.cart.tax()
+            self.cart.total()
+            self.cart.as_dict()
+        self.assertEqual(len(lines), 5)
+
+    def test_breakdown_values(self):
+        pricing = self.cart.pricing()
+        self.assertEqual(pricing.subtotal, Decimal("125.00"))
+        self.assertEqual(pricing.shipping, Decimal("10.00"))
+        self.assertEqual(pricing.tax, Decimal("12.50"))
+        self.assertEqual(pricing.total, Decimal("147.50"))
+        self.assertEqual(pricing.count, 10)
+        self.assertEqual(pricing.lines[0].total_price, Decimal("25.00"))
+        with self.assertRaises(FrozenInstanceError):
+            pricing.total = Decimal("0")
+
+    def test_mutation_reprices(self):
+        self.cart.pricing()
+        self.cart.remove(self.products[0])
+        self.assertEqual(self.cart.pricing().subtotal, Decimal("100.00"))
+
+    def test_empty_cart(self):
+        self.cart.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cart.as_dict()["total"], 0.0)
+
+    def test_cart_detail_renders(self):
+        session = self.client.session
+        session["cart"] = {str(p.id): {"quantity": 1, "price": str(p.price)} for p in self.products}
+        session.save()
+        response = self.client.get(reverse("cart:cart_detail"), secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["total"], Decimal("78.75"))
+
+
+class CartStoreTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = make_products(3)
+
+    def add(self, product, quantity=1):
+        return self.client.post(reverse("cart:cart_add", args=[product.id]), {"quantity": quantity}, secure=True)
+
+    def legacy_cart(self):
+        session = self.client.session
+        session["cart"] = {str(p.id): {"quantity": 2, "price": str(p.price)} for p in self.products}
+        session.save()
+
+    def test_incomplete_store_fails_on_creation(self):
+        class ReadOnlyStore(CartStore):
+            def read(self):
+                return None, True
+
+        request = RequestFactory().get("/")
+        request.session = SessionStore()
+        with self.assertRaises(TypeError):
+            ReadOnlyStore(request)
+
+    def test_encoding(self):
+        ids = [p.id for p in self.products]
+        self.assertEqual(encode({ids[0]: 2, ids[1]: 1}), {"i": ids[:2], "q": [2, 1]})
+        self.assertEqual(decode(encode({ids[0]: 2})), {ids[0]: 2})
+        self.assertEqual(decode({str(ids[0]): {"quantity": 3, "price": "1.00"}, "x": {"quantity": 1}}), {ids[0]: 3})
+
+    def test_session_cart_is_compact(self):
+        self.add(self.products[0], 2)
+        self.add(self.products[1])
+        self.add(self.products[0])
+        data = self.client.session["cart"]
+        self.assertEqual(data["i"], [self.products[0].id, self.products[1].id])
+        self.assertEqual((data["q"], data["p"]), ([3, 1], [1000, 1000]))
+
+    def test_legacy_session_cart_is_rewritten(self):
+        self.legacy_cart()
+        response = self.client.get(reverse("cart:cart_detail"), secure=True)
+        self.assertEqual(response.context["total"], Decimal("76.00"))
+        data = self.client.session["cart"]
+        self.assertEqual((data["i"], data["q"]), ([p.id for p in self.products], [2, 2, 2]))
+        self.assertEqual(data["p"], [1000, 1000, 1000])
+
+    def test_unchanged_cart_is_not_written(self):
+        self.add(self.products[0])
+        request = RequestFactory().get("/")
+        request.session = self.client.session
+        cart = Cart(request)
+        cart.add(self.products[1])
+        cart.remove(self.products[1])
+        self.assertIsNone(get_store(request).flush())
+        self.assertFalse(request.session.modified)
+
+    def test_one_write_per_request(self):
+        request = RequestFactory().get("/")
+        request.session = SessionStore()
+        for product in self.products:
+            Cart(request).add(product)
+        store = get_store(request)
+        self.assertEqual(store.flush()["q"], [1, 1, 1])
+        self.assertIsNone(store.flush())
+
+    @override_settings(CART_STORE="cart.stores.CacheCartStore")
+    def test_cache_store(self):
+        self.add(self.products[0], 2)
+        token = self.client.session[TOKEN_SESSION_KEY]
+        self.assertNotIn("cart", self.client.session)
+        data = cache.get(CACHE_KEY.format(token))
+        self.assertEqual((data["i"], data["q"]), ([self.products[0].id], [2]))
+
+        # Later mutations leave the session row alone.
+        session_data = self.client.session.session_key, dict(self.client.session)
+        self.add(self.products[1])
+        self.assertEqual((self.client.session.session_key, dict(self.client.session)), session_data)
+        response = self.client.get(reverse("cart:cart_detail"), secure=True)
+        self.assertEqual(response.context["total"], Decimal("43.00"))
+
+        self.client.post(reverse("cart:cart_remove", args=[self.products[0].id]), secure=True)
+        self.client.post(reverse("cart:cart_remove", args=[self.products[1].id]), secure=True)
+        self.assertIsNone(cache.get(CACHE_KEY.format(token)))
+
+    @override_settings(CART_STORE="cart.stores.CacheCartStore")
+    def test_legacy_session_cart_moves_to_cache(self):
+        self.legacy_cart()
+        response = self.client.get(reverse("cart:cart_detail"), secure=True)
+        self.assertEqual(response.context["total"], Decimal("76.00"))
+        session = self.client.session
+        self.assertNotIn("cart", session)
+        self.assertEqual(cache.get(CACHE_KEY.format(session[TOKEN_SESSION_KEY]))["q"], [2, 2, 2])
+
+    @override_settings(CART_STORE="cart.stores.CacheCartStore")
+    def test_empty_cart_creates_no_token(self):
+        self.client.get(reverse("cart:cart_detail"), secure=True)
+        self.assertNotIn(TOKEN_SESSION_KEY, self.client.session)
+
+
+class SavedCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("shopper", "shopper@example.com", "pass")
+        self.products = make_products(4)
+
+    def add(self, client, product, quantity=1):
+        client.post(reverse("cart:cart_add", args=[product.id]), {"quantity": quantity}, secure=True)
+
+    def login(self, client):
+        return client.post(reverse("accounts:login"), {"username": "shopper", "password": "pass"}, secure=True)
+
+    def saved(self):
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list("product_id", "quantity"))
+
+    def session_lines(self, client):
+        return [(line.product.id, line.quantity) for line in client.get(reverse("cart:cart_detail"), secure=True).context["cart_items"]]
+
+    def test_login_merges_session_cart_with_one_upsert(self):
+        cart = SavedCart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.products[0], quantity=2)
+        CartItem.objects.create(cart=cart, product=self.products[1], quantity=1)
+        self.add(self.client, self.products[1], 3)
+        self.add(self.client, self.products[2])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.login(self.client)
+        upserts = [q["sql"] for q in queries if q["sql"].startswith('INSERT INTO "cart_cartitem"')]
+        self.assertEqual(len(upserts), 1)
+        self.assertIn("ON CONFLICT", upserts[0])
+
+        p = self.products
+        expected = {p[0].id: 2, p[1].id: 4, p[2].id: 1}
+        self.assertEqual(self.saved(), expected)
+        self.assertEqual(self.session_lines(self.client), list(expected.items()))
+
+    def test_cart_follows_user_to_another_device(self):
+        self.login(self.client)
+        self.add(self.client, self.products[0], 2)
+        # Written behind: nothing saved until CART_SYNC_SECONDS have passed.
+        self.assertEqual(self.saved(), {})
+        with override_settings(CART_SYNC_SECONDS=0):
+            self.add(self.client, self.products[1])
+        self.assertEqual(self.saved(), {self.products[0].id: 2, self.products[1].id: 1})
+
+        other = Client()
+        self.login(other)
+        self.assertEqual(self.session_lines(other), [(self.products[0].id, 2), (self.products[1].id, 1)])
+
+    def test_logout_saves_pending_changes(self):
+        self.login(self.client)
+        self.add(self.client, self.products[0])
+        self.client.post(reverse("cart:cart_remove", args=[self.products[0].id]), secure=True)
+        self.add(self.client, self.products[3], 5)
+        self.client.get(reverse("accounts:logout"), secure=True)
+        self.assertEqual(self.saved(), {self.products[3].id: 5})
+        self.assertEqual(self.session_lines(self.client), [])
+
+    def test_clearing_the_cart_saves_at_once(self):
+        self.login(self.client)
+        with override_settings(CART_SYNC_SECONDS=0):
+            self.add(self.client, self.products[0])
+        self.add(self.client, self.products[1])
+        request = RequestFactory().get("/")
+        request.session, request.user = self.client.session, self.user
+        Cart(request).clear()
+        request._cart_store.flush()
+        self.assertEqual(self.saved(), {})
+
+    def test_unchanged_cart_skips_the_database(self):
+        self.login(self.client)
+        self.add(self.client, self.products[0])
+        with self.assertNumQueries(3):  # session, user, badge prices
+            self.client.get(reverse("core:personal"), secure=True)
+
+
+class CartApiTests(TestCase):
+    def setUp(self):
+        self.products = make_products(20, price="5.00")
+        self.url = reverse("cart:cart_api")
+
+    def post(self, *ops):
+        return self.client.post(self.url, {"ops": list(ops)}, content_type="application/json", secure=True)
+
+    def product_queries(self, queries):
+        return [q for q in queries if 'FROM "products_product"' in q["sql"]]
+
+    def test_batch_applies_in_order(self):
+        p = self.products
+        self.post({"op": "add", "product_id": p[0].id, "quantity": 2}, {"op": "add", "product_id": p[1].id})
+        response = self.post(
+            {"op": "set", "product_id": p[0].id, "quantity": 5},
+            {"op": "remove", "product_id": p[1].id},
+            {"op": "add", "product_id": p[2].id},
+            {"op": "add", "product_id": p[2].id, "quantity": 2},
+        )
+        data = response.json()
+        self.assertEqual(
+            [(line["product_id"], line["quantity"], line["total_price"]) for line in data["lines"]],
+            [(p[0].id, 5, 25.0), (p[2].id, 3, 15.0)],
+        )
+        self.assertEqual((data["subtotal"], data["shipping"], data["tax"], data["total"], data["count"]),
+                         (40.0, 10.0, 4.0, 54.0, 8))
+        self.assertEqual(self.client.get(self.url, secure=True).json(), data)
+
+    def test_two_catalog_queries_for_any_batch_size(self):
+        for size in (1, 20):
+            ops = [{"op": "set", "product_id": p.id, "quantity": 3} for p in self.products[:size]]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post(*ops)
+            # validate ids, price the cart
+            self.assertEqual(len(self.product_queries(queries)), 2)
+            self.assertEqual(len(response.json()["lines"]), size)
+
+    def test_invalid_batch_changes_nothing(self):
+        self.post({"op": "add", "product_id": self.products[0].id})
+        response = self.post(
+            {"op": "set", "product_id": self.products[0].id, "quantity": 9},
+            {"op": "add", "product_id": 999999},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"errors": ["unknown product_id 999999"]})
+
+        response = self.post({"op": "set", "product_id": self.products[0].id}, {"op": "drop", "product_id": 1})
+        self.assertEqual(len(response.json()["errors"]), 2)
+        self.assertEqual(self.client.get(self.url, secure=True).json()["lines"][0]["quantity"], 1)
+
+        response = self.client.post(self.url, "not json", content_type="application/json", secure=True)
+        self.assertEqual(response.status_code, 400)
+
+
+class PriceRevalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("shopper", "shopper@example.com", "pass")
+        self.products = make_products(3)
+        request = RequestFactory().get("/")
+        request.session = SessionStore()
+        self.cart = Cart(request)
+        for product in self.products:
+            self.cart.add(product)
+
+    def reprice(self, product, **fields):
+        for name, value in fields.items():
+            setattr(product, name, Decimal(value) if value else None)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+    def test_unchanged_catalog_costs_no_queries(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cart.revalidate(), [])
+        # Saves that leave prices alone keep it that way.
+        product = Product.objects.get(pk=self.products[0].pk)
+        product.stock = 3
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        with self.assertNumQueries(0):
+            self.cart.revalidate()
+
+    def test_changed_prices_are_reported_once(self):
+        product = Product.objects.get(pk=self.products[1].pk)
+        self.reprice(product, price="12.00")
+        self.reprice(Product.objects.get(pk=self.products[2].pk), discount_price="8.00")
+        with self.assertNumQueries(1):
+            changes = self.cart.revalidate()
+        self.assertEqual(
+            [(change.product_id, change.old, change.new) for change in changes],
+            [(self.products[1].id, Decimal("10.00"), Decimal("12.00")),
+             (self.products[2].id, Decimal("10.00"), Decimal("8.00"))],
+        )
+        self.assertEqual(self.cart.prices[self.products[1].id], 1200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cart.revalidate(), [])
+        # The cart is charged what was reported.
+        self.assertEqual(self.cart.pricing().subtotal, Decimal("30.00"))
+
+    def test_cart_page_warns_about_old_snapshots(self):
+        session = self.client.session
+        session["cart"] = {str(self.products[0].id): {"quantity": 1, "price": "9.00"}}
+        session.save()
+        response = self.client.get(reverse("cart:cart_detail"), secure=True)
+        self.assertContains(response, "changed from Rs. 9.00 to Rs. 10.00")
+        response = self.client.get(reverse("cart:cart_detail"), secure=True)
+        self.assertNotContains(response, "changed from")
+
+    def test_cart_api_warns_about_old_snapshots(self):
+        session = self.client.session
+        session["cart"] = {str(self.products[0].id): {"quantity": 1, "price": "9.00"}}
+        session.save()
+        response = self.client.post(
+            reverse("cart:cart_api"), {"ops": [{"op": "add", "product_id": self.products[1].id}]},
+            content_type="application/json", secure=True,
+        )
+        self.assertEqual(response.json()["price_changes"][0]["old"], 9.0)
+        response = self.client.get(reverse("cart:cart_detail"), secure=True)
+        self.assertContains(response, "changed from Rs. 9.00 to Rs. 10.00", count=1)
+
+    def test_checkout_stops_on_changed_price(self):
+        from orders.models import Order
+
+        self.client.force_login(self.user)
+        self.client.post(reverse("cart:cart_add", args=[self.products[0].id]), secure=True)
+        self.reprice(Product.objects.get(pk=self.products[0].pk), price="11.00")
+
+        response = self.client.post(reverse("orders:cod_checkout"), secure=True)
+        self.assertRedirects(response, reverse("orders:checkout"), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+
+        self.client.post(reverse("orders:cod_checkout"), secure=True)
+        self.assertEqual(Order.objects.get().subtotal, Decimal("11.00"))
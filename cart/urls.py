@@ -8,7 +8,7 @@ urlpatterns = [
     path("add/<int:product_id>/", views.cart_add, name="cart_add"),
     path("remove/<int:product_id>/", views.cart_remove, name="cart_remove"),
     path("update/<int:product_id>/", views.cart_update, name="cart_update"),
-    
+    path("api/", views.cart_api, name="cart_api"),
 ]
 
 
@@ -1,8 +1,15 @@
 # cart/views.py
+import json
+
+from django.contrib import messages
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from django.views.decorators.http import require_POST
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_http_methods, require_POST
+from products.inventory import OutOfStock
 from products.models import Product
-from .cart import Cart  # session-based Cart class
+from .api import InvalidOperations, apply_ops, cart_state, parse_ops
+from .cart import Cart, check_prices  # session-based Cart class
 
 
 def cart_detail(request):
@@ -10,12 +17,14 @@ def cart_detail(request):
     Display cart items, subtotal, shipping, tax, and total.
     """
     cart = Cart(request)
+    check_prices(request, cart)
+    pricing = cart.pricing()
     return render(request, "cart/cart_detail.html", {
-        "cart_items": list(cart),  # cart.__iter__()
-        "subtotal": cart.subtotal(),
-        "shipping": cart.shipping(),
-        "tax": cart.tax(),
-        "total": cart.total(),
+        "cart_items": pricing.lines,
+        "subtotal": pricing.subtotal,
+        "shipping": pricing.shipping,
+        "tax": pricing.tax,
+        "total": pricing.total,
     })
 
 
@@ -33,7 +42,10 @@ def cart_add(request, product_id):
     except ValueError:
         quantity = 1
 
-    cart.add(product=product, quantity=quantity)
+    try:
+        cart.add(product=product, quantity=quantity)
+    except OutOfStock:
+        messages.error(request, f"Sorry, not enough {product.name} is left in stock.")
     return redirect("cart:cart_detail")
 
 
@@ -49,10 +61,10 @@ def cart_update(request, product_id):
     except ValueError:
         quantity = 1
 
-    if quantity > 0:
-        cart.add(product=product, quantity=quantity, override_quantity=True)
-    else:
-        cart.remove(product)
+    try:
+        cart.update({product: max(quantity, 0)})
+    except OutOfStock:
+        messages.error(request, f"Sorry, not enough {product.name} is left in stock.")
 
     return redirect("cart:cart_detail")
 
@@ -68,3 +80,28 @@ def cart_remove(request, product_id):
     return redirect("cart:cart_detail")
 
 
+
+
+@never_cache
+@require_http_methods(["GET", "POST"])
+def cart_api(request):
+    """
+    The cart as JSON; a POST first applies a batch of line operations
+    (see cart.api).
+    """
+    cart = Cart(request)
+    changes = check_prices(request, cart)
+    if request.method == "POST":
+        try:
+            payload = json.loads(request.body or b"null")
+        except ValueError:
+            return JsonResponse({"errors": ["body must be JSON"]}, status=400)
+        try:
+            apply_ops(cart, parse_ops(payload))
+        except InvalidOperations as exc:
+            return JsonResponse({"errors": exc.errors}, status=400)
+        except OutOfStock as exc:
+            for name in Product.objects.filter(id__in=exc.product_ids).values_list("name", flat=True):
+                messages.error(request, f"Sorry, not enough {name} is left in stock.")
+            return JsonResponse({"errors": ["not enough stock"], "out_of_stock": exc.product_ids}, status=409)
+    return JsonResponse(cart_state(cart, changes))
@@ -0,0 +1,384 @@
+# core/benchmark.py
+"""
+Synthetic data and a repeatable latency benchmark.
+
+seed() fills the database with generated categories, products, variants,
+reviews, users, wishlists and orders using bulk_create in batches. Every
+value comes from one random.Random(seed), so a seed always produces the
+same store. Signals do not fire for bulk inserts, so the derived tables
+(ratings, search index, sales rollup) are rebuilt at the end.
+
+run() requests every GET-able URL from ecommerce/urls.py with the test
+client and reports p50/p95 latency and queries per request as plain
+dicts, ready to be written out as JSON and compared between runs.
+
+run_cart() compares cart stores (cart.stores) with the old session cart
+by the latency and bytes written per cart mutation.
+"""
+import pickle
+import random
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+
+from cart.cart import Cart
+from cart.pricing import SHIPPING_FEE, TAX_RATE
+from cart.stores import SessionCartStore, encode
+from orders.models import Order, OrderItem
+from orders.sales import rebuild_sales
+from products.models import Category, Product, ProductVariant, Review, Wishlist
+from products.ratings import rebuild_ratings
+from products.search import get_backend
+
+PREFIX = "bench"
+PASSWORD = "bench-password"
+ORDER_STATUSES = [
+    (Order.COMPLETED, 50), (Order.SHIPPED, 15), (Order.PAID, 15), (Order.PENDING, 12), (Order.CANCELED, 8),
+]
+VARIANTS = [("Size", ("S", "M", "L", "XL")), ("Color", ("Red", "Blue", "Black", "White"))]
+WORDS = (
+    "classic slim wireless leather cotton smart compact travel premium eco "
+    "sport vintage portable steel wooden soft bright quiet fast light"
+).split()
+NOUNS = "shirt lamp phone case bag watch bottle chair mug jacket speaker backpack".split()
+
+# URL names left out of runs: they change state, call external services or
+# export in bulk.
+SKIP = {
+    "accounts:logout", "accounts:address_delete", "accounts:set_default_address",
+    "accounts:password_reset_confirm",
+    "products:add_to_wishlist", "products:remove_from_wishlist", "products:move_to_cart",
+    "products:move_all_to_cart",
+    "cart:cart_add", "cart:cart_remove", "cart:cart_update",
+    "orders:create_checkout_session", "orders:cod_checkout", "orders:export_invoices",
+    "orders:generate_invoice_pdf",
+}
+
+
+@dataclass(frozen=True)
+class Counts:
+    categories: int = 20
+    products: int = 2000
+    variants: int = 2
+    reviews: int = 10000
+    users: int = 500
+    wishlists: int = 2000
+    orders: int = 5000
+    items: int = 4
+
+
+# Seeding -------------------------------------------------------------
+
+def _batched(objs, batch_size):
+    for start in range(0, len(objs), batch_size):
+        yield objs[start:start + batch_size]
+
+
+def clear():
+    """
+    Delete everything seed() created.
+    """
+    User = get_user_model()
+    with transaction.atomic():
+        Order.objects.filter(user__username__startswith=f"{PREFIX}-").delete()
+        User.objects.filter(username__startswith=f"{PREFIX}-").delete()
+        Category.objects.filter(slug__startswith=f"{PREFIX}-").delete()
+    rebuild_sales()
+
+
+@transaction.atomic
+def seed(counts=Counts(), seed=0, batch_size=1000):
+    """
+    Generate a store of the given size; returns {model name: rows created}.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    User = get_user_model()
+
+    categories = Category.objects.bulk_create([
+        Category(name=f"{PREFIX.title()} {i}", slug=f"{PREFIX}-{i}", description=f"Category {i}")
+        for i in range(counts.categories)
+    ], batch_size=batch_size)
+
+    products = []
+    for i in range(counts.products):
+        name = f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {rng.choice(NOUNS)}"
+        price = Decimal(rng.randrange(500, 50000)) / 100
+        products.append(Product(
+            category=rng.choice(categories), name=name, slug=f"{PREFIX}-{i}",
+            description=" ".join(rng.choices(WORDS, k=12)), price=price,
+            discount_price=(price * Decimal("0.8")).quantize(Decimal("0.01")) if rng.random() < 0.2 else None,
+            image="products/test.jpg", stock=rng.randrange(0, 200),
+        ))
+    products = Product.objects.bulk_create(products, batch_size=batch_size)
+    for product in products:
+        product.created_at = now - timedelta(minutes=rng.randrange(0, 365 * 24 * 60))
+    Product.objects.bulk_update(products, ["created_at"], batch_size=batch_size)
+
+    ProductVariant.objects.bulk_create([
+        ProductVariant(product=product, name=name, value=value)
+        for product in products
+        for name, values in rng.sample(VARIANTS, min(counts.variants, len(VARIANTS)))
+        for value in values
+    ], batch_size=batch_size)
+
+    password = make_password(PASSWORD)
+    users = User.objects.bulk_create([
+        User(username=f"{PREFIX}-{i}", email=f"{PREFIX}-{i}@example.com", password=password)
+        for i in range(counts.users)
+    ], batch_size=batch_size)
+
+    Review.objects.bulk_create([
+        Review(product=rng.choice(products), user=rng.choice(users), rating=rng.choices(range(1, 6), (1, 1, 2, 4, 5))[0],
+               comment=" ".join(rng.choices(WORDS, k=8)))
+        for _ in range(counts.reviews)
+    ], batch_size=batch_size)
+
+    pairs = rng.sample(range(len(users) * len(products)), min(counts.wishlists, len(users) * len(products)))
+    Wishlist.objects.bulk_create([
+        Wishlist(user=users[pair // len(products)], product=products[pair % len(products)]) for pair in pairs
+    ], batch_size=batch_size)
+
+    statuses, weights = zip(*ORDER_STATUSES)
+    orders, lines = [], []
+    for _ in range(counts.orders):
+        items = [(rng.choice(products), rng.randint(1, 3)) for _ in range(rng.randint(1, counts.items))]
+        subtotal = sum((product.price * quantity for product, quantity in items), Decimal("0.00"))
+        tax = (subtotal * TAX_RATE).quantize(Decimal("0.01"))
+        orders.append(Order(
+            user=rng.choice(users), status=rng.choices(statuses, weights)[0],
+            payment_method=rng.choice((Order.STRIPE, Order.COD)),
+            subtotal=subtotal, shipping_fee=SHIPPING_FEE, tax_amount=tax,
+            total_price=subtotal + SHIPPING_FEE + tax,
+        ))
+        lines.append(items)
+    for batch in _batched(list(zip(orders, lines)), batch_size):
+        created = Order.objects.bulk_create([order for order, _ in batch])
+        for order in created:
+            order.created_at = now - timedelta(minutes=rng.randrange(0, 365 * 24 * 60))
+        Order.objects.bulk_update(created, ["created_at"])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=quantity, price=product.price)
+            for order, items in batch for product, quantity in items
+        ])
+
+    rebuild_ratings(Product.objects.filter(category__in=categories))
+    get_backend().rebuild("default", Product.objects.only("id", "name", "description").iterator())
+    rebuild_sales()
+    cache.clear()
+    return {
+        "categories": len(categories), "products": len(products), "users": len(users),
+        "reviews": counts.reviews, "wishlists": len(pairs), "orders": len(orders),
+        "order_items": sum(len(items) for items in lines),
+    }
+
+
+# Benchmarking --------------------------------------------------------
+
+def _patterns(patterns, namespace=None):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace != "admin":
+                yield from _patterns(pattern.url_patterns, pattern.namespace or namespace)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            name = f"{namespace}:{pattern.name}" if namespace else pattern.name
+            yield name, list(pattern.pattern.converters)
+
+
+def sample_kwargs(user):
+    """
+    URL keyword arguments filled from the seeded store, by argument name.
+    """
+    product = Product.objects.filter(slug__startswith=f"{PREFIX}-").order_by("pk").first()
+    order = Order.objects.filter(user=user).order_by("pk").first()
+    values = {
+        "slug": product and product.slug,
+        "category_slug": product and product.category.slug,
+        "order_id": order and order.pk,
+    }
+    return {key: value for key, value in values.items() if value is not None}
+
+
+def benchmark_urls(user):
+    """
+    [(url name, path)] for every GET-able route, plus [(url name, reason)]
+    for the ones left out.
+    """
+    values = sample_kwargs(user)
+    urls, skipped = [], []
+    for name, args in _patterns(get_resolver().url_patterns):
+        if name in SKIP:
+            skipped.append((name, "changes state"))
+        elif any(arg not in values for arg in args):
+            skipped.append((name, "no sample for " + ", ".join(arg for arg in args if arg not in values)))
+        else:
+            urls.append((name, reverse(name, kwargs={arg: values[arg] for arg in args})))
+    return urls, skipped
+
+
+def percentile(samples, pct):
+    """
+    Nearest-rank percentile of ``samples``.
+    """
+    ordered = sorted(samples)
+    return ordered[max(0, -(-len(ordered) * pct // 100) - 1)]
+
+
+@dataclass(frozen=True)
+class Result:
+    name: str
+    path: str
+    status: int
+    p50_ms: float
+    p95_ms: float
+    mean_ms: float
+    queries: int
+
+
+def measure(client, name, path, iterations=20, warmup=2):
+    for _ in range(warmup):
+        client.get(path, secure=True)
+    timings, queries = [], []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = client.get(path, secure=True)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(context))
+    return Result(
+        name=name, path=path, status=response.status_code,
+        p50_ms=round(percentile(timings, 50), 2), p95_ms=round(percentile(timings, 95), 2),
+        mean_ms=round(statistics.fmean(timings), 2), queries=max(queries),
+    )
+
+
+def run(iterations=20, warmup=2, username=f"{PREFIX}-0", only=None):
+    """
+    Benchmark every route (or the names in ``only``) as ``username`` with
+    a five-product cart; returns a JSON-ready dict.
+    """
+    user = get_user_model().objects.get(username=username)
+    client = Client(raise_request_exception=False)
+    client.force_login(user)
+    session = client.session
+    session[settings.CART_SESSION_ID] = encode({
+        product.pk: 1 for product in Product.objects.filter(slug__startswith=f"{PREFIX}-").order_by("pk")[:5]
+    })
+    session.save()
+
+    urls, skipped = benchmark_urls(user)
+    if only:
+        urls = [(name, path) for name, path in urls if name in only]
+    results = [measure(client, name, path, iterations, warmup) for name, path in urls]
+    return {
+        "created_at": timezone.now().isoformat(),
+        "iterations": iterations,
+        "warmup": warmup,
+        "user": username,
+        "results": [asdict(result) for result in results],
+        "skipped": [{"name": name, "reason": reason} for name, reason in skipped],
+    }
+
+
+def compare(previous, current):
+    """
+    [(name, p95 before, p95 after, queries before, queries after)] for the
+    routes in both runs.
+    """
+    before = {row["name"]: row for row in previous["results"]}
+    return [
+        (row["name"], before[row["name"]]["p95_ms"], row["p95_ms"], before[row["name"]]["queries"], row["queries"])
+        for row in current["results"] if row["name"] in before
+    ]
+
+
+# Cart storage --------------------------------------------------------
+
+# None is the cart as it was before cart.stores: the whole
+# {"<id>": {"quantity": n, "price": "..."}} dict in the session.
+CART_STORES = (None, "cart.stores.SessionCartStore", "cart.stores.CacheCartStore")
+
+
+@dataclass(frozen=True)
+class CartResult:
+    store: str
+    mutations: int
+    lines: int
+    p50_ms: float
+    p95_ms: float
+    bytes_per_mutation: int
+
+
+def _legacy_add(request, product):
+    cart = request.session.setdefault(settings.CART_SESSION_ID, {})
+    item = cart.setdefault(str(product.id), {"quantity": 0, "price": str(product.price)})
+    item["quantity"] += 1
+    request.session.modified = True
+
+
+def measure_cart(store, products, mutations=200):
+    """
+    Add ``products`` to one cart in turn, ``mutations`` times, each as its
+    own request: load the session, add, flush the cart, save the session.
+    Bytes written are the encoded session on every session save plus the
+    pickled cart on every cache write.
+    """
+    SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+    factory = RequestFactory()
+    session_key = None
+    timings, written = [], 0
+    with override_settings(CART_STORE=store or settings.CART_STORE):
+        for n in range(mutations):
+            request = factory.post("/")
+            request.session = SessionStore(session_key)
+            start = time.perf_counter()
+            if store is None:
+                _legacy_add(request, products[n % len(products)])
+                data = None
+            else:
+                Cart(request).add(products[n % len(products)])
+                data = request._cart_store.flush()
+            if request.session.modified:
+                request.session.save()
+                written += len(request.session.encode(dict(request.session.items())))
+            timings.append((time.perf_counter() - start) * 1000)
+            if data is not None and not isinstance(request._cart_store, SessionCartStore):
+                written += len(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+            session_key = request.session.session_key
+        if store is not None:
+            Cart(request).clear()
+            request._cart_store.flush()
+        request.session.delete()
+    return CartResult(
+        store=store or "session (legacy format)", mutations=mutations, lines=len(products),
+        p50_ms=round(percentile(timings, 50), 3), p95_ms=round(percentile(timings, 95), 3),
+        bytes_per_mutation=round(written / mutations),
+    )
+
+
+def run_cart(mutations=200, lines=20, stores=CART_STORES):
+    """
+    measure_cart() for each store with a ``lines``-product cart; returns a
+    JSON-ready dict.
+    """
+    products = list(Product.objects.order_by("pk")[:lines])
+    results = [measure_cart(store, products, mutations) for store in stores]
+    return {
+        "created_at": timezone.now().isoformat(),
+        "session_engine": settings.SESSION_ENGINE,
+        "cache_backend": settings.CACHES["default"]["BACKEND"],
+        "results": [asdict(result) for result in results],
+    }
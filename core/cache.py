@@ -0,0 +1,46 @@
+# core/cache.py
+"""
+Version counters for cached data, shared by every app.
+
+Cached values embed the current version in their key; bumping the
+version (from signals) makes every older entry unreachable at once,
+without having to know which keys exist.
+"""
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = "version:{}"
+
+
+def get_version(name):
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted counter never restarts at a
+        # value that older cached entries were stored under.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(names):
+    """
+    {name: version} for several counters with one cache round trip.
+    """
+    keys = {VERSION_KEY.format(name): name for name in names}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        cache.add(key, time.time_ns(), None)
+        found[key] = cache.get(key)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def bump_version(name):
+    key = VERSION_KEY.format(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, None)
+        return version
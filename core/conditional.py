@@ -0,0 +1,73 @@
+# core/conditional.py
+"""
+Conditional GET for anonymous catalog pages.
+
+A page decorated with @conditional_page(validator) is the same HTML for
+every anonymous visitor: the cart badge, messages and CSRF tokens are
+left out (request.cacheable_page is set for the templates) and filled in
+by the page from core:personal. Its validator returns the page's
+Last-Modified time and the parts of its ETag from a cheap query, so a
+matching If-None-Match/If-Modified-Since gets a 304 before the view or
+any template runs. Responses carry ``Cache-Control: public`` and
+``Vary: Cookie`` so a reverse proxy can keep them.
+
+Logged-in users get the normal, personalized page marked private.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .cache import get_version
+
+SAFE_METHODS = ("GET", "HEAD")
+
+
+def catalog_etag(*parts):
+    """
+    A strong ETag over ``parts`` and the category and review versions.
+    """
+    parts += (get_version("categories"), get_version("reviews"))
+    return quote_etag(hashlib.sha1(":".join(map(str, parts)).encode()).hexdigest())
+
+
+def listing_validator(queryset):
+    """
+    (last modified, ETag) for a page built from ``queryset``: its newest
+    updated_at and its row count, so edits, additions and removals all
+    change the ETag.
+    """
+    state = queryset.order_by().aggregate(last_modified=Max("updated_at"), count=Count("pk"))
+    return state["last_modified"], catalog_etag(state["last_modified"], state["count"])
+
+
+def conditional_page(validator):
+    """
+    ``validator(request, *args, **kwargs)`` returns (last modified, ETag).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS or request.user.is_authenticated:
+                response = view(request, *args, **kwargs)
+                patch_cache_control(response, private=True)
+                return response
+
+            last_modified, etag = validator(request, *args, **kwargs)
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                request.cacheable_page = True
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response.headers.setdefault("ETag", etag)
+                if timestamp is not None:
+                    response.headers.setdefault("Last-Modified", http_date(timestamp))
+                patch_cache_control(response, public=True, max_age=settings.CATALOG_CACHE_SECONDS)
+            patch_vary_headers(response, ("Cookie",))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import CART_STORES, run_cart
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Compare cart stores by latency and bytes written per cart mutation."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mutations", type=int, default=200)
+        parser.add_argument("--lines", type=int, default=20, help="Distinct products in the cart.")
+        parser.add_argument("--output", help="Path of a JSON results file to write.")
+
+    def handle(self, *args, **options):
+        if not Product.objects.exists():
+            raise CommandError("No products; run seed_benchmark first.")
+
+        results = run_cart(options["mutations"], options["lines"], CART_STORES)
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                json.dump(results, fh, indent=2)
+
+        for row in results["results"]:
+            self.stdout.write(
+                f"{row['store']:<32} p50 {row['p50_ms']:>7.3f} ms  p95 {row['p95_ms']:>7.3f} ms  "
+                f"{row['bytes_per_mutation']:>6} bytes/mutation"
+            )
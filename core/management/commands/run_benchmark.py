@@ -0,0 +1,50 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from core.benchmark import PREFIX, compare, run
+
+
+class Command(BaseCommand):
+    help = "Measure p50/p95 latency and queries per request for every GET route; writes JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Path of the JSON results file.")
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--user", default=f"{PREFIX}-0", help="Username to request pages as.")
+        parser.add_argument("--only", nargs="+", help="URL names to run, e.g. products:product_list.")
+        parser.add_argument("--compare", help="A previous results file to compare against.")
+
+    def handle(self, *args, **options):
+        previous = None
+        if options["compare"]:
+            with open(options["compare"]) as fh:
+                previous = json.load(fh)
+
+        # The test client's host and the profiling sample rate must not skew runs.
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+                               REQUEST_PROFILING_SAMPLE_RATE=0):
+            try:
+                results = run(options["iterations"], options["warmup"], options["user"], options["only"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user {options['user']!r}; run seed_benchmark first.")
+
+        with open(options["output"], "w") as fh:
+            json.dump(results, fh, indent=2)
+
+        for row in results["results"]:
+            self.stdout.write(
+                f"{row['name']:<40} {row['status']}  p50 {row['p50_ms']:>8.2f} ms  "
+                f"p95 {row['p95_ms']:>8.2f} ms  {row['queries']:>3} queries"
+            )
+        if previous:
+            self.stdout.write("\nChange in p95 / queries:")
+            for name, p95_before, p95_after, queries_before, queries_after in compare(previous, results):
+                self.stdout.write(
+                    f"{name:<40} {p95_before:>8.2f} -> {p95_after:>8.2f} ms  {queries_before:>3} -> {queries_after:>3}"
+                )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results['results'])} results to {options['output']}."))
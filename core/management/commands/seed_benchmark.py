@@ -0,0 +1,24 @@
+from dataclasses import fields
+
+from django.core.management.base import BaseCommand
+
+from core.benchmark import Counts, clear, seed
+
+
+class Command(BaseCommand):
+    help = "Generate a deterministic synthetic store for benchmarking (bulk inserts, no signals)."
+
+    def add_arguments(self, parser):
+        for field in fields(Counts):
+            parser.add_argument(f"--{field.name}", type=int, default=field.default)
+        parser.add_argument("--seed", type=int, default=0, help="Random seed; the same seed gives the same data.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--clear", action="store_true", help="Delete previously seeded data first.")
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            clear()
+        counts = Counts(**{field.name: options[field.name] for field in fields(Counts)})
+        created = seed(counts, options["seed"], options["batch_size"])
+        summary = ", ".join(f"{count} {name}" for name, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f"Seeded {summary}."))
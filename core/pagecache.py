@@ -0,0 +1,101 @@
+# core/pagecache.py
+"""
+Server-side full-page cache for anonymous catalog pages.
+
+Pages are keyed by path and normalized query string. While a page
+renders, the view tags it with what it shows (tag_page(): "product:<id>",
+"listing:all", "listing:category:<id>"); every page also depends on
+"categories" through the navigation. Tags are core.cache version
+counters, and an entry keeps the version of each of its tags, so bumping
+one tag (products.signals does this when a product, category, review or
+variant changes) invalidates exactly the pages carrying it.
+
+Only pages core.conditional marked shareable (request.cacheable_page)
+are stored, so cached HTML never holds a cart badge, messages or CSRF
+token. Hits still honour If-None-Match/If-Modified-Since.
+"""
+import hashlib
+from functools import wraps
+from urllib.parse import parse_qsl, urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .cache import get_versions
+
+CACHE_KEY = "pages:{}"
+BASE_TAGS = ("categories",)
+# Headers stored with the page and replayed on hits.
+HEADERS = ("Content-Type", "ETag", "Last-Modified", "Cache-Control", "Vary")
+
+
+def page_key(request):
+    """
+    Cache key for the request's path and query string, with parameters
+    sorted and blank ones dropped.
+    """
+    query = sorted((key, value) for key, value in parse_qsl(request.META.get("QUERY_STRING", "")) if value)
+    url = request.path + ("?" + urlencode(query) if query else "")
+    return CACHE_KEY.format(hashlib.sha1(url.encode()).hexdigest())
+
+
+def tag_page(request, *tags):
+    """
+    Record that the page being rendered depends on ``tags``. The versions
+    are read now, close to when the tagged data was loaded.
+    """
+    versions = getattr(request, "page_tags", None)
+    if versions is not None:
+        versions.update(get_versions(tag for tag in tags if tag not in versions))
+
+
+def _fresh(entry):
+    tags = entry["tags"]
+    return get_versions(tags) == tags
+
+
+def _replay(request, entry):
+    headers = entry["headers"]
+    last_modified = parse_http_date_safe(headers.get("Last-Modified", ""))
+    response = get_conditional_response(request, etag=headers.get("ETag"), last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(entry["content"])
+    for name, value in headers.items():
+        response[name] = value
+    response["X-Page-Cache"] = "hit"
+    return response
+
+
+def cache_anonymous_page(view):
+    """
+    Serve anonymous GET/HEAD requests for ``view`` from the page cache.
+    Put it outside @conditional_page, which decides what is shareable.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        key = page_key(request)
+        entry = cache.get(key)
+        if entry is not None and _fresh(entry):
+            return _replay(request, entry)
+
+        request.page_tags = get_versions(BASE_TAGS)
+        response = view(request, *args, **kwargs)
+        if (
+            response.status_code == 200
+            and getattr(request, "cacheable_page", False)
+            and not response.streaming
+        ):
+            cache.set(key, {
+                "tags": request.page_tags,
+                "content": response.content,
+                "headers": {name: response[name] for name in HEADERS if name in response},
+            }, settings.PAGE_CACHE_SECONDS)
+            response["X-Page-Cache"] = "miss"
+        return response
+    return wrapper
@@ -0,0 +1,150 @@
+# core/profiling.py
+"""
+Per-request SQL and template profiling.
+
+For a sampled share of requests (REQUEST_PROFILING_SAMPLE_RATE), the
+middleware wraps every database connection with ``execute_wrapper`` and
+records the query count, total SQL time, repeated query shapes (the
+N+1 signature) and template render time. It reports them as one JSON
+log line on the ``core.profiling`` logger and, for staff or when DEBUG
+is on, a ``Server-Timing`` header; other visitors never see timings.
+Unsampled requests pay for one random() call.
+
+Template time is measured by ProfiledDjangoTemplates, a drop-in for the
+DjangoTemplates backend. It includes queries run lazily while rendering.
+"""
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("request_profile", default=None)
+
+_literal_re = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_in_list_re = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+_space_re = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """
+    Query shape without parameter values: literals become %s (for SQL that
+    was already interpolated) and ``IN (%s, %s, ...)`` lists of any length
+    collapse to one shape.
+    """
+    sql = _literal_re.sub("%s", sql)
+    return _space_re.sub(" ", _in_list_re.sub("(%s, ...)", sql)).strip()
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.shapes = Counter()
+        self._template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.shapes[fingerprint(sql)] += 1
+
+    def duplicates(self, limit=5):
+        """
+        [(shape, count)] for query shapes run more than once, most first.
+        """
+        return [(shape, count) for shape, count in self.shapes.most_common(limit) if count > 1]
+
+    def server_timing(self, total):
+        return ", ".join([
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+            f"tpl;dur={self.template_time * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ])
+
+    def as_dict(self, request, response, total):
+        match = getattr(request, "resolver_match", None)
+        return {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 1),
+            "db_ms": round(self.sql_time * 1000, 1),
+            "queries": self.queries,
+            "duplicate_queries": sum(count - 1 for count in self.shapes.values()),
+            "duplicates": [{"sql": shape[:200], "count": count} for shape, count in self.duplicates()],
+            "template_ms": round(self.template_time * 1000, 1),
+        }
+
+
+class QueryProfilingMiddleware:
+    """
+    Place near the top of MIDDLEWARE so session and auth queries count.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = getattr(settings, "REQUEST_PROFILING_SAMPLE_RATE", 0)
+        if rate <= 0 or random.random() >= rate:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+
+        user = getattr(request, "user", None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            response["Server-Timing"] = profile.server_timing(total)
+        data = profile.as_dict(request, response, total)
+        logger.info(json.dumps(data), extra={"profile": data})
+        return response
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return super().render(context, request)
+        # Only the outermost render counts; render_to_string() calls made
+        # while rendering are already inside its time.
+        profile._template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile._template_depth -= 1
+            if not profile._template_depth:
+                profile.template_time += time.perf_counter() - start
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return ProfiledTemplate(template.template, self)
@@ -0,0 +1,105 @@
+# core/testing.py
+"""
+Test helpers: a seeded store and query-budget assertions for hot views.
+
+assertQueryBudget() fails when a block runs more queries than its budget
+or repeats the same query shape (see core.profiling.fingerprint), and the
+failure lists the repeated shapes, which is where an N+1 shows up.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+from .profiling import fingerprint
+
+# Statements that legitimately repeat within a request.
+IGNORED_PREFIXES = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+def seed_store(products=24, customers=3, orders_per_customer=4, lines_per_order=3):
+    """
+    Categories, products with variants and reviews, customers with
+    addresses and sale orders; returns the created objects by name.
+    """
+    from accounts.models import Address, User
+    from orders.models import Order, OrderItem, ShippingAddress
+    from products.models import Category, Product, ProductVariant, Review
+
+    categories = Category.objects.bulk_create([
+        Category(name=f"Category {i}", slug=f"category-{i}") for i in range(4)
+    ])
+    catalog = Product.objects.bulk_create([
+        Product(category=categories[i % len(categories)], name=f"Product {i}", slug=f"product-{i}",
+                price=Decimal("10.00") + i, stock=100, image="products/test.jpg")
+        for i in range(products)
+    ])
+    ProductVariant.objects.bulk_create([
+        ProductVariant(product=product, name="Size", value=size)
+        for product in catalog[:4] for size in ("S", "M", "L")
+    ])
+
+    users = [
+        User.objects.create_user(f"customer{i}", f"customer{i}@example.com", "pass")
+        for i in range(customers)
+    ]
+    Address.objects.bulk_create([
+        Address(user=user, address_type="shipping", full_name=user.username, phone="1",
+                street_address="1 Main St", city="Town", state="State", postal_code="1",
+                country="PK", default=True)
+        for user in users
+    ])
+    # Review.save() keeps the product's rating aggregates current.
+    for user in users:
+        for product in catalog[:4]:
+            Review.objects.create(product=product, user=user, rating=4, comment="Good")
+
+    orders = []
+    for user in users:
+        address = ShippingAddress.objects.create(
+            user=user, full_name=user.username, address_line="1 Main St", city="Town",
+            postal_code="1", country="PK",
+        )
+        for n in range(orders_per_customer):
+            order = Order.objects.create(
+                user=user, shipping_address=address, status=Order.PAID, total_price=Decimal("30.00"),
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=catalog[(n + i) % len(catalog)], quantity=1, price=Decimal("10.00"))
+                for i in range(lines_per_order)
+            ])
+            orders.append(order)
+    return {"categories": categories, "products": catalog, "users": users, "orders": orders}
+
+
+def repeated_queries(queries):
+    """
+    [(shape, count)] for query shapes run more than once, most first.
+    """
+    shapes = Counter(
+        fingerprint(query["sql"]) for query in queries if not query["sql"].startswith(IGNORED_PREFIXES)
+    )
+    return [(shape, count) for shape, count in shapes.most_common() if count > 1]
+
+
+class QueryBudgetMixin:
+    @contextmanager
+    def assertQueryBudget(self, budget, using="default"):
+        """
+        Fail if the block runs more than ``budget`` queries or any query
+        shape more than once.
+        """
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        repeated = repeated_queries(context.captured_queries)
+        if len(context) <= budget and not repeated:
+            return
+        lines = [f"{len(context)} queries run, budget {budget}."]
+        if repeated:
+            lines.append("Repeated queries (likely N+1):")
+            lines.extend(f"  {count}x {shape}" for shape, count in repeated)
+        lines.append("All queries:")
+        lines.extend(f"  {n}. {query['sql']}" for n, query in enumerate(context.captured_queries, 1))
+        self.fail("\n".join(lines))
@@ -1,3 +1,198 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db.models import Sum
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from core import benchmark, models as staff_models
+from core.views import ProductListView
+from core.profiling import fingerprint
+from core.testing import QueryBudgetMixin, repeated_queries, seed_store
+from orders.models import DailySales, Order
+from products.models import Product
+
+
+class AdminDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        today = timezone.localdate()
+        for days_ago, orders, revenue in ((0, 2, "30.00"), (3, 1, "10.00"), (20, 4, "100.00"), (90, 5, "500.00")):
+            DailySales.objects.create(
+                date=today - timedelta(days=days_ago), order_count=orders, units=orders * 2,
+                revenue=Decimal(revenue),
+            )
+        self.staff = User.objects.create_user("staff", password="x", is_staff=True)
+
+    def test_staff_only(self):
+        url = reverse("core:dashboard")
+        response = self.client.get(url, secure=True)
+        self.assertRedirects(response, f"{reverse('accounts:login')}?next={url}", fetch_redirect_response=False)
+        self.client.force_login(User.objects.create_user("shopper", password="x"))
+        self.assertEqual(self.client.get(url, secure=True).status_code, 403)
+
+    def test_reads_rollup_in_constant_queries(self):
+        self.client.force_login(self.staff)
+        self.client.get(reverse("core:dashboard"), secure=True)  # warm the analytics cache
+        with self.assertNumQueries(6):  # session, user, totals, 30-day trend, customers, low stock
+            response = self.client.get(reverse("core:dashboard"), secure=True)
+        self.assertEqual(response.context["total_sales"], 12)
+        self.assertEqual(response.context["total_revenue"], Decimal("640.00"))
+        summaries = dict(response.context["trend_summaries"])
+        self.assertEqual((summaries[7].order_count, summaries[7].revenue), (3, Decimal("40.00")))
+        self.assertEqual((summaries[30].order_count, summaries[30].revenue), (7, Decimal("140.00")))
+        self.assertEqual(len(response.context["trend_30"]), 30)
+        self.assertContains(response, "Last 7 Days")
+        self.assertContains(response, "Cohort Retention")
+
+
+class QueryProfilingTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user("staff", password="x", is_staff=True)
+        self.client.force_login(self.staff)
+
+    def test_fingerprint_collapses_in_lists(self):
+        self.assertEqual(
+            fingerprint('SELECT *  FROM "t"\nWHERE "id" IN (%s, %s, %s)'),
+            fingerprint('SELECT * FROM "t" WHERE "id" IN (%s,%s)'),
+        )
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=1)
+    def test_sampled_request_reports_timings(self):
+        with self.assertLogs("core.profiling", "INFO") as logs:
+            response = self.client.get(reverse("core:dashboard"), secure=True)
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=')
+        data = logs.records[0].profile
+        self.assertEqual((data["view"], data["status"]), ("core:dashboard", 200))
+        self.assertGreater(data["queries"], 0)
+        self.assertGreater(data["template_ms"], 0)
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=1)
+    def test_timings_hidden_from_other_visitors(self):
+        self.client.logout()
+        with self.assertLogs("core.profiling", "INFO") as logs:
+            response = self.client.get(reverse("core:home"), secure=True)
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(logs.records[0].profile["view"], "core:home")
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_request_untouched(self):
+        response = self.client.get(reverse("core:dashboard"), secure=True)
+        self.assertNotIn("Server-Timing", response)
+
+
+class HotViewQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Query budgets for the busiest pages, measured with warm caches against
+    a seeded store. A budget failure lists the repeated queries.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.store = seed_store()
+        cls.user = cls.store["users"][0]
+        cls.user.is_staff = True
+        cls.user.save()
+        category = staff_models.Category.objects.create(name="Staff", slug="staff")
+        for i in range(5):
+            staff_models.Product.objects.create(name=f"Item {i}", category=category, price=1, stock=1)
+            staff_models.Order.objects.create(user=cls.store["users"][i % 3], total_price=1)
+            staff_models.Coupon.objects.create(code=f"SAVE{i}", discount=1, expiry_date=date(2030, 1, 1))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        session = self.client.session
+        session["cart"] = {
+            str(p.id): {"quantity": 1, "price": str(p.price)} for p in self.store["products"][:10]
+        }
+        session.save()
+
+    def assertBudget(self, url, budget):
+        self.assertEqual(self.client.get(url, secure=True).status_code, 200)  # warm caches
+        with self.assertQueryBudget(budget):
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+
+    def test_storefront(self):
+        product = self.store["products"][0]
+        for url, budget in (
+            (reverse("core:home"), 4),
+            (reverse("products:product_list"), 4),
+            (reverse("products:product_detail", args=[product.slug]), 6),
+            (reverse("cart:cart_detail"), 4),
+            (reverse("orders:checkout"), 5),
+            (reverse("accounts:profile"), 6),
+        ):
+            with self.subTest(url=url):
+                self.assertBudget(url, budget)
+
+    def test_staff_lists(self):
+        for url, budget in (
+            (reverse("core:orders_list"), 2),
+            (reverse("core:coupons_list"), 1),
+            (reverse("core:customers_list"), 2),
+        ):
+            with self.subTest(url=url):
+                self.assertBudget(url, budget)
+
+    def test_staff_product_list(self):
+        # core:products_list is shadowed by the catalog's /products/ route.
+        request = RequestFactory().get("/")
+        request.user = self.user
+        request.session = {}
+        with self.assertQueryBudget(1):
+            ProductListView.as_view()(request).render()
+
+    def test_reports_repeated_queries(self):
+        orders = staff_models.Order.objects.all()
+        with self.assertRaisesMessage(AssertionError, "5x SELECT"):
+            with self.assertQueryBudget(10):
+                [order.user.email for order in orders]
+        self.assertEqual(repeated_queries([{"sql": "SAVEPOINT s1"}, {"sql": "SAVEPOINT s2"}]), [])
+
+
+class BenchmarkTests(TestCase):
+    counts = benchmark.Counts(categories=3, products=20, reviews=30, users=5, wishlists=10, orders=15)
+
+    def snapshot(self):
+        return (
+            list(Product.objects.order_by("slug").values_list("slug", "name", "price", "category__slug")),
+            list(Order.objects.order_by("total_price").values_list("user__username", "status", "total_price")),
+        )
+
+    def test_seed_is_deterministic(self):
+        created = benchmark.seed(self.counts, seed=7)
+        self.assertEqual((created["products"], created["orders"], created["wishlists"]), (20, 15, 10))
+        first = self.snapshot()
+        benchmark.clear()
+        self.assertFalse(Product.objects.exists())
+        benchmark.seed(self.counts, seed=7)
+        self.assertEqual(self.snapshot(), first)
+        self.assertEqual(
+            DailySales.objects.aggregate(n=Sum("order_count"))["n"],
+            Order.objects.filter(status__in=Order.SALE_STATUSES).count(),
+        )
+
+    def test_run_reports_latency_and_queries(self):
+        benchmark.seed(self.counts)
+        results = benchmark.run(iterations=3, warmup=0, only={"products:product_list", "products:product_detail"})
+        rows = {row["name"]: row for row in results["results"]}
+        self.assertEqual(set(rows), {"products:product_list", "products:product_detail"})
+        for row in rows.values():
+            self.assertEqual(row["status"], 200)
+            self.assertLessEqual(row["p50_ms"], row["p95_ms"])
+            self.assertGreater(row["queries"], 0)
+        self.assertIn({"name": "cart:cart_add", "reason": "changes state"}, results["skipped"])
+        self.assertEqual(benchmark.percentile([5, 1, 4, 2, 3], 50), 3)
+
+    def test_cart_stores_report_bytes_per_mutation(self):
+        benchmark.seed(self.counts)
+        results = benchmark.run_cart(mutations=20, lines=5)
+        rows = {row["store"]: row for row in results["results"]}
+        legacy = rows["session (legacy format)"]["bytes_per_mutation"]
+        self.assertLess(rows["cart.stores.SessionCartStore"]["bytes_per_mutation"], legacy)
+        self.assertLess(rows["cart.stores.CacheCartStore"]["bytes_per_mutation"], legacy)
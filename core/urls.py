@@ -11,6 +11,7 @@ app_name = "core"
 urlpatterns = [
     path("", views.home, name="home"),
     path("contact/", views.contact, name="contact"),
+    path("personal/", views.personal, name="personal"),
 
     # Admin Dashboard
     path('dashboard/', AdminDashboardView.as_view(), name='dashboard'),
@@ -1,10 +1,25 @@
 from django.shortcuts import render, redirect
+from django.http import JsonResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.views.decorators.cache import never_cache
 from django.core.mail import send_mail
 from django.contrib import messages
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.conf import settings
 from django.views.generic import TemplateView, ListView, CreateView, UpdateView
 from django.urls import reverse_lazy
 from django.contrib.auth import get_user_model
+from decimal import Decimal
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from orders.analytics import sales_analytics
+from orders.models import DailySales
+from orders.sales import sales_trend, summarize
+from cart.context_processors import get_cart_summary
+from products.models import Product as CatalogProduct
+from .conditional import conditional_page, listing_validator
+from .pagecache import cache_anonymous_page, tag_page
 from .models import Product, Category, Order, Coupon
 
 # Get the correct User model (custom or default)
@@ -13,10 +28,28 @@ User = get_user_model()
 # ----------------------------
 # Home Page
 # ----------------------------
+def catalog_state(request, *args, **kwargs):
+    return listing_validator(CatalogProduct.objects.filter(available=True))
+
+
+@cache_anonymous_page
+@conditional_page(catalog_state)
 def home(request):
-    products = Product.objects.filter(available=True).order_by('-created_at')[:8]
+    products = list(CatalogProduct.objects.filter(available=True).order_by('-created_at')[:8])
+    tag_page(request, "listing:all", *(f"product:{product.pk}" for product in products))
     return render(request, "core/home.html", {"products": products})
 
+# ----------------------------
+# Personal fragment for cacheable pages (see core.conditional)
+# ----------------------------
+@never_cache
+def personal(request):
+    return JsonResponse({
+        "cart_item_count": get_cart_summary(request).item_count,
+        "messages_html": render_to_string("core/_messages.html", request=request),
+        "csrf_token": get_token(request),
+    })
+
 # ----------------------------
 # Contact Page
 # ----------------------------
@@ -48,13 +81,28 @@ def contact(request):
 # ----------------------------
 # Admin Dashboard Overview
 # ----------------------------
-class AdminDashboardView(TemplateView):
+class AdminDashboardView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
     template_name = "admin/dashboard.html"
 
+    def test_func(self):
+        return self.request.user.is_staff
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['total_sales'] = Order.objects.filter(status='delivered').count()
-        context['total_revenue'] = sum(o.total_price for o in Order.objects.filter(status='delivered'))
+        # Read the per-day rollup (orders.sales), not every order.
+        totals = DailySales.objects.aggregate(
+            orders=Coalesce(Sum('order_count'), 0),
+            revenue=Coalesce(Sum('revenue'), Decimal('0.00')),
+        )
+        context['total_sales'] = totals['orders']
+        context['total_revenue'] = totals['revenue']
+        trend_30 = sales_trend(30)
+        context['trend_30'] = trend_30
+        context['trend_7'] = trend_30[-7:]
+        context['trend_summaries'] = [(7, summarize(trend_30[-7:])), (30, summarize(trend_30))]
+        peak = max(row.revenue for row in trend_30)
+        context['trend_peak'] = peak or 1
+        context['analytics'] = sales_analytics()
         context['total_customers'] = User.objects.count()
         context['low_stock'] = Product.objects.filter(stock__lte=5)
         return context
@@ -63,7 +111,7 @@ class AdminDashboardView(TemplateView):
 # Products
 # ----------------------------
 class ProductListView(ListView):
-    model = Product
+    queryset = Product.objects.select_related('category')
     template_name = "admin/products_list.html"
 
 class ProductCreateView(CreateView):
@@ -82,11 +130,11 @@ class ProductUpdateView(UpdateView):
 # Orders
 # ----------------------------
 class OrderListView(ListView):
-    model = Order
+    queryset = Order.objects.select_related('user')
     template_name = "admin/orders_list.html"
 
 class OrderUpdateStatusView(UpdateView):
-    model = Order
+    queryset = Order.objects.select_related('user')
     fields = ['status']
     template_name = "admin/order_update.html"
     success_url = reverse_lazy('core:orders_list')
@@ -51,8 +51,10 @@ INSTALLED_APPS = [
 # ---------------------------------------------------------
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.profiling.QueryProfilingMiddleware',  # Sampled SQL/template timing
     'whitenoise.middleware.WhiteNoiseMiddleware',  # For static files
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'cart.stores.CartStoreMiddleware',  # One cart write per request
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -67,7 +69,7 @@ ROOT_URLCONF = 'ecommerce.urls'
 # ---------------------------------------------------------
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "core.profiling.ProfiledDjangoTemplates",
         "DIRS": [
             BASE_DIR / "templates",
             BASE_DIR / "core" / "templates",
@@ -97,6 +99,26 @@ DATABASES = {
         conn_max_age=600
     )
 }
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Take the write lock at BEGIN so concurrent checkouts queue on the
+    # busy timeout instead of failing to upgrade a read lock.
+    DATABASES['default'].setdefault('OPTIONS', {}).update({'transaction_mode': 'IMMEDIATE', 'timeout': 20})
+    # A file, not the shared in-memory database, so threaded tests see
+    # real locking rather than "table is locked" errors.
+    DATABASES['default'].setdefault('TEST', {}).setdefault('NAME', BASE_DIR / 'test_db.sqlite3')
+
+# ---------------------------------------------------------
+# CACHE
+# ---------------------------------------------------------
+# Local memory by default (one cache per process). With several workers,
+# set CACHE_BACKEND to FileBasedCache (LOCATION = a shared directory) or
+# Redis so invalidations reach every process.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='ecommerce'),
+    }
+}
 
 # ---------------------------------------------------------
 # PASSWORD VALIDATION
@@ -125,6 +147,25 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Threads generating product image thumbnails/WebP (0 = inline)
+PRODUCT_IMAGE_WORKERS = config('PRODUCT_IMAGE_WORKERS', default=2, cast=int)
+
+# Processes rendering invoice PDFs after status changes (0 = inline)
+INVOICE_WORKERS = config('INVOICE_WORKERS', default=1, cast=int)
+
+# Share of requests (0-1) profiled by core.profiling.QueryProfilingMiddleware:
+# a JSON line on the "core.profiling" logger, plus a Server-Timing header
+# for staff (or everyone when DEBUG is on). Off unless configured.
+REQUEST_PROFILING_SAMPLE_RATE = config('REQUEST_PROFILING_SAMPLE_RATE', default=0, cast=float)
+
+# Seconds a browser or reverse proxy may reuse an anonymous catalog page
+# before revalidating it with its ETag (core.conditional)
+CATALOG_CACHE_SECONDS = config('CATALOG_CACHE_SECONDS', default=60, cast=int)
+
+# Upper bound on how long core.pagecache keeps an anonymous page; tagged
+# entries are normally invalidated by products.signals well before this
+PAGE_CACHE_SECONDS = config('PAGE_CACHE_SECONDS', default=60 * 60, cast=int)
+
 # Whitenoise configuration
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
@@ -141,6 +182,14 @@ LOGOUT_REDIRECT_URL = "accounts:login"
 # CART SETTINGS
 # ---------------------------------------------------------
 CART_SESSION_ID = 'cart'
+# Where carts are kept: cart.stores.SessionCartStore or CacheCartStore
+# (needs a shared cache such as Redis in production, not the locmem default).
+CART_STORE = config('CART_STORE', default='cart.stores.SessionCartStore')
+# Longest a logged-in user's cart changes wait before being saved to the database.
+CART_SYNC_SECONDS = config('CART_SYNC_SECONDS', default=60, cast=int)
+# Hold stock for items in carts (see products.inventory), and for how long.
+STOCK_HOLDS = config('STOCK_HOLDS', default=False, cast=bool)
+STOCK_HOLD_SECONDS = config('STOCK_HOLD_SECONDS', default=900, cast=int)
 
 # ---------------------------------------------------------
 # EMAIL CONFIGURATION (via environment variables)
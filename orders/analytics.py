@@ -0,0 +1,224 @@
+# orders/analytics.py
+"""
+Customer and catalog analytics for the staff dashboard.
+
+Orders and order lines are streamed with ``values_list().iterator()``
+straight into NumPy column arrays (no model instances) and every metric
+is computed with vectorized array operations, so a million lines take
+seconds. Results are cached under the "orders" version counter, which
+orders.signals bumps whenever an order is saved or deleted.
+"""
+import numpy as np
+from django.core.cache import cache
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from core.cache import get_version
+from products.models import Category
+from .models import Order, OrderItem
+
+CACHE_KEY = "orders:analytics:{}"
+CHUNK_SIZE = 10000
+COHORT_MONTHS = 12
+SECONDS_PER_DAY = 86400
+
+ORDER_DTYPE = np.dtype([("user", np.int64), ("ts", np.float64), ("total", np.float64)])
+LINE_DTYPE = np.dtype([("category", np.int64), ("quantity", np.int64), ("amount", np.float64)])
+
+# (name, test on the R/F/M scores 1-5); the first match wins.
+RFM_SEGMENTS = [
+    ("Champions", lambda r, f, m: (r >= 4) & (f >= 4)),
+    ("Loyal", lambda r, f, m: (r >= 3) & (f >= 4)),
+    ("Big spenders", lambda r, f, m: m >= 5),
+    ("New", lambda r, f, m: (r >= 4) & (f <= 1)),
+    ("Promising", lambda r, f, m: r >= 4),
+    ("At risk", lambda r, f, m: (r <= 2) & (f >= 3)),
+    ("Hibernating", lambda r, f, m: r <= 2),
+    ("Needs attention", lambda r, f, m: np.ones_like(r, dtype=bool)),
+]
+
+
+# Loading -------------------------------------------------------------
+
+def load_orders(orders=None):
+    """
+    (user, unix time, total) for every customer sale, as a record array.
+    """
+    if orders is None:
+        orders = Order.objects.all()
+    rows = (
+        orders.filter(status__in=Order.SALE_STATUSES, user__isnull=False).order_by()
+        .values_list("user_id", "created_at", Cast("total_price", FloatField()))
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    return np.fromiter(
+        ((user, created.timestamp(), total) for user, created, total in rows), dtype=ORDER_DTYPE
+    )
+
+
+def load_lines(items=None):
+    """
+    (category, quantity, quantity * price) for every line of a sale; lines
+    whose product is gone get category 0.
+    """
+    if items is None:
+        items = OrderItem.objects.all()
+    rows = (
+        items.filter(order__status__in=Order.SALE_STATUSES).order_by()
+        .values_list(
+            Coalesce("product__category_id", Value(0)),
+            "quantity",
+            Cast(F("price") * F("quantity"), FloatField()),
+        )
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    return np.fromiter(rows, dtype=LINE_DTYPE)
+
+
+# Metrics -------------------------------------------------------------
+
+def _months(ts):
+    """
+    Unix times -> months since 1970-01.
+    """
+    return ts.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+
+
+def cohort_retention(orders, months=COHORT_MONTHS):
+    """
+    Customers grouped by the month of their first order. For each cohort:
+    its size and the share of it that ordered again 0..months-1 months
+    later (month 0 is always 1.0).
+    """
+    if not len(orders):
+        return []
+    users, customer = np.unique(orders["user"], return_inverse=True)
+    month = _months(orders["ts"])
+    first = np.full(len(users), np.iinfo(np.int64).max)
+    np.minimum.at(first, customer, month)
+    offset = month - first[customer]
+
+    keep = offset < months
+    # Count each customer once per (cohort, month offset).
+    active = np.unique(customer[keep] * months + offset[keep])
+    active_customer, active_offset = np.divmod(active, months)
+    cohorts, cohort_index = np.unique(first, return_inverse=True)
+    grid = np.zeros((len(cohorts), months), dtype=np.int64)
+    np.add.at(grid, (cohort_index[active_customer], active_offset), 1)
+
+    sizes = grid[:, 0]
+    rates = grid / sizes[:, None]
+    return [
+        {
+            "cohort": str(np.datetime64(int(cohort), "M")),
+            "customers": int(size),
+            "retention": [round(float(rate), 4) for rate in row],
+        }
+        for cohort, size, row in zip(cohorts, sizes, rates)
+    ]
+
+
+def repeat_purchase_rate(orders):
+    """
+    Share of customers with more than one order.
+    """
+    if not len(orders):
+        return 0.0
+    _, counts = np.unique(orders["user"], return_counts=True)
+    return round(float(np.mean(counts > 1)), 4)
+
+
+def revenue_by_category(lines):
+    """
+    [{"category", "revenue", "units"}], highest revenue first.
+    """
+    if not len(lines):
+        return []
+    categories, index = np.unique(lines["category"], return_inverse=True)
+    revenue = np.bincount(index, weights=lines["amount"])
+    units = np.bincount(index, weights=lines["quantity"])
+    names = dict(Category.objects.filter(pk__in=categories.tolist()).values_list("pk", "name"))
+    order = np.argsort(-revenue, kind="stable")
+    return [
+        {
+            "category": names.get(int(categories[i]), "Uncategorized"),
+            "revenue": round(float(revenue[i]), 2),
+            "units": int(units[i]),
+        }
+        for i in order
+    ]
+
+
+def _quintile_scores(values):
+    """
+    Score each value 1-5 by quintile of ``values``.
+    """
+    edges = np.quantile(values, [0.2, 0.4, 0.6, 0.8])
+    return 1 + np.searchsorted(edges, values, side="left")
+
+
+def rfm_segments(orders, now=None):
+    """
+    Score every customer 1-5 on recency (days since last order, recent is
+    better), frequency (order count) and monetary value (total spent), then
+    bucket them with RFM_SEGMENTS.
+    """
+    if not len(orders):
+        return []
+    now = (now or timezone.now()).timestamp()
+    users, customer = np.unique(orders["user"], return_inverse=True)
+    last = np.zeros(len(users))
+    np.maximum.at(last, customer, orders["ts"])
+    recency = (now - last) / SECONDS_PER_DAY
+    frequency = np.bincount(customer)
+    monetary = np.bincount(customer, weights=orders["total"])
+
+    r = 6 - _quintile_scores(recency)
+    f = _quintile_scores(frequency)
+    m = _quintile_scores(monetary)
+
+    unassigned = np.ones(len(users), dtype=bool)
+    segments = []
+    for name, test in RFM_SEGMENTS:
+        members = unassigned & test(r, f, m)
+        unassigned &= ~members
+        count = int(members.sum())
+        if count:
+            segments.append({
+                "segment": name,
+                "customers": count,
+                "share": round(count / len(users), 4),
+                "avg_recency_days": round(float(recency[members].mean()), 1),
+                "avg_orders": round(float(frequency[members].mean()), 2),
+                "avg_spend": round(float(monetary[members].mean()), 2),
+            })
+    return segments
+
+
+# Entry point ---------------------------------------------------------
+
+def compute_analytics(now=None):
+    orders = load_orders()
+    lines = load_lines()
+    return {
+        "customers": int(len(np.unique(orders["user"]))),
+        "orders": int(len(orders)),
+        "repeat_purchase_rate": repeat_purchase_rate(orders),
+        "cohorts": cohort_retention(orders),
+        "revenue_by_category": revenue_by_category(lines),
+        "rfm_segments": rfm_segments(orders, now),
+    }
+
+
+def sales_analytics():
+    """
+    compute_analytics(), cached until an order is saved or deleted (or a
+    day passes, so recency stays current).
+    """
+    key = CACHE_KEY.format(get_version("orders"))
+    result = cache.get(key)
+    if result is None:
+        result = compute_analytics()
+        cache.set(key, result, 86400)
+    return result
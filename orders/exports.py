@@ -0,0 +1,92 @@
+# orders/exports.py
+"""
+Invoice exports for accounting: many invoices as one streamed ZIP.
+
+The archive is written to a write-only sink and handed out chunk by
+chunk, orders are read with iterator(), and PDFs are converted a window
+at a time (orders.invoices.invoice_pdfs), so memory stays flat no matter
+how many orders match.
+"""
+import os
+import zipfile
+
+from django.conf import settings
+
+from .invoices import invoice_orders, invoice_pdfs, process_pool
+
+ERRORS_NAME = "errors.txt"
+
+
+class _Sink:
+    """
+    Unseekable file object that collects what zipfile writes until drained.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def export_workers():
+    """
+    Every core, unless invoice rendering is configured to run inline.
+    """
+    if settings.INVOICE_WORKERS <= 0:
+        return 0
+    return os.cpu_count() or 1
+
+
+def request_workers():
+    """
+    Workers for an export served in a web request: at most INVOICE_WORKERS,
+    so one download cannot start a process per core inside the app server.
+    Use the export_invoices command for large exports.
+    """
+    return min(export_workers(), settings.INVOICE_WORKERS)
+
+
+def export_orders(form):
+    return form.orders(invoice_orders()).order_by("pk")
+
+
+def stream_invoice_zip(orders, workers=None, chunk_size=200, failed=None):
+    """
+    Yield a ZIP of ``invoice_<id>.pdf`` files for ``orders`` as bytes.
+
+    Missing PDFs are converted in a process pool of ``workers`` processes
+    (see export_workers) and stored, so a repeat export is just file reads.
+    Orders whose invoice could not be rendered are left out, listed in an
+    ``errors.txt`` entry at the end and appended to ``failed`` if given.
+    """
+    failed = [] if failed is None else failed
+    workers = export_workers() if workers is None else workers
+    executor = process_pool(workers) if workers > 0 else None
+    sink = _Sink()
+    try:
+        # PDFs are already compressed; deflating them again buys nothing.
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+            for order, pdf in invoice_pdfs(orders.iterator(chunk_size=chunk_size), executor):
+                if pdf is None:
+                    failed.append(order.pk)
+                    continue
+                archive.writestr(f"invoice_{order.pk}.pdf", pdf)
+                yield sink.drain()
+            if failed:
+                archive.writestr(
+                    ERRORS_NAME, "".join(f"invoice_{pk}.pdf: could not be rendered\n" for pk in failed)
+                )
+        yield sink.drain()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
@@ -0,0 +1,28 @@
+from django import forms
+
+from .models import Order
+
+
+class InvoiceExportForm(forms.Form):
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    status = forms.ChoiceField(choices=[("", "Any")] + Order.STATUS_CHOICES, required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get("start"), cleaned_data.get("end")
+        if start and end and start > end:
+            raise forms.ValidationError("The start date must be on or before the end date.")
+        return cleaned_data
+
+    def orders(self, queryset):
+        """
+        Filter ``queryset`` by the cleaned date range and status.
+        """
+        if self.cleaned_data.get("start"):
+            queryset = queryset.filter(created_at__date__gte=self.cleaned_data["start"])
+        if self.cleaned_data.get("end"):
+            queryset = queryset.filter(created_at__date__lte=self.cleaned_data["end"])
+        if self.cleaned_data.get("status"):
+            queryset = queryset.filter(status=self.cleaned_data["status"])
+        return queryset
@@ -0,0 +1,163 @@
+# orders/invoices.py
+"""
+Invoice PDFs, rendered once and kept in the default storage (MEDIA_ROOT).
+
+Files are stored as ``invoices/<order id>/<hash>.pdf``, where the hash is
+taken from the invoice HTML. Rendering the HTML is cheap; xhtml2pdf is
+not, so a download only converts when no file exists for the current
+HTML. The hash doubles as the download's ETag.
+
+Status changes pre-render invoices in a process pool (INVOICE_WORKERS).
+The worker processes are spawned, not forked, so they never share the
+parent's database connections, and they only run html_to_pdf.
+"""
+import hashlib
+import logging
+import multiprocessing
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+
+from .models import Order, OrderItem
+from .pdf import html_to_pdf
+
+logger = logging.getLogger(__name__)
+
+INVOICE_DIR = "invoices"
+TEMPLATE = "orders/invoice.html"
+
+_executor = None
+
+
+@dataclass(frozen=True)
+class Invoice:
+    name: str
+    etag: str
+
+
+def invoice_orders():
+    """
+    Orders with everything the invoice template reads.
+    """
+    return Order.objects.select_related("shipping_address").prefetch_related(
+        Prefetch("items", queryset=OrderItem.objects.select_related("product"))
+    )
+
+
+def render_html(order):
+    return render_to_string(TEMPLATE, {"order": order})
+
+
+def locate(order, html):
+    digest = hashlib.sha256(html.encode()).hexdigest()[:20]
+    return Invoice(posixpath.join(INVOICE_DIR, str(order.pk), f"{digest}.pdf"), f'"{digest}"')
+
+
+def store(invoice, pdf, storage=default_storage):
+    """
+    Save ``pdf`` as ``invoice`` and drop older versions for the same order.
+    """
+    if not storage.exists(invoice.name):
+        storage.save(invoice.name, ContentFile(pdf))
+    directory, filename = posixpath.split(invoice.name)
+    for stale in storage.listdir(directory)[1]:
+        if stale != filename:
+            storage.delete(posixpath.join(directory, stale))
+    return invoice
+
+
+def get_invoice(order, storage=default_storage):
+    """
+    The stored invoice for ``order``, rendering it now if it is missing.
+    ``order`` should come from invoice_orders().
+    """
+    html = render_html(order)
+    invoice = locate(order, html)
+    if not storage.exists(invoice.name):
+        store(invoice, html_to_pdf(html), storage)
+    return invoice
+
+
+def process_pool(workers):
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = process_pool(max(1, settings.INVOICE_WORKERS))
+    return _executor
+
+
+def _stored(invoice, future):
+    try:
+        store(invoice, future.result())
+    except Exception:
+        logger.exception("Could not render %s", invoice.name)
+
+
+def schedule_invoice(order_id):
+    """
+    Make sure the invoice for ``order_id`` is stored, converting it in the
+    process pool; runs inline when INVOICE_WORKERS is 0.
+    """
+    order = invoice_orders().filter(pk=order_id).first()
+    if order is None:
+        return None
+    if settings.INVOICE_WORKERS <= 0:
+        return get_invoice(order)
+
+    html = render_html(order)
+    invoice = locate(order, html)
+    if not default_storage.exists(invoice.name):
+        future = get_executor().submit(html_to_pdf, html)
+        future.add_done_callback(lambda future: _stored(invoice, future))
+    return invoice
+
+
+def invoice_pdfs(orders, executor=None, window=64, storage=default_storage):
+    """
+    Yield ``(order, pdf bytes)`` for every order in ``orders``, in order.
+
+    Stored invoices are read back as they are; the rest are converted
+    ``window`` at a time across ``executor`` (inline without one) and
+    stored for next time. Only one window is held in memory. An invoice
+    that fails to convert is logged and yielded with None for its bytes,
+    so one bad order does not end the run.
+    """
+    orders = iter(orders)
+    while chunk := list(islice(orders, window)):
+        invoices = []
+        missing = []
+        for order in chunk:
+            html = render_html(order)
+            invoice = locate(order, html)
+            invoices.append(invoice)
+            if not storage.exists(invoice.name):
+                missing.append((invoice, html))
+
+        futures = [executor.submit(html_to_pdf, html) for _, html in missing] if executor else None
+        rendered = {}
+        for n, (invoice, html) in enumerate(missing):
+            try:
+                pdf = futures[n].result() if executor else html_to_pdf(html)
+            except Exception:
+                logger.exception("Could not render %s", invoice.name)
+                rendered[invoice.name] = None
+                continue
+            store(invoice, pdf, storage)
+            rendered[invoice.name] = pdf
+
+        for order, invoice in zip(chunk, invoices):
+            pdf = rendered.get(invoice.name)
+            if invoice.name not in rendered:
+                with storage.open(invoice.name, "rb") as fh:
+                    pdf = fh.read()
+            yield order, pdf
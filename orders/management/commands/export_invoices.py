@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.exports import export_orders, export_workers, stream_invoice_zip
+from orders.forms import InvoiceExportForm
+
+
+class Command(BaseCommand):
+    help = "Write invoices for a date range and/or status to a ZIP file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Path of the ZIP file to write.")
+        parser.add_argument("--start", help="First order date (YYYY-MM-DD).")
+        parser.add_argument("--end", help="Last order date (YYYY-MM-DD).")
+        parser.add_argument("--status", help="Only orders with this status.")
+        parser.add_argument("--workers", type=int, help="Rendering processes (default: one per core).")
+
+    def handle(self, *args, **options):
+        form = InvoiceExportForm({key: options[key] for key in ("start", "end", "status")})
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+
+        orders = export_orders(form)
+        workers = export_workers() if options["workers"] is None else options["workers"]
+        failed = []
+        with open(options["output"], "wb") as fh:
+            for chunk in stream_invoice_zip(orders, workers, failed=failed):
+                fh.write(chunk)
+        exported = orders.count() - len(failed)
+        self.stdout.write(self.style.SUCCESS(f"Exported {exported} invoices to {options['output']}."))
+        if failed:
+            self.stderr.write(f"Could not render invoices for orders {', '.join(map(str, failed))}.")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from orders.sales import rebuild_sales
+
+
+class Command(BaseCommand):
+    help = "Recompute the DailySales rollup from every order."
+
+    def handle(self, *args, **options):
+        rows = rebuild_sales()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt sales for {len(rows)} days."))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.outbox import BATCH_SIZE, MAX_ATTEMPTS, send_batch
+
+
+class Command(BaseCommand):
+    help = "Send queued order emails from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS)
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep polling for new emails instead of exiting when empty."
+        )
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds to sleep when idle with --loop.")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = send_batch(options["batch_size"], options["max_attempts"])
+            total_sent += sent
+            total_failed += failed
+            if sent + failed < options["batch_size"]:
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS(f"Sent {total_sent} emails, {total_failed} failed."))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:57
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_rename_transaction_id_order_paypal_transaction_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(choices=[('placed', 'Order placed'), ('shipped', 'Order shipped'), ('delivered', 'Order delivered')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emails', to='orders.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='order_email_due_idx')],
+                'constraints': [models.UniqueConstraint(fields=('order', 'event'), name='order_email_once_per_event')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:02
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+SALE_STATUSES = ("Paid", "Shipped", "Completed")
+
+
+def backfill_sales(apps, schema_editor):
+    Order = apps.get_model("orders", "Order")
+    OrderItem = apps.get_model("orders", "OrderItem")
+    DailySales = apps.get_model("orders", "DailySales")
+    alias = schema_editor.connection.alias
+    units = dict(
+        OrderItem.objects.using(alias).filter(order__status__in=SALE_STATUSES)
+        .annotate(day=TruncDate("order__created_at"))
+        .values("day").annotate(n=Sum("quantity")).values_list("day", "n")
+    )
+    days = (
+        Order.objects.using(alias).filter(status__in=SALE_STATUSES)
+        .annotate(day=TruncDate("created_at"))
+        .values("day").annotate(n=Count("id"), revenue=Sum("total_price")).order_by("day")
+    )
+    DailySales.objects.using(alias).bulk_create([
+        DailySales(date=row["day"], order_count=row["n"], units=units.get(row["day"]) or 0,
+                   revenue=row["revenue"])
+        for row in days
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_email_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'daily sales',
+                'ordering': ['date'],
+            },
+        ),
+        migrations.RunPython(backfill_sales, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,8 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 from products.models import Product
 
 # -------------------- SHIPPING ADDRESS MODEL --------------------
@@ -38,6 +41,8 @@ class Order(models.Model):
         (COMPLETED, "Completed"),
         (CANCELED, "Canceled"),
     ]
+    # Statuses counted as sales in the DailySales rollup
+    SALE_STATUSES = (PAID, SHIPPED, COMPLETED)
 
     # Payment method
     STRIPE = "Stripe"
@@ -80,26 +85,42 @@ class Order(models.Model):
     class Meta:
         ordering = ["-created_at"]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the DailySales rollup currently includes.
+        instance._counted = (instance.__dict__.get("status"), instance.__dict__.get("total_price"))
+        # And the status its invoice was last rendered for (orders.signals).
+        instance._invoiced = instance.__dict__.get("status")
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The order row and the sales rollup commit together.
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Order #{self.pk} - {self.status}"
 
+    def is_sale(self):
+        return self.status in self.SALE_STATUSES
+
     def is_paid(self):
         return self.status == self.PAID
 
     def calculate_totals(self):
         """
-        Update subtotal, tax, shipping_fee, and total_price automatically.
+        Recompute subtotal, tax, shipping_fee and total_price from the saved
+        items. Checkout writes these up front; this is for edited orders.
         """
-        subtotal = sum(item.subtotal() for item in self.items.all())
-        shipping_fee = 10.00 if subtotal > 0 else 0.00
-        tax_amount = subtotal * 0.1  # 10% tax
-        total_price = subtotal + shipping_fee + tax_amount
+        from cart.pricing import SHIPPING_FEE, TAX_RATE, ZERO
 
+        subtotal = sum((item.subtotal() for item in self.items.all()), ZERO)
         self.subtotal = subtotal
-        self.shipping_fee = shipping_fee
-        self.tax_amount = tax_amount
-        self.total_price = total_price
-        self.save()
+        self.shipping_fee = SHIPPING_FEE if subtotal > 0 else ZERO
+        self.tax_amount = (subtotal * TAX_RATE).quantize(Decimal("0.01"))
+        self.total_price = self.subtotal + self.shipping_fee + self.tax_amount
+        self.save(update_fields=["subtotal", "shipping_fee", "tax_amount", "total_price", "updated_at"])
 
 # -------------------- ORDER ITEM MODEL --------------------
 class OrderItem(models.Model):
@@ -115,6 +136,73 @@ class OrderItem(models.Model):
         return f"{self.product} × {self.quantity}"
 
 
+# -------------------- EMAIL OUTBOX --------------------
+class OrderEmail(models.Model):
+    """
+    An order notification waiting to be sent. Rows are written in the
+    same transaction as the order change and sent by the
+    send_order_emails command (see orders.outbox).
+    """
+    PLACED = "placed"
+    SHIPPED = "shipped"
+    DELIVERED = "delivered"
+    EVENT_CHOICES = [
+        (PLACED, "Order placed"),
+        (SHIPPED, "Order shipped"),
+        (DELIVERED, "Order delivered"),
+    ]
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    ]
 
+    order = models.ForeignKey(Order, related_name="emails", on_delete=models.CASCADE)
+    event = models.CharField(max_length=20, choices=EVENT_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["order", "event"], name="order_email_once_per_event"),
+        ]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="order_email_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_event_display()} email for order #{self.order_id}"
+
+
+# -------------------- SALES ROLLUP --------------------
+class DailySales(models.Model):
+    """
+    Per-day totals of orders in Order.SALE_STATUSES, keyed by the day the
+    order was placed. Kept current by orders.sales; rebuild with
+    ``manage.py rebuild_sales_rollup``.
+    """
+    date = models.DateField(unique=True)
+    order_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ["date"]
+        verbose_name_plural = "daily sales"
+
+    def __str__(self):
+        return f"{self.date}: {self.order_count} orders, {self.revenue}"
 
+    @property
+    def average_order_value(self):
+        if not self.order_count:
+            return Decimal("0.00")
+        return (self.revenue / self.order_count).quantize(Decimal("0.01"))
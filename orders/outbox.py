@@ -0,0 +1,152 @@
+# orders/outbox.py
+"""
+Transactional outbox for order emails.
+
+Checkout and status changes only insert an OrderEmail row, in the same
+transaction as the order write, so a slow or unreachable mail server can
+never stall or break them. ``manage.py send_order_emails`` drains the
+outbox in batches, one SMTP connection per batch, and retries failures
+with exponential backoff.
+
+Workers may overlap (a slow batch still sending when cron starts the
+next one): a batch first claims its rows by pushing their next_attempt_at
+out by CLAIM_TIMEOUT with a conditional UPDATE, so a row is sent by
+whichever worker claimed it and a crashed worker's rows come due again.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import OrderEmail, OrderItem
+
+logger = logging.getLogger(__name__)
+
+# event -> (template, subject)
+EVENTS = {
+    OrderEmail.PLACED: ("orders/order_placed.html", "Your Order has been Placed!"),
+    OrderEmail.SHIPPED: ("orders/order_shipped.html", "Your Order has been Shipped!"),
+    OrderEmail.DELIVERED: ("orders/order_delivered.html", "Your Order has been Delivered!"),
+}
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = timedelta(minutes=1)
+BACKOFF_MAX = timedelta(hours=1)
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def queue_order_email(order, event):
+    """
+    Add ``event`` for ``order`` to the outbox. Queuing the same event for
+    the same order twice is a no-op, so re-saving a shipped order does not
+    mail the customer again.
+    """
+    if not order.user_id:
+        return
+    OrderEmail.objects.bulk_create([OrderEmail(order=order, event=event)], ignore_conflicts=True)
+
+
+def backoff(attempts):
+    """
+    Delay before retry number ``attempts``: 1, 2, 4, 8... minutes, capped.
+    """
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def build_message(email, connection=None):
+    order = email.order
+    if not order.user or not order.user.email:
+        return None
+    template, subject = EVENTS[email.event]
+    return EmailMultiAlternatives(
+        subject,
+        "",
+        settings.DEFAULT_FROM_EMAIL,
+        [order.user.email],
+        connection=connection,
+        alternatives=[(render_to_string(template, {"order": order}), "text/html")],
+    )
+
+
+def claim_emails(limit, now):
+    """
+    Up to ``limit`` due emails, claimed for this worker: only rows still due
+    when the UPDATE runs are taken, so overlapping batches never share one.
+    """
+    due = OrderEmail.objects.filter(status=OrderEmail.PENDING, next_attempt_at__lte=now)
+    ids = list(due.order_by("next_attempt_at", "id").values_list("id", flat=True)[:limit])
+    if not ids:
+        return []
+    claimed_until = now + CLAIM_TIMEOUT
+    if not due.filter(id__in=ids).update(next_attempt_at=claimed_until):
+        return []
+    items = OrderItem.objects.select_related("product")
+    return list(
+        OrderEmail.objects.filter(id__in=ids, status=OrderEmail.PENDING, next_attempt_at=claimed_until)
+        .select_related("order__user", "order__shipping_address")
+        .prefetch_related(Prefetch("order__items", queryset=items))
+        .order_by("id")
+    )
+
+
+def send_batch(batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS):
+    """
+    Send up to ``batch_size`` due emails over one mail connection and
+    record the outcome of each. Returns (sent, failed).
+    """
+    now = timezone.now()
+    batch = claim_emails(batch_size, now)
+    if not batch:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        logger.warning("Could not connect to the mail server: %s", exc)
+        for email in batch:
+            _failed(email, exc, now, max_attempts)
+        failed = len(batch)
+    else:
+        try:
+            for email in batch:
+                try:
+                    message = build_message(email, connection)
+                    if message is not None:
+                        message.send()
+                except Exception as exc:
+                    logger.warning("Could not send %s: %s", email, exc)
+                    _failed(email, exc, now, max_attempts)
+                    failed += 1
+                    continue
+                if message is None:
+                    email.status = OrderEmail.FAILED
+                    email.last_error = "Order has no customer email address."
+                    failed += 1
+                else:
+                    email.status = OrderEmail.SENT
+                    email.sent_at = now
+                    email.attempts += 1
+                    sent += 1
+        finally:
+            connection.close()
+
+    OrderEmail.objects.bulk_update(
+        batch, ["status", "attempts", "next_attempt_at", "last_error", "sent_at"]
+    )
+    return sent, failed
+
+
+def _failed(email, exc, now, max_attempts):
+    email.attempts += 1
+    email.last_error = f"{type(exc).__name__}: {exc}"
+    if email.attempts >= max_attempts:
+        email.status = OrderEmail.FAILED
+    else:
+        email.next_attempt_at = now + backoff(email.attempts)
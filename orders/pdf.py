@@ -0,0 +1,20 @@
+# orders/pdf.py
+"""
+HTML to PDF conversion, kept free of Django imports so it can run in a
+freshly spawned worker process.
+"""
+from io import BytesIO
+
+from xhtml2pdf import pisa
+
+
+class PDFError(Exception):
+    pass
+
+
+def html_to_pdf(html):
+    buffer = BytesIO()
+    status = pisa.CreatePDF(html, dest=buffer)
+    if status.err:
+        raise PDFError(f"xhtml2pdf reported {status.err} error(s)")
+    return buffer.getvalue()
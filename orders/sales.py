@@ -0,0 +1,125 @@
+# orders/sales.py
+"""
+The DailySales rollup: order count, units and revenue per day for orders
+in Order.SALE_STATUSES, so the dashboard reads one row per day instead of
+every order.
+
+Order saves and deletes fold their change in with an F()-based UPDATE in
+the same transaction (see orders.signals); rebuild_sales() recomputes the
+table from scratch.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailySales, Order, OrderItem
+
+
+def adjust_sales(day, orders, units, revenue, using="default"):
+    """
+    Add the deltas to ``day``'s row, creating it on first use.
+    """
+    if not (orders or units or revenue):
+        return
+    rows = DailySales.objects.using(using).filter(date=day)
+    changes = {
+        "order_count": F("order_count") + orders,
+        "units": F("units") + units,
+        "revenue": F("revenue") + revenue,
+    }
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic(using=using):
+            DailySales.objects.using(using).create(
+                date=day, order_count=orders, units=units, revenue=revenue
+            )
+    except IntegrityError:
+        # Another transaction created the row first.
+        rows.update(**changes)
+
+
+def order_units(order, using="default"):
+    return OrderItem.objects.using(using).filter(order=order).aggregate(n=Sum("quantity"))["n"] or 0
+
+
+def record_order(order, using="default"):
+    """
+    Bring the rollup in line with ``order`` after it was saved, based on
+    what was counted when it was loaded (Order._counted).
+    """
+    old_status, old_total = getattr(order, "_counted", (None, None))
+    was_sale = old_status in Order.SALE_STATUSES
+    is_sale = order.is_sale()
+    day = timezone.localdate(order.created_at)
+
+    if was_sale and is_sale:
+        adjust_sales(day, 0, 0, order.total_price - old_total, using)
+    elif is_sale:
+        adjust_sales(day, 1, order_units(order, using), order.total_price, using)
+    elif was_sale:
+        adjust_sales(day, -1, -order_units(order, using), -old_total, using)
+    order._counted = (order.status, order.total_price)
+
+
+def forget_order(order, using="default"):
+    """
+    Take a counted order out of the rollup. Call before its items go.
+    """
+    old_status, old_total = getattr(order, "_counted", (None, None))
+    if old_status in Order.SALE_STATUSES:
+        day = timezone.localdate(order.created_at)
+        adjust_sales(day, -1, -order_units(order, using), -old_total, using)
+    order._counted = (None, None)
+
+
+def daily_totals(orders, items):
+    """
+    Unsaved DailySales rows aggregated from ``orders`` and their ``items``.
+    """
+    sales = orders.filter(status__in=Order.SALE_STATUSES)
+    units = dict(
+        items.filter(order__status__in=Order.SALE_STATUSES)
+        .annotate(day=TruncDate("order__created_at"))
+        .values("day").annotate(n=Sum("quantity")).values_list("day", "n")
+    )
+    return [
+        DailySales(date=row["day"], order_count=row["n"], units=units.get(row["day"]) or 0,
+                   revenue=row["revenue"])
+        for row in sales.annotate(day=TruncDate("created_at"))
+        .values("day").annotate(n=Count("id"), revenue=Sum("total_price")).order_by("day")
+    ]
+
+
+@transaction.atomic
+def rebuild_sales():
+    DailySales.objects.all().delete()
+    return DailySales.objects.bulk_create(
+        daily_totals(Order.objects.order_by(), OrderItem.objects.order_by()), batch_size=500
+    )
+
+
+def sales_trend(days, today=None):
+    """
+    One DailySales per day for the last ``days`` days (today included),
+    with empty days filled in, oldest first.
+    """
+    today = today or timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    rows = {row.date: row for row in DailySales.objects.filter(date__gte=start, date__lte=today)}
+    return [rows.get(start + timedelta(n), DailySales(date=start + timedelta(n))) for n in range(days)]
+
+
+def summarize(rows):
+    """
+    A single unsaved DailySales holding the totals of ``rows``.
+    """
+    return DailySales(
+        order_count=sum(row.order_count for row in rows),
+        units=sum(row.units for row in rows),
+        revenue=sum((row.revenue for row in rows), Decimal("0.00")),
+    )
@@ -1,24 +1,52 @@
 # signals.py
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
-from .models import Order
-from .utils import send_order_email
+from core.cache import bump_version
+from .invoices import schedule_invoice
+from .models import Order, OrderEmail
+from .outbox import queue_order_email
+from .sales import forget_order, record_order
 
 @receiver(post_save, sender=Order)
 def handle_order_status(sender, instance, created, **kwargs):
     """
-    - Calculate totals when order is created
-    - Send email notifications when status changes
+    Queue email notifications when an order is placed or its status
+    changes. The outbox row commits with the order; the
+    send_order_emails command delivers it.
     """
     if created:
-        instance.calculate_totals()
-        if instance.user and instance.payment_method != Order.COD:
-            send_order_email(instance, "orders/emails/order_placed.html", "Your Order has been Placed!")
-    else:
-        # Send email when status changes
-        if instance.status == Order.SHIPPED:
-            send_order_email(instance, "orders/emails/order_shipped.html", "Your Order has been Shipped!")
-        elif instance.status == Order.COMPLETED:
-            send_order_email(instance, "orders/emails/order_delivered.html", "Your Order has been Delivered!")
+        queue_order_email(instance, OrderEmail.PLACED)
+    elif instance.status == Order.SHIPPED:
+        queue_order_email(instance, OrderEmail.SHIPPED)
+    elif instance.status == Order.COMPLETED:
+        queue_order_email(instance, OrderEmail.DELIVERED)
 
 
+@receiver(post_save, sender=Order)
+def prerender_invoice(sender, instance, created, **kwargs):
+    """
+    Render the invoice in the background once a status change commits, so
+    the first download is served from storage. Saves that leave the status
+    alone (payment ids, address edits) schedule nothing.
+    """
+    if not created and getattr(instance, "_invoiced", None) != instance.status:
+        order_id = instance.pk
+        transaction.on_commit(lambda: schedule_invoice(order_id), robust=True)
+    instance._invoiced = instance.status
+
+
+@receiver(post_save, sender=Order)
+def update_sales_rollup(sender, instance, using, **kwargs):
+    record_order(instance, using)
+
+
+@receiver(pre_delete, sender=Order)
+def remove_from_sales_rollup(sender, instance, using, **kwargs):
+    forget_order(instance, using)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_analytics(sender, **kwargs):
+    bump_version("orders")
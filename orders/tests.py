@@ -1,3 +1,695 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.sessions.backends.db import SessionStore
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from cart.cart import Cart
+from cart.models import Cart as SavedCart, CartItem
+from cart.tests import make_products
+from products.inventory import OutOfStock, available_stock, decrement_stock, expire_holds
+from products.models import Category, Product, StockHold
+from .analytics import compute_analytics, load_lines, load_orders, sales_analytics
+from .exports import ERRORS_NAME, export_workers, request_workers
+from .models import DailySales, Order, OrderEmail, OrderItem
+from .outbox import BACKOFF_MAX, CLAIM_TIMEOUT, backoff, claim_emails, queue_order_email, send_batch
+from .pdf import PDFError, html_to_pdf
+from .sales import sales_trend, summarize
+from .services import EmptyCartError, place_order
+
+
+class PlaceOrderTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buyer", email="buyer@example.com", password="x")
+        self.products = make_products(50, price="12.50")
+
+    def make_cart(self, products, quantity=2):
+        request = RequestFactory().get("/")
+        request.session = SessionStore()
+        cart = Cart(request)
+        for product in products:
+            cart.add(product, quantity=quantity)
+        return cart
+
+    def test_order_written_with_totals(self):
+        order = place_order(self.make_cart(self.products[:5]), self.user)
+        order.refresh_from_db()
+        self.assertEqual(order.subtotal, Decimal("125.00"))
+        self.assertEqual(order.shipping_fee, Decimal("10.00"))
+        self.assertEqual(order.tax_amount, Decimal("12.50"))
+        self.assertEqual(order.total_price, Decimal("147.50"))
+        self.assertEqual(order.items.count(), 5)
+        self.assertEqual(order.payment_method, Order.COD)
+
+    def test_query_count_constant_as_order_grows(self):
+        counts = []
+        for size in (1, 10, 50):
+            cart = self.make_cart(self.products[:size])
+            with CaptureQueriesContext(connection) as queries:
+                place_order(cart, self.user)
+            counts.append(len(queries))
+        # pricing, stock UPDATE, INSERT order, outbox row, bulk INSERT items
+        # (plus savepoint bookkeeping)
+        self.assertEqual(counts, [counts[0]] * 3)
+        self.assertEqual(len([q for q in queries if q["sql"].startswith("INSERT")]), 3)
+
+    def test_no_second_update_after_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            place_order(self.make_cart(self.products[:3]), self.user)
+        self.assertFalse([q for q in queries if q["sql"].startswith('UPDATE "orders_order"')])
+
+    def test_failure_rolls_back_everything(self):
+        cart = self.make_cart(self.products[:3])
+        with mock.patch.object(OrderItem.objects, "bulk_create", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                place_order(cart, self.user)
+        self.assertFalse(Order.objects.exists())
+
+    def test_empty_cart(self):
+        with self.assertRaises(EmptyCartError):
+            place_order(self.make_cart([]), self.user)
+
+    def test_cod_checkout_view(self):
+        self.client.force_login(self.user)
+        session = self.client.session
+        session["cart"] = {str(p.id): {"quantity": 1, "price": str(p.price)} for p in self.products[:4]}
+        session.save()
+        response = self.client.post(reverse("orders:cod_checkout"), secure=True)
+        self.assertRedirects(response, reverse("orders:checkout_success"), fetch_redirect_response=False)
+        order = Order.objects.get()
+        self.assertEqual(order.total_price, Decimal("65.00"))
+        self.assertNotIn("cart", self.client.session)
+        # The email is queued, not sent, during the request.
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertTrue(order.emails.filter(event=OrderEmail.PLACED).exists())
+
+
+class StockDecrementTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buyer", password="x")
+        self.products = make_products(3, stock=5)
+
+    def make_cart(self, quantities):
+        request = RequestFactory().get("/")
+        request.session = SessionStore()
+        cart = Cart(request)
+        for product, quantity in zip(self.products, quantities):
+            cart.add(product, quantity=quantity)
+        return cart
+
+    def stock(self):
+        return list(Product.objects.order_by("id").values_list("stock", flat=True))
+
+    def test_checkout_takes_stock(self):
+        place_order(self.make_cart([1, 2, 5]), self.user)
+        self.assertEqual(self.stock(), [4, 3, 0])
+
+    def test_short_line_rolls_back_whole_order(self):
+        with self.assertRaises(OutOfStock) as ctx:
+            place_order(self.make_cart([1, 6, 5]), self.user)
+        self.assertEqual(ctx.exception.product_ids, [self.products[1].id])
+        self.assertEqual(self.stock(), [5, 5, 5])
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_repeated_product_lines_are_summed(self):
+        with self.assertRaises(OutOfStock):
+            decrement_stock([(self.products[0].id, 3), (self.products[0].id, 3)])
+        decrement_stock([(self.products[0].id, 3), (self.products[0].id, 2)])
+        self.assertEqual(self.stock(), [0, 5, 5])
+
+
+@override_settings(STOCK_HOLDS=True, STOCK_HOLD_SECONDS=600)
+class StockHoldTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buyer", password="x")
+        self.product, self.other = make_products(2, stock=5)
+
+    def make_cart(self):
+        request = RequestFactory().get("/")
+        request.session = SessionStore()
+        return Cart(request)
+
+    def available(self, holder=None):
+        return available_stock([self.product.id], holder)[self.product.id]
+
+    def test_holds_reserve_stock_for_their_cart(self):
+        first, second = self.make_cart(), self.make_cart()
+        first.add(self.product, 2)
+        first.add(self.product, 2)
+        self.assertEqual(self.available(), 1)
+        self.assertEqual(self.available(first.holder), 5)
+        with self.assertRaises(OutOfStock):
+            second.add(self.product, 2)
+        self.assertNotIn(self.product.id, second.lines)
+        second.add(self.product, 1)
+
+        first.update({self.product: 1})
+        self.assertEqual(self.available(), 3)
+        first.remove(self.product)
+        self.assertEqual(self.available(), 4)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 5)
+
+    def test_expired_holds_stop_counting_and_are_swept_in_batches(self):
+        cart = self.make_cart()
+        cart.add(self.product, 5)
+        self.assertEqual(self.available(), 0)
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.available(), 5)
+
+        expired = timezone.now() - timedelta(minutes=1)
+        StockHold.objects.bulk_create([
+            StockHold(holder=f"old{i}", product=self.other, quantity=1, expires_at=expired) for i in range(4)
+        ])
+        self.make_cart().add(self.other, 1)  # still active
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(expire_holds(batch_size=2), 5)
+        self.assertEqual(len([q for q in queries if q["sql"].startswith("DELETE")]), 3)
+        self.assertEqual(StockHold.objects.count(), 1)
+
+        out = StringIO()
+        call_command("expire_stock_holds", stdout=out)
+        self.assertIn("Deleted 0 expired stock holds", out.getvalue())
+
+    def test_checkout_turns_holds_into_the_decrement(self):
+        first, second = self.make_cart(), self.make_cart()
+        first.add(self.product, 2)
+        second.add(self.product, 3)
+        # A buyer without a hold cannot take held units.
+        with self.assertRaises(OutOfStock):
+            decrement_stock([(self.product.id, 1)])
+
+        place_order(first, self.user)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 3)
+        self.assertEqual(list(StockHold.objects.values_list("holder", flat=True)), [second.holder])
+        place_order(second, self.user)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 0)
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_cart_add_view_reports_short_stock(self):
+        self.make_cart().add(self.product, 4)
+        response = self.client.post(reverse("cart:cart_add", args=[self.product.id]), {"quantity": 2}, secure=True,
+                                    follow=True)
+        self.assertContains(response, "not enough Product 0 is left in stock")
+        response = self.client.post(reverse("cart:cart_api"), {"ops": [{"op": "add", "product_id": self.product.id}]},
+                                    content_type="application/json", secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.available(), 0)
+
+    def test_login_holds_the_merged_saved_cart(self):
+        saved = SavedCart.objects.create(user=self.user)
+        CartItem.objects.create(cart=saved, product=self.product, quantity=3)
+        CartItem.objects.create(cart=saved, product=self.other, quantity=2)
+        elsewhere = self.make_cart()
+        elsewhere.add(self.product, 4)
+        self.client.post(reverse("cart:cart_add", args=[self.other.id]), secure=True)
+
+        self.client.post(reverse("accounts:login"), {"username": "buyer", "password": "x"}, secure=True)
+        holds = StockHold.objects.exclude(holder=elsewhere.holder).values_list("product_id", "quantity")
+        self.assertEqual(dict(holds), {self.product.id: 1, self.other.id: 3})
+        response = self.client.get(reverse("cart:cart_detail"), secure=True)
+        self.assertContains(response, "not enough Product 0 is left in stock")
+        self.assertEqual([line.quantity for line in response.context["cart_items"]], [1, 3])
+
+    def test_cart_api_reports_short_stock(self):
+        self.make_cart().add(self.product, 5)
+        response = self.client.post(reverse("cart:cart_api"), {"ops": [{"op": "add", "product_id": self.product.id}]},
+                                    content_type="application/json", secure=True)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["out_of_stock"], [self.product.id])
+        self.assertContains(self.client.get(reverse("cart:cart_detail"), secure=True),
+                            "not enough Product 0 is left in stock")
+
+
+class StockConcurrencyTests(TransactionTestCase):
+    """
+    Many threads race for a few units; every unit sold must be accounted
+    for by exactly one order and stock must never go negative.
+    """
+    threads = 12
+    stock = 5
+
+    def test_no_oversell_under_contention(self):
+        products = make_products(2, stock=self.stock)
+        users = [User.objects.create(username=f"buyer{i}") for i in range(self.threads)]
+        barrier = threading.Barrier(self.threads)
+        outcomes = []
+
+        def buy(user):
+            request = RequestFactory().get("/")
+            request.session = SessionStore()
+            cart = Cart(request)
+            # Half the buyers add the products in reverse order.
+            for product in (products if user.pk % 2 else products[::-1]):
+                cart.add(product, quantity=1)
+            barrier.wait()
+            try:
+                place_order(cart, user)
+                outcomes.append("sold")
+            except OutOfStock:
+                outcomes.append("short")
+            except OperationalError:
+                outcomes.append("locked")
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=buy, args=(user,)) for user in users]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        sold = outcomes.count("sold")
+        self.assertEqual(len(outcomes), self.threads)
+        self.assertEqual(Order.objects.count(), sold)
+        self.assertEqual(sold, self.stock)
+        for product in Product.objects.all():
+            self.assertEqual(product.stock, self.stock - sold)
+            self.assertEqual(OrderItem.objects.filter(product=product).count(), sold)
+
+
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buyer", email="buyer@example.com", password="x")
+        self.products = make_products(3)
+        request = RequestFactory().get("/")
+        request.session = SessionStore()
+        cart = Cart(request)
+        for product in self.products:
+            cart.add(product)
+        self.order = place_order(cart, self.user)
+
+    def test_worker_sends_queued_email(self):
+        out = StringIO()
+        call_command("send_order_emails", stdout=out)
+        self.assertIn("Sent 1 emails", out.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["buyer@example.com"])
+        self.assertIn("Product 2", mail.outbox[0].alternatives[0][0])
+        email = self.order.emails.get()
+        self.assertEqual((email.status, email.attempts), (OrderEmail.SENT, 1))
+        self.assertIsNotNone(email.sent_at)
+
+    def test_one_email_per_order_event(self):
+        for _ in range(3):
+            self.order.status = Order.SHIPPED
+            self.order.save()
+        queue_order_email(self.order, OrderEmail.PLACED)
+        self.assertEqual(
+            sorted(self.order.emails.values_list("event", flat=True)),
+            [OrderEmail.PLACED, OrderEmail.SHIPPED],
+        )
+        send_batch()
+        send_batch()
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_batch_shares_one_connection(self):
+        for i in range(3):
+            order = Order.objects.create(user=self.user)
+            order.status = Order.SHIPPED
+            order.save()
+        with mock.patch("django.core.mail.backends.locmem.EmailBackend.open") as opened:
+            with self.assertNumQueries(5):  # due ids, claim, claimed emails, their items, bulk_update
+                sent, failed = send_batch()
+        self.assertEqual((sent, failed), (7, 0))
+        self.assertEqual(opened.call_count, 1)
+
+    def test_overlapping_batches_send_each_email_once(self):
+        for i in range(3):
+            Order.objects.create(user=self.user)
+        send = EmailMessage.send
+        overlapping = []
+
+        def send_while_another_batch_runs(message, *args, **kwargs):
+            if not overlapping:
+                overlapping.append(send_batch())
+            return send(message, *args, **kwargs)
+
+        with mock.patch("django.core.mail.EmailMessage.send", autospec=True, side_effect=send_while_another_batch_runs):
+            self.assertEqual(send_batch(), (4, 0))
+        self.assertEqual(overlapping, [(0, 0)])
+        self.assertEqual(len(mail.outbox), 4)
+
+    def test_claimed_emails_are_not_sent_twice(self):
+        now = timezone.now()
+        claimed = claim_emails(10, now)
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(claim_emails(10, now), [])
+        self.assertEqual(send_batch(), (0, 0))
+        # A worker that died mid-batch leaves its claim to expire.
+        self.assertEqual(len(claim_emails(10, now + CLAIM_TIMEOUT)), 1)
+
+    def test_failures_back_off_then_give_up(self):
+        with mock.patch("django.core.mail.EmailMessage.send", side_effect=ConnectionError("down")):
+            self.assertEqual(send_batch(max_attempts=2), (0, 1))
+            email = self.order.emails.get()
+            self.assertEqual((email.status, email.attempts), (OrderEmail.PENDING, 1))
+            self.assertIn("down", email.last_error)
+            self.assertGreater(email.next_attempt_at, timezone.now())
+
+            # Not due yet.
+            self.assertEqual(send_batch(max_attempts=2), (0, 0))
+            OrderEmail.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(send_batch(max_attempts=2), (0, 1))
+        self.assertEqual(self.order.emails.get().status, OrderEmail.FAILED)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_backoff_is_exponential_and_capped(self):
+        self.assertEqual([backoff(n).total_seconds() for n in (1, 2, 3)], [60, 120, 240])
+        self.assertEqual(backoff(20), BACKOFF_MAX)
+
+
+class InvoiceTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, INVOICE_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user("buyer", email="buyer@example.com", password="x")
+        request = RequestFactory().get("/")
+        request.session = SessionStore()
+        cart = Cart(request)
+        for product in make_products(2):
+            cart.add(product)
+        self.order = place_order(cart, self.user)
+        self.url = reverse("orders:generate_invoice_pdf", args=[self.order.id])
+        self.client.force_login(self.user)
+
+    def download(self, **headers):
+        return self.client.get(self.url, secure=True, headers=headers)
+
+    def test_rendered_once_then_served_from_storage(self):
+        with mock.patch("orders.invoices.html_to_pdf", wraps=html_to_pdf) as convert:
+            first = self.download()
+            second = self.download()
+        self.assertEqual(convert.call_count, 1)
+        self.assertEqual(first["Content-Type"], "application/pdf")
+        self.assertEqual(first["ETag"], second["ETag"])
+        body = b"".join(first.streaming_content)
+        self.assertTrue(body.startswith(b"%PDF"))
+        name = f"invoices/{self.order.id}/{first['ETag'].strip(chr(34))}.pdf"
+        self.assertTrue(default_storage.exists(name))
+
+    def test_if_none_match_returns_304(self):
+        etag = self.download()["ETag"]
+        with mock.patch("orders.invoices.html_to_pdf") as convert:
+            response = self.download(if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        convert.assert_not_called()
+
+    def test_changed_invoice_gets_new_file(self):
+        etag = self.download()["ETag"]
+        self.order.items.update(quantity=5)
+        response = self.download(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(default_storage.listdir(f"invoices/{self.order.id}")[1]), 1)
+
+    def test_status_change_prerenders(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.status = Order.PAID
+            self.order.save()
+        self.assertEqual(len(default_storage.listdir(f"invoices/{self.order.id}")[1]), 1)
+        with mock.patch("orders.invoices.html_to_pdf") as convert:
+            self.assertEqual(self.download().status_code, 200)
+        convert.assert_not_called()
+
+    def test_only_status_changes_prerender(self):
+        order = Order.objects.get(pk=self.order.pk)
+        with mock.patch("orders.signals.schedule_invoice") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                order.cod_confirmed = True
+                order.save()
+                order.status = Order.PAID
+                order.save()
+                order.save()
+        schedule.assert_called_once_with(order.pk)
+
+    def test_other_customers_cannot_download(self):
+        self.client.force_login(User.objects.create_user("other", password="x"))
+        self.assertEqual(self.download().status_code, 404)
+
+    def test_confirmation_is_private(self):
+        url = reverse("orders:order_confirmation", args=[self.order.id])
+        self.assertContains(self.client.get(url, secure=True), f"{self.order.id}")
+        self.client.force_login(User.objects.create_user("other", password="x"))
+        self.assertEqual(self.client.get(url, secure=True).status_code, 404)
+        self.client.force_login(User.objects.create_user("support", password="x", is_staff=True))
+        self.assertEqual(self.client.get(url, secure=True).status_code, 200)
+        self.client.logout()
+        self.assertEqual(self.client.get(url, secure=True).status_code, 302)
+
+
+class InvoiceExportTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, INVOICE_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user("buyer", password="x")
+        products = make_products(2)
+        self.orders = []
+        for i in range(4):
+            request = RequestFactory().get("/")
+            request.session = SessionStore()
+            cart = Cart(request)
+            cart.add(products[i % 2], quantity=i + 1)
+            self.orders.append(place_order(cart, self.user))
+        Order.objects.filter(pk=self.orders[0].pk).update(status=Order.PAID)
+        self.staff = User.objects.create_user("finance", password="x", is_staff=True)
+        self.url = reverse("orders:export_invoices")
+
+    def export(self, **params):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, params, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+
+    def test_zip_contains_every_matching_invoice(self):
+        archive = self.export()
+        self.assertEqual(
+            archive.namelist(), [f"invoice_{order.pk}.pdf" for order in self.orders]
+        )
+        self.assertTrue(archive.read(archive.namelist()[0]).startswith(b"%PDF"))
+
+    def test_filters(self):
+        self.assertEqual(len(self.export(status=Order.PAID).namelist()), 1)
+        today = timezone.localdate()
+        self.assertEqual(len(self.export(start=today, end=today).namelist()), 4)
+        self.assertEqual(len(self.export(start=today + timedelta(days=1)).namelist()), 0)
+
+    def test_cached_pdfs_are_reused(self):
+        with mock.patch("orders.invoices.html_to_pdf", wraps=html_to_pdf) as convert:
+            self.export()
+            self.export()
+        self.assertEqual(convert.call_count, 4)
+
+    def test_failed_invoice_does_not_cut_off_the_archive(self):
+        bad = self.orders[1]
+
+        def convert(html):
+            if f"Invoice #{bad.pk}<" in html:
+                raise PDFError("xhtml2pdf reported 1 error(s)")
+            return html_to_pdf(html)
+
+        with mock.patch("orders.invoices.html_to_pdf", side_effect=convert), \
+                self.assertLogs("orders.invoices", "ERROR"):
+            archive = self.export()
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(
+            archive.namelist(),
+            [f"invoice_{order.pk}.pdf" for order in self.orders if order != bad] + [ERRORS_NAME],
+        )
+        self.assertIn(f"invoice_{bad.pk}.pdf", archive.read(ERRORS_NAME).decode())
+
+    def test_invalid_range_and_permissions(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.url, secure=True).status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, {"start": "2025-02-01", "end": "2025-01-01"}, secure=True)
+        self.assertEqual(response.status_code, 400)
+
+    def test_errors_are_not_reflected_as_html(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, {"status": "<script>alert(1)</script>"}, secure=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+
+    def test_web_export_workers_are_capped(self):
+        with mock.patch("orders.exports.os.cpu_count", return_value=64):
+            self.assertEqual(request_workers(), 0)
+            with override_settings(INVOICE_WORKERS=2):
+                self.assertEqual(request_workers(), 2)
+                self.assertEqual(export_workers(), 64)
+
+    def test_command_renders_in_process_pool(self):
+        output = os.path.join(tempfile.mkdtemp(), "invoices.zip")
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        out = StringIO()
+        call_command("export_invoices", output, "--workers=2", stdout=out)
+        self.assertIn("Exported 4 invoices", out.getvalue())
+        with zipfile.ZipFile(output) as archive:
+            self.assertEqual(len(archive.namelist()), 4)
+            self.assertIsNone(archive.testzip())
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("buyer", password="x")
+        self.products = make_products(2, price="10.00")
+
+    def order(self, quantity=1, status=Order.PENDING):
+        request = RequestFactory().get("/")
+        request.session = SessionStore()
+        cart = Cart(request)
+        cart.add(self.products[0], quantity=quantity)
+        cart.add(self.products[1])
+        return place_order(cart, self.user, status=status)
+
+    def today(self):
+        return DailySales.objects.filter(date=timezone.localdate()).first()
+
+    def assertToday(self, orders, units, revenue):
+        row = self.today()
+        self.assertEqual((row.order_count, row.units, row.revenue), (orders, units, Decimal(revenue)))
+
+    def test_pending_orders_are_not_sales(self):
+        self.order()
+        self.assertIsNone(self.today())
+
+    def test_status_transitions(self):
+        order = self.order(quantity=2)  # 30.00 + 10 shipping + 3 tax
+        order.status = Order.PAID
+        order.save()
+        self.assertToday(1, 3, "43.00")
+        order.status = Order.SHIPPED
+        order.save()
+        order.save()
+        self.assertToday(1, 3, "43.00")
+        order.status = Order.CANCELED
+        order.save()
+        self.assertToday(0, 0, "0.00")
+
+    def test_reloaded_order_and_total_change(self):
+        order = self.order()
+        Order.objects.get(pk=order.pk).save()
+        order = Order.objects.get(pk=order.pk)
+        order.status = Order.COMPLETED
+        order.save()
+        order = Order.objects.get(pk=order.pk)
+        order.total_price = Decimal("50.00")
+        order.save()
+        self.assertToday(1, 2, "50.00")
+        order.delete()
+        self.assertToday(0, 0, "0.00")
+
+    def test_order_placed_as_paid_counts_units(self):
+        self.order(quantity=3, status=Order.PAID)
+        self.assertToday(1, 4, "54.00")
+
+    def test_rebuild_matches_incremental(self):
+        for quantity in (1, 2, 3):
+            order = self.order(quantity=quantity)
+            order.status = Order.PAID
+            order.save()
+        self.order(quantity=5)
+        incremental = [(r.date, r.order_count, r.units, r.revenue) for r in DailySales.objects.all()]
+        DailySales.objects.update(order_count=0, units=0, revenue=0)
+        call_command("rebuild_sales_rollup", stdout=StringIO())
+        rebuilt = [(r.date, r.order_count, r.units, r.revenue) for r in DailySales.objects.all()]
+        self.assertEqual(rebuilt, incremental)
+        self.assertEqual(rebuilt[0][1:], (3, 9, Decimal("129.00")))
+
+    def test_trend_fills_empty_days(self):
+        today = timezone.localdate()
+        DailySales.objects.create(date=today - timedelta(days=2), order_count=2, units=5, revenue=Decimal("40.00"))
+        trend = sales_trend(7, today)
+        self.assertEqual([row.date for row in trend][-1], today)
+        self.assertEqual([row.order_count for row in trend], [0, 0, 0, 0, 2, 0, 0])
+        self.assertEqual(summarize(trend).average_order_value, Decimal("20.00"))
+
+
+class SalesAnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = make_products(2, price="10.00")
+        other = Category.objects.create(name="Garden")
+        Product.objects.filter(pk=self.products[1].pk).update(category=other)
+        self.users = [User.objects.create(username=f"customer{i}") for i in range(4)]
+
+    def order(self, user, when, quantities=(1, 0), status=Order.PAID):
+        order = Order.objects.create(user=user, status=status, total_price=Decimal("10.00") * sum(quantities))
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=quantity, price=Decimal("10.00"))
+            for product, quantity in zip(self.products, quantities) if quantity
+        ])
+        Order.objects.filter(pk=order.pk).update(created_at=when)
+        return order
+
+    def test_metrics(self):
+        jan, feb, mar = (timezone.make_aware(datetime(2026, month, 10)) for month in (1, 2, 3))
+        a, b, c, d = self.users
+        self.order(a, jan)
+        self.order(a, feb, (0, 2))
+        self.order(a, mar)
+        self.order(b, jan, (3, 1))
+        self.order(c, feb)
+        self.order(d, feb, status=Order.PENDING)
+
+        result = compute_analytics(now=timezone.make_aware(datetime(2026, 4, 1)))
+        self.assertEqual(result["customers"], 3)
+        self.assertEqual(result["orders"], 5)
+        self.assertEqual(result["repeat_purchase_rate"], round(1 / 3, 4))
+        self.assertEqual(
+            [(c["cohort"], c["customers"], c["retention"][:3]) for c in result["cohorts"]],
+            [("2026-01", 2, [1.0, 0.5, 0.5]), ("2026-02", 1, [1.0, 0.0, 0.0])],
+        )
+        self.assertEqual(result["revenue_by_category"], [
+            {"category": "Test", "revenue": 60.0, "units": 6},
+            {"category": "Garden", "revenue": 30.0, "units": 3},
+        ])
+        segments = {s["segment"]: s["customers"] for s in result["rfm_segments"]}
+        self.assertEqual(sum(segments.values()), 3)
+
+    def test_streams_rows_without_model_instances(self):
+        self.order(self.users[0], timezone.now())
+        with mock.patch.object(Order, "from_db", side_effect=AssertionError), \
+                mock.patch.object(OrderItem, "from_db", side_effect=AssertionError):
+            self.assertEqual(len(load_orders()), 1)
+            self.assertEqual(len(load_lines()), 1)
+
+    def test_cached_until_orders_change(self):
+        self.order(self.users[0], timezone.now())
+        self.assertEqual(sales_analytics()["orders"], 1)
+        with self.assertNumQueries(0):
+            sales_analytics()
+        self.order(self.users[1], timezone.now())
+        self.assertEqual(sales_analytics()["orders"], 2)
+
+    def test_no_sales(self):
+        result = compute_analytics()
+        self.assertEqual(result["cohorts"], [])
+        self.assertEqual(result["rfm_segments"], [])
+        self.assertEqual(result["repeat_purchase_rate"], 0.0)
@@ -3,15 +3,19 @@ from django.conf import settings
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse
-from decimal import Decimal
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
 import stripe
-from xhtml2pdf import pisa
-from django.template.loader import render_to_string, get_template
 
-from cart.cart import Cart
-from .models import Order, OrderItem, ShippingAddress
-from .utils import send_order_email
+from cart.cart import Cart, check_prices
+from products.inventory import OutOfStock
+from .exports import export_orders, request_workers, stream_invoice_zip
+from .forms import InvoiceExportForm
+from .invoices import get_invoice, invoice_orders
+from .models import Order, ShippingAddress
+from .pdf import PDFError
+from .services import EmptyCartError, place_order
 
 # -------------------- PAYMENT KEYS --------------------
 stripe.api_key = settings.STRIPE_SECRET_KEY
@@ -25,25 +29,15 @@ def checkout(request):
 
     addresses = ShippingAddress.objects.filter(user=request.user) if request.user.is_authenticated else []
 
-    cart_items = []
-    subtotal = Decimal("0.00")
-    for item in cart:
-        product = item["product"]
-        quantity = item["quantity"]
-        line_total = product.price * quantity
-        cart_items.append({"product": product, "quantity": quantity, "line_total": line_total})
-        subtotal += line_total
-
-    shipping_fee = Decimal("10.00") if subtotal > 0 else Decimal("0.00")
-    tax = subtotal * Decimal("0.10")
-    total_price = subtotal + shipping_fee + tax
+    check_prices(request, cart)
+    pricing = cart.pricing()
 
     return render(request, "orders/checkout.html", {
-        "cart_items": cart_items,
-        "subtotal": subtotal,
-        "shipping_fee": shipping_fee,
-        "tax": tax,
-        "total_price": total_price,
+        "cart_items": pricing.lines,
+        "subtotal": pricing.subtotal,
+        "shipping_fee": pricing.shipping,
+        "tax": pricing.tax,
+        "total_price": pricing.total,
         "addresses": addresses,
         "STRIPE_PUBLIC_KEY": settings.STRIPE_PUBLIC_KEY
     })
@@ -63,14 +57,17 @@ def create_checkout_session(request):
     if not cart or len(cart) == 0:
         messages.error(request, "Your cart is empty.")
         return redirect("cart:cart_detail")
+    # Charge only prices the shopper has seen.
+    if check_prices(request, cart):
+        return redirect("orders:checkout")
 
     line_items = [{
         'price_data': {
             'currency': 'usd',
-            'product_data': {'name': item['product'].name},
-            'unit_amount': int(item['product'].price * 100),
+            'product_data': {'name': item.product.name},
+            'unit_amount': int(item.price * 100),
         },
-        'quantity': item['quantity'],
+        'quantity': item.quantity,
     } for item in cart]
 
     session = stripe.checkout.Session.create(
@@ -91,58 +88,55 @@ def cod_checkout(request):
         messages.warning(request, "Your cart is empty.")
         return redirect("cart:cart_detail")
 
+    # Charge only prices the shopper has seen.
+    if check_prices(request, cart):
+        return redirect("orders:checkout")
+
     shipping_address_id = request.session.get("shipping_address_id")
     shipping_address = get_object_or_404(ShippingAddress, id=shipping_address_id) if shipping_address_id else None
 
-    subtotal = sum(item['product'].price * item['quantity'] for item in cart)
-    shipping_fee = Decimal("10.00") if subtotal > 0 else Decimal("0.00")
-    tax = subtotal * Decimal("0.10")
-    total_price = subtotal + shipping_fee + tax
-
-    order = Order.objects.create(
-        user=request.user,
-        shipping_address=shipping_address,
-        subtotal=subtotal,
-        shipping_fee=shipping_fee,
-        tax_amount=tax,
-        total_price=total_price,
-        status=Order.PENDING,
-        payment_method=Order.COD
-    )
-
-    for item in cart:
-        OrderItem.objects.create(
-            order=order,
-            product=item['product'],
-            quantity=item['quantity'],
-            price=item['product'].price
-        )
+    try:
+        order = place_order(cart, request.user, shipping_address, payment_method=Order.COD)
+    except EmptyCartError:
+        messages.warning(request, "Your cart is empty.")
+        return redirect("cart:cart_detail")
+    except OutOfStock as exc:
+        names = ", ".join(line.product.name for line in cart if line.product.id in exc.product_ids)
+        messages.error(request, f"Sorry, we don't have enough stock for: {names}.")
+        return redirect("cart:cart_detail")
 
     cart.clear()
-    send_order_email(order, "orders/emails/order_placed.html", "Your Order has been Placed!")
     messages.success(request, "Order placed! Please pay on delivery.")
     return redirect("orders:checkout_success")
 
 # -------------------- ORDER CONFIRMATION --------------------
+@login_required
 def order_confirmation(request, order_id):
-    order = get_object_or_404(Order, id=order_id)
+    # Customers see their own orders; staff can open any.
+    orders = invoice_orders() if request.user.is_staff else invoice_orders().filter(user=request.user)
+    order = get_object_or_404(orders, id=order_id)
     return render(request, "orders/order_confirmation.html", {"order": order})
 
 # -------------------- DOWNLOAD INVOICE --------------------
 def generate_invoice_pdf(request, order_id):
-    order = get_object_or_404(Order, id=order_id, user=request.user)
-    template_path = 'orders/invoice.html'
-    context = {'order': order}
-
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="invoice_{order.id}.pdf"'
-
-    template = get_template(template_path)
-    html = template.render(context)
-    pisa_status = pisa.CreatePDF(html, dest=response)
-
-    if pisa_status.err:
-        return HttpResponse('Error generating PDF <pre>' + html + '</pre>')
+    order = get_object_or_404(invoice_orders(), id=order_id, user=request.user)
+    try:
+        invoice = get_invoice(order)
+    except PDFError:
+        return HttpResponse("Error generating PDF", status=500)
+
+    not_modified = get_conditional_response(request, etag=invoice.etag)
+    if not_modified is not None:
+        return not_modified
+
+    response = FileResponse(
+        default_storage.open(invoice.name),
+        as_attachment=True,
+        filename=f"invoice_{order.id}.pdf",
+        content_type="application/pdf",
+    )
+    response["ETag"] = invoice.etag
+    response["Cache-Control"] = "private, no-cache"
     return response
 
 # -------------------- ADMIN UPDATE ORDER STATUS --------------------
@@ -156,6 +150,25 @@ def update_order_status(request, order_id, status):
         order.save()
     return redirect("admin:orders_order_change", order.id)
 
+# -------------------- BULK INVOICE EXPORT --------------------
+@staff_member_required
+def export_invoices(request):
+    """
+    ZIP of invoices, filtered by ?start=YYYY-MM-DD&end=YYYY-MM-DD&status=...
+    """
+    form = InvoiceExportForm(request.GET)
+    if not form.is_valid():
+        # Errors echo the submitted values, so never send them as HTML.
+        return HttpResponseBadRequest(form.errors.as_text(), content_type="text/plain; charset=utf-8")
+
+    start = form.cleaned_data["start"] or "all"
+    end = form.cleaned_data["end"] or "all"
+    response = StreamingHttpResponse(
+        stream_invoice_zip(export_orders(form), workers=request_workers()), content_type="application/zip"
+    )
+    response["Content-Disposition"] = f'attachment; filename="invoices_{start}_{end}.zip"'
+    return response
+
 # Optional: orders home redirect
 def orders_home(request):
     return redirect('orders:checkout')
@@ -1,9 +1,32 @@
 # products/context_processors.py
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from core.cache import get_version
 from .models import Category
 
+CATEGORY_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_categories(version=None):
+    """
+    Category list for the navigation, cached under the current version.
+    """
+    if version is None:
+        version = get_version("categories")
+    key = f"products:categories:{version}"
+    categories = cache.get(key)
+    if categories is None:
+        categories = list(Category.objects.all())
+        cache.set(key, categories, CATEGORY_CACHE_TIMEOUT)
+    return categories
+
+
 def categories(request):
+    # The navbar fragment is cached under the same version, so on a warm
+    # cache the list itself is never even loaded.
+    version = get_version("categories")
     return {
-        'categories': Category.objects.all()
+        'categories': SimpleLazyObject(lambda: get_categories(version)),
+        'categories_version': version,
     }
-
-
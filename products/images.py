@@ -0,0 +1,143 @@
+# products/images.py
+"""
+Resized JPEG and WebP derivatives of product images.
+
+Originals stay untouched; derivatives live next to them under
+``products/derived/`` in the default storage (MEDIA_ROOT). Generation
+runs in a small thread pool (Pillow releases the GIL while resizing and
+encoding) so saving a product in the admin never waits for it.
+"""
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Widths in pixels; the aspect ratio is preserved.
+SIZES = {
+    "thumb": 160,
+    "card": 400,
+    "large": 800,
+}
+FORMATS = {
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+}
+DERIVED_DIR = "derived"
+WIDTH_CACHE_KEY = "products:image-width:{}"
+# EXIF orientations that turn the image on its side.
+ROTATED = {5, 6, 7, 8}
+
+_executor = None
+
+
+def derivative_name(name, width, ext):
+    """
+    products/shoe.png -> products/derived/shoe-png_400w.webp
+    """
+    directory, filename = posixpath.split(name)
+    stem = filename.replace(".", "-")
+    return posixpath.join(directory, DERIVED_DIR, f"{stem}_{width}w.{ext}")
+
+
+def has_derivatives(name, storage=default_storage):
+    return bool(name) and storage.exists(derivative_name(name, SIZES["thumb"], "webp"))
+
+
+def generate_derivatives(name, force=False, storage=default_storage):
+    """
+    Write every size/format of ``name``. Returns the number of files written.
+    """
+    if not name or not storage.exists(name):
+        return 0
+
+    with storage.open(name, "rb") as fh:
+        original = ImageOps.exif_transpose(Image.open(fh))
+        original.load()
+    cache.set(WIDTH_CACHE_KEY.format(name), original.width, None)
+
+    written = 0
+    for width in SIZES.values():
+        image = original
+        if original.width > width:
+            height = round(original.height * width / original.width)
+            image = original.resize((width, height), Image.Resampling.LANCZOS)
+        for ext, (fmt, options) in FORMATS.items():
+            target = derivative_name(name, width, ext)
+            if storage.exists(target):
+                if not force:
+                    continue
+                storage.delete(target)
+            mode = "RGB" if fmt == "JPEG" else ("RGBA" if "A" in image.getbands() else "RGB")
+            buffer = BytesIO()
+            image.convert(mode).save(buffer, fmt, **options)
+            storage.save(target, ContentFile(buffer.getvalue()))
+            written += 1
+    return written
+
+
+def generate_or_log(name, force=False):
+    try:
+        return generate_derivatives(name, force=force)
+    except Exception:
+        logger.exception("Could not generate derivatives for %s", name)
+        return 0
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.PRODUCT_IMAGE_WORKERS), thread_name_prefix="product-images"
+        )
+    return _executor
+
+
+def schedule_derivatives(name, force=False):
+    """
+    Queue derivative generation; runs inline when PRODUCT_IMAGE_WORKERS is 0.
+    """
+    if settings.PRODUCT_IMAGE_WORKERS <= 0:
+        return generate_or_log(name, force)
+    return get_executor().submit(generate_or_log, name, force)
+
+
+def original_width(name, storage=default_storage):
+    """
+    Upright width of the original in pixels, or None if it is gone. Kept
+    in the cache by generate_derivatives(); only the header is read on a
+    miss.
+    """
+    key = WIDTH_CACHE_KEY.format(name)
+    width = cache.get(key)
+    if width is None:
+        try:
+            with storage.open(name, "rb") as fh:
+                image = Image.open(fh)
+                width, height = image.size
+                if image.getexif().get(0x0112) in ROTATED:
+                    width = height
+        except OSError:
+            return None
+        cache.set(key, width, None)
+    return width
+
+
+def srcset(name, ext, storage=default_storage):
+    """
+    ``url 160w, url 400w, ...`` with the widths the files really have:
+    originals are never upscaled, so sizes wider than the original hold a
+    copy of it and only the first of those is listed.
+    """
+    limit = original_width(name, storage) or max(SIZES.values())
+    files = {}
+    for width in SIZES.values():
+        files.setdefault(min(width, limit), derivative_name(name, width, ext))
+    return ", ".join(f"{storage.url(target)} {width}w" for width, target in files.items())
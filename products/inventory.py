@@ -0,0 +1,169 @@
+# products/inventory.py
+"""
+Stock bookkeeping for checkout.
+
+Stock is never read, adjusted in Python and written back: the decrement
+is a conditional ``UPDATE ... SET stock = stock - n WHERE stock >= n``,
+so two buyers racing for the last unit cannot both get it.
+
+With STOCK_HOLDS on, adding to a cart also holds the units for
+STOCK_HOLD_SECONDS (a StockHold row per cart and product). Available stock
+is stock minus other carts' unexpired holds, checkout converts the cart's
+holds into the decrement in the same transaction, and
+expire_holds() (the expire_stock_holds command) deletes expired rows.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product, StockHold
+
+EXPIRE_BATCH_SIZE = 1000
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_ids):
+        self.product_ids = list(product_ids)
+        super().__init__(f"Not enough stock for products {self.product_ids}")
+
+
+def _quantities(lines):
+    quantities = Counter()
+    for product_id, quantity in lines:
+        quantities[int(product_id)] += int(quantity)
+    return quantities
+
+
+def _held_by_others(holder, now):
+    # Sum of the product's unexpired holds other than ``holder``'s, for use
+    # inside a query on Product.
+    holds = StockHold.objects.filter(product=OuterRef("pk"), expires_at__gt=now)
+    if holder:
+        holds = holds.exclude(holder=holder)
+    total = holds.order_by().values("product").annotate(total=Sum("quantity")).values("total")
+    return Coalesce(Subquery(total, output_field=IntegerField()), 0)
+
+
+def _lock(products, using):
+    if connections[using].features.has_select_for_update:
+        list(products.select_for_update().order_by("pk").values_list("pk", flat=True))
+
+
+def available_stock(product_ids, holder=None, using="default"):
+    """
+    {product id: stock less other carts' active holds} in one query.
+    """
+    products = Product.objects.using(using).filter(pk__in=product_ids).order_by()
+    if settings.STOCK_HOLDS:
+        products = products.annotate(held=_held_by_others(holder, timezone.now()))
+    else:
+        products = products.annotate(held=Value(0))
+    return {pk: stock - held for pk, stock, held in products.values_list("pk", "stock", "held")}
+
+
+def short_products(lines, using="default", holder=None):
+    """
+    Ids of the products in ``lines`` whose available stock cannot cover the
+    quantity.
+    """
+    quantities = _quantities(lines)
+    available = available_stock(quantities, holder, using)
+    return sorted(pk for pk, quantity in quantities.items() if available.get(pk, 0) < quantity)
+
+
+def hold_stock(holder, quantities, using="default"):
+    """
+    Set ``holder``'s holds to ``quantities`` ({product id: quantity}; 0
+    releases) and restart the expiry of all its holds. Raises OutOfStock,
+    changing nothing, if any product lacks the available stock.
+    """
+    wanted = {pk: quantity for pk, quantity in quantities.items() if quantity > 0}
+    released = [pk for pk, quantity in quantities.items() if quantity <= 0]
+    expires_at = timezone.now() + timedelta(seconds=settings.STOCK_HOLD_SECONDS)
+    holds = StockHold.objects.using(using)
+    with transaction.atomic(using=using):
+        if wanted:
+            # Serialize holds and checkouts on the same products.
+            _lock(Product.objects.using(using).filter(pk__in=wanted), using)
+            available = available_stock(wanted, holder, using)
+            short = sorted(pk for pk, quantity in wanted.items() if available.get(pk, 0) < quantity)
+            if short:
+                raise OutOfStock(short)
+            holds.bulk_create(
+                [StockHold(holder=holder, product_id=pk, quantity=quantity, expires_at=expires_at)
+                 for pk, quantity in wanted.items()],
+                update_conflicts=True, unique_fields=["holder", "product"], update_fields=["quantity", "expires_at"],
+            )
+        if released:
+            holds.filter(holder=holder, product_id__in=released).delete()
+        holds.filter(holder=holder).update(expires_at=expires_at)
+
+
+def release_holds(holder, using="default"):
+    StockHold.objects.using(using).filter(holder=holder).delete()
+
+
+def expire_holds(batch_size=EXPIRE_BATCH_SIZE, using="default"):
+    """
+    Delete holds that have expired, ``batch_size`` rows per DELETE, and
+    return how many went. Each batch commits on its own so the sweeper
+    never holds long locks.
+    """
+    now = timezone.now()
+    holds = StockHold.objects.using(using)
+    deleted = 0
+    while True:
+        ids = list(holds.filter(expires_at__lte=now).values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        # Nothing points at holds, so this is a single DELETE ... WHERE id IN.
+        deleted += holds.filter(pk__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            return deleted
+
+
+def decrement_stock(lines, using="default", holder=None):
+    """
+    Take ``quantity`` units of each ``(product_id, quantity)`` in ``lines``.
+
+    All lines go into one conditional UPDATE, so the cost does not grow
+    with the order. Where the database has row locks, the rows are first
+    locked in product id order so concurrent checkouts that share products
+    cannot deadlock. If any product is short nothing is taken and
+    OutOfStock is raised. Call it inside the order's transaction so a
+    later failure gives the stock back too.
+
+    With STOCK_HOLDS on, other carts' active holds are left alone and
+    ``holder``'s holds are deleted along with the decrement.
+    """
+    quantities = _quantities(lines)
+    if not quantities:
+        return
+    ids = sorted(quantities)
+    products = Product.objects.using(using).filter(pk__in=ids)
+
+    try:
+        with transaction.atomic(using=using):
+            _lock(products, using)
+
+            held = _held_by_others(holder, timezone.now()) if settings.STOCK_HOLDS else Value(0)
+            enough = Q()
+            for pk in ids:
+                enough |= Q(pk=pk, stock__gte=held + quantities[pk])
+            updated = products.filter(enough).update(stock=Case(
+                *(When(pk=pk, then=F("stock") - quantities[pk]) for pk in ids),
+                default=F("stock"),
+                output_field=Product._meta.get_field("stock"),
+            ))
+            if updated != len(ids):
+                raise OutOfStock(ids)
+            if settings.STOCK_HOLDS and holder:
+                release_holds(holder, using)
+    except OutOfStock:
+        # The savepoint is gone, so stock is back to what the UPDATE saw.
+        raise OutOfStock(short_products(quantities.items(), using, holder) or ids) from None
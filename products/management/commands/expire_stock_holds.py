@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.inventory import EXPIRE_BATCH_SIZE, expire_holds
+
+
+class Command(BaseCommand):
+    help = "Delete expired cart stock holds in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=EXPIRE_BATCH_SIZE)
+        parser.add_argument("--loop", action="store_true", help="Keep sweeping instead of exiting.")
+        parser.add_argument("--interval", type=float, default=60.0, help="Seconds between sweeps with --loop.")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            total += expire_holds(options["batch_size"])
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {total} expired stock holds."))
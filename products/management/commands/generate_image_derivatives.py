@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from products.images import generate_or_log, get_executor
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnail and WebP derivatives for existing product images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Regenerate files that already exist.")
+
+    def handle(self, *args, **options):
+        names = (
+            Product.objects.exclude(image="").exclude(image__isnull=True)
+            .order_by().values_list("image", flat=True).distinct()
+        )
+        executor = get_executor()
+        written = sum(executor.map(lambda name: generate_or_log(name, options["force"]), names.iterator()))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} derivative files."))
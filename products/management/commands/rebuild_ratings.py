@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute rating_sum, rating_count and avg_rating for every product from its reviews."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = rebuild_ratings()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt ratings for {updated} products."))
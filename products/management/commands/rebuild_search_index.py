@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index (e.g. after bulk imports that bypass signals)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        products = Product.objects.using(using).only("id", "name", "description")
+        get_backend(using).rebuild(using, products.iterator())
+        self.stdout.write(self.style.SUCCESS(f"Indexed {products.count()} products."))
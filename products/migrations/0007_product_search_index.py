@@ -0,0 +1,27 @@
+from django.db import migrations
+
+from products.search import get_backend
+
+
+def create_search_index(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    alias = schema_editor.connection.alias
+    backend = get_backend(alias)
+    backend.create_index(schema_editor, Product)
+    backend.rebuild(alias, Product.objects.using(alias).only("id", "name", "description"))
+
+
+def drop_search_index(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    get_backend(schema_editor.connection.alias).drop_index(schema_editor, Product)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_alter_wishlist_product_alter_wishlist_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
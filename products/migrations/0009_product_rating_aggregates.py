@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:49
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_ratings(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    Review = apps.get_model("products", "Review")
+    alias = schema_editor.connection.alias
+    reviews = Review.objects.using(alias).filter(product=OuterRef("pk")).order_by().values("product")
+    Product.objects.using(alias).update(
+        rating_sum=Coalesce(Subquery(reviews.annotate(v=Sum("rating")).values("v")), 0),
+        rating_count=Coalesce(Subquery(reviews.annotate(v=Count("id")).values("v")), 0),
+        avg_rating=Coalesce(
+            Subquery(reviews.annotate(v=Avg("rating")).values("v")), Value(0),
+            output_field=models.DecimalField(max_digits=3, decimal_places=2),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='avg_rating',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
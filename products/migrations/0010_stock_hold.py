@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('holder', models.CharField(max_length=32)),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'expires_at'], name='stock_hold_product_expiry_idx'), models.Index(fields=['expires_at'], name='stock_hold_expiry_idx')],
+                'constraints': [models.UniqueConstraint(fields=('holder', 'product'), name='stock_hold_unique_product')],
+            },
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
 from accounts.models import User
@@ -35,8 +35,32 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Review aggregates, maintained by products.ratings
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    avg_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination keys (see products.pagination)
+            models.Index(fields=["created_at", "id"], name="product_created_id_idx"),
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+        ]
+
+    # Fields that decide which listings a product appears in, and where
+    LISTING_FIELDS = ("category_id", "available", "price", "name", "description")
+    # Fields that decide what a cart is charged
+    PRICE_FIELDS = ("price", "discount_price")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the listing state the page cache saw and the prices carts
+        # saw (see products.signals).
+        instance._listed = tuple(instance.__dict__.get(field) for field in cls.LISTING_FIELDS)
+        instance._priced = tuple(instance.__dict__.get(field) for field in cls.PRICE_FIELDS)
+        return instance
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -48,14 +72,16 @@ class Product(models.Model):
 
     def average_rating(self):
         """Returns average rating from related reviews"""
-        reviews = self.reviews.all()
-        if reviews.exists():
-            return round(sum(r.rating for r in reviews) / reviews.count(), 1)
-        return 0
+        return round(self.avg_rating, 1)
 
     def review_count(self):
         """Returns total number of reviews"""
-        return self.reviews.count()
+        return self.rating_count
+
+    @property
+    def sale_price(self):
+        """What a cart is charged: discount_price when set, else price"""
+        return self.discount_price or self.price
 
     @property
     def discount_percent(self):
@@ -75,6 +101,31 @@ class ProductVariant(models.Model):
         return f"{self.product.name} - {self.name}: {self.value}"
 
 
+class StockHold(models.Model):
+    """
+    Units of a product set aside for one cart until ``expires_at`` (see
+    products.inventory). Only used when STOCK_HOLDS is on.
+    """
+    product = models.ForeignKey(Product, related_name="holds", on_delete=models.CASCADE)
+    holder = models.CharField(max_length=32)  # the cart's hold key
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["holder", "product"], name="stock_hold_unique_product"),
+        ]
+        indexes = [
+            # Active holds per product, summed into available stock
+            models.Index(fields=["product", "expires_at"], name="stock_hold_product_expiry_idx"),
+            # The sweeper's expired-hold scan
+            models.Index(fields=["expires_at"], name="stock_hold_expiry_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} × {self.product_id} for {self.holder}"
+
+
 class Review(models.Model):
     product = models.ForeignKey(Product, related_name="reviews", on_delete=models.CASCADE)
     user = models.ForeignKey(User, related_name="reviews", on_delete=models.CASCADE)
@@ -87,6 +138,18 @@ class Review(models.Model):
     class Meta:
         ordering = ["-created_at"]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the product aggregates currently include.
+        instance._counted = (instance.__dict__.get("product_id"), instance.__dict__.get("rating"))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The review row and the product aggregates commit together.
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.user.username} - {self.product.name} ({self.rating})"
 
@@ -0,0 +1,133 @@
+# products/pagination.py
+"""
+Keyset (seek) pagination for product listings.
+
+Instead of COUNT(*) + OFFSET, each page is fetched with a WHERE clause on
+the last row's sort key, e.g. ``(created_at, id) < (:created_at, :id)``,
+so page 5000 costs the same as page 1. Cursors are signed, opaque tokens.
+"""
+from django.core import signing
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+CURSOR_SALT = "products.pagination.cursor"
+
+# sort name -> ((field, descending), ...); id is the tie-breaker.
+KEYSET_ORDERINGS = {
+    "newest": (("created_at", True), ("id", True)),
+    "price_low": (("price", False), ("id", False)),
+    "price_high": (("price", True), ("id", True)),
+}
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @cached_property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], "next")
+
+    @cached_property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], "prev")
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` by the keyset named ``sort`` (see KEYSET_ORDERINGS).
+
+    ``count`` is only queried if something reads it.
+    """
+
+    def __init__(self, queryset, per_page, sort="newest"):
+        self.sort = sort
+        self.keys = KEYSET_ORDERINGS[sort]
+        self.queryset = queryset
+        self.per_page = per_page
+        self.fields = [queryset.model._meta.get_field(name) for name, _ in self.keys]
+
+    @cached_property
+    def count(self):
+        return self.queryset.count()
+
+    def ordering(self, reverse=False):
+        return [
+            f"{name}" if descending == reverse else f"-{name}"
+            for name, descending in self.keys
+        ]
+
+    def encode_cursor(self, obj, direction):
+        values = [field.value_to_string(obj) for field in self.fields]
+        return signing.dumps({"s": self.sort, "d": direction, "v": values}, salt=CURSOR_SALT)
+
+    def decode_cursor(self, token):
+        try:
+            payload = signing.loads(token, salt=CURSOR_SALT)
+            if payload["s"] != self.sort or payload["d"] not in ("next", "prev"):
+                raise InvalidCursor(token)
+            values = [field.to_python(v) for field, v in zip(self.fields, payload["v"], strict=True)]
+        except (signing.BadSignature, KeyError, TypeError, ValueError) as exc:
+            raise InvalidCursor(token) from exc
+        return payload["d"], values
+
+    def seek(self, values, reverse):
+        """
+        Build ``(k1, k2, ...) > (v1, v2, ...)`` (or < for descending keys)
+        as nested ORs, which every database can use with a composite index.
+        """
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.keys, values):
+            lookup = "lt" if descending != reverse else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def page(self, cursor=None):
+        """
+        Return the page after (or before) ``cursor``; the first page if it
+        is missing. Raises InvalidCursor for tampered or foreign tokens.
+        """
+        direction, values = ("next", None)
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+
+        reverse = direction == "prev"
+        queryset = self.queryset.order_by(*self.ordering(reverse))
+        if values is not None:
+            queryset = queryset.filter(self.seek(values, reverse))
+
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+            return KeysetPage(rows, self, has_next=True, has_previous=more)
+        return KeysetPage(rows, self, has_next=more, has_previous=values is not None)
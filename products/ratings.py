@@ -0,0 +1,48 @@
+# products/ratings.py
+"""
+Denormalized review aggregates on Product (rating_sum, rating_count,
+avg_rating), so listings and detail pages read ratings without touching
+the reviews table.
+"""
+from django.db.models import Avg, Case, Count, DecimalField, F, FloatField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Now
+
+from .models import Product, Review
+
+AVG_FIELD = DecimalField(max_digits=3, decimal_places=2)
+
+
+def adjust_rating(product_id, sum_delta, count_delta, using="default"):
+    """
+    Apply a review delta with a single UPDATE. Every expression reads the
+    pre-update row, so concurrent reviews never lose each other's changes.
+    updated_at moves too, so the product's Last-Modified covers its rating.
+    """
+    new_sum = F("rating_sum") + sum_delta
+    new_count = F("rating_count") + count_delta
+    Product.objects.using(using).filter(pk=product_id).update(
+        rating_sum=new_sum,
+        rating_count=new_count,
+        updated_at=Now(),
+        avg_rating=Case(
+            When(rating_count__lte=-count_delta, then=Value(0)),
+            default=Cast(Cast(new_sum, FloatField()) / new_count, AVG_FIELD),
+            output_field=AVG_FIELD,
+        ),
+    )
+
+
+def rebuild_ratings(products=None):
+    """
+    Recompute the aggregates from the reviews table in one UPDATE.
+    """
+    if products is None:
+        products = Product.objects.all()
+    reviews = Review.objects.using(products.db).filter(product=OuterRef("pk")).order_by().values("product")
+    return products.update(
+        rating_sum=Coalesce(Subquery(reviews.annotate(v=Sum("rating")).values("v")), 0),
+        rating_count=Coalesce(Subquery(reviews.annotate(v=Count("id")).values("v")), 0),
+        avg_rating=Coalesce(
+            Subquery(reviews.annotate(v=Avg("rating")).values("v")), Value(0), output_field=AVG_FIELD
+        ),
+    )
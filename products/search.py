@@ -0,0 +1,172 @@
+# products/search.py
+"""
+Full-text product search.
+
+The backend is picked from the database engine the queryset runs on:
+SQLite uses an FTS5 table kept in sync by signals (see products.signals),
+PostgreSQL uses a weighted SearchVector backed by a GIN index, and any
+other engine falls back to icontains.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "products_product_fts"
+GIN_INDEX_NAME = "products_product_search_gin"
+SEARCH_CONFIG = "english"
+
+_token_re = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(query):
+    return _token_re.findall(query or "")
+
+
+class SearchBackend:
+    """
+    Substring search for engines without a full-text backend. Subclasses
+    override search() and the index maintenance hooks.
+    """
+
+    def search(self, queryset, tokens):
+        condition = Q()
+        for token in tokens:
+            condition &= Q(name__icontains=token) | Q(description__icontains=token)
+        return queryset.filter(condition)
+
+    def create_index(self, schema_editor, model):
+        pass
+
+    def drop_index(self, schema_editor, model):
+        pass
+
+    def rebuild(self, using, products):
+        pass
+
+    def index_product(self, using, product):
+        pass
+
+    def remove_product(self, using, product_id):
+        pass
+
+
+class SQLiteSearch(SearchBackend):
+    """
+    FTS5 backend. Results are annotated with ``search_rank`` (bm25, lower
+    is better) and ordered by it.
+    """
+
+    def match_expression(self, tokens):
+        # Quote every term so user input can never be read as FTS syntax,
+        # and prefix-match the last one for search-as-you-type.
+        terms = ['"%s"' % token.replace('"', "") for token in tokens]
+        terms[-1] += "*"
+        return " ".join(terms)
+
+    def search(self, queryset, tokens):
+        match = self.match_expression(tokens)
+        table = queryset.model._meta.db_table
+        matching_ids = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,))
+        rank = RawSQL(
+            f"SELECT rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id",
+            (match,),
+        )
+        return queryset.filter(id__in=matching_ids).annotate(search_rank=rank).order_by("search_rank")
+
+    # Index maintenance -------------------------------------------------
+
+    def create_index(self, schema_editor, model):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5(name, description, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def drop_index(self, schema_editor, model):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+    def rebuild(self, using, products):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)",
+                ((p.id, p.name, p.description or "") for p in products),
+            )
+
+    def index_product(self, using, product):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.id])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)",
+                [product.id, product.name, product.description or ""],
+            )
+
+    def remove_product(self, using, product_id):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+
+
+class PostgresSearch(SearchBackend):
+    """
+    SearchVector backend; name matches weigh more than description matches.
+    The vector expression is shared with the GIN index so the planner can
+    use it; PostgreSQL keeps the index current on its own.
+    """
+
+    @staticmethod
+    def vector():
+        from django.contrib.postgres.search import SearchVector
+
+        return (
+            SearchVector("name", weight="A", config=SEARCH_CONFIG)
+            + SearchVector("description", weight="B", config=SEARCH_CONFIG)
+        )
+
+    def search(self, queryset, tokens):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        query = SearchQuery(" ".join(tokens), config=SEARCH_CONFIG, search_type="websearch")
+        vector = self.vector()
+        return (
+            queryset.annotate(search_document=vector)
+            .filter(search_document=query)
+            .annotate(search_rank=SearchRank(vector, query))
+            .order_by("-search_rank")
+        )
+
+    def gin_index(self):
+        from django.contrib.postgres.indexes import GinIndex
+
+        return GinIndex(self.vector(), name=GIN_INDEX_NAME)
+
+    def create_index(self, schema_editor, model):
+        schema_editor.add_index(model, self.gin_index())
+
+    def drop_index(self, schema_editor, model):
+        schema_editor.remove_index(model, self.gin_index())
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearch,
+    "postgresql": PostgresSearch,
+}
+
+
+def get_backend(using="default"):
+    """
+    Return the search backend for the given database alias, chosen from
+    its DATABASES ENGINE.
+    """
+    return BACKENDS.get(connections[using].vendor, SearchBackend)()
+
+
+def search_products(queryset, query):
+    """
+    Filter ``queryset`` down to products matching ``query``, best match
+    first. An explicit order_by() afterwards overrides the ranking.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.none()
+    return get_backend(queryset.db).search(queryset, tokens)
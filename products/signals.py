@@ -0,0 +1,125 @@
+# products/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from core.cache import bump_version
+from .images import has_derivatives, schedule_derivatives
+from .models import Category, Product, ProductVariant, Review
+from .ratings import adjust_rating, rebuild_ratings
+from .search import get_backend
+
+SEARCH_FIELDS = {"name", "description"}
+
+
+def invalidate_pages(using, *tags):
+    """
+    Bump the version counters behind ``tags`` once the change commits.
+    """
+    transaction.on_commit(lambda: [bump_version(tag) for tag in tags], using=using)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, using, update_fields=None, **kwargs):
+    """
+    Keep the full-text index in step with product name/description.
+    """
+    if update_fields and not SEARCH_FIELDS & set(update_fields):
+        return
+    get_backend(using).index_product(using, instance)
+
+
+@receiver(post_save, sender=Product)
+def queue_image_derivatives(sender, instance, update_fields=None, **kwargs):
+    """
+    Build thumbnails/WebP for a new upload once the save has committed.
+    """
+    if update_fields and "image" not in update_fields:
+        return
+    name = instance.image.name
+    if name and not has_derivatives(name, instance.image.storage):
+        transaction.on_commit(lambda: schedule_derivatives(name))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, using, **kwargs):
+    get_backend(using).remove_product(using, instance.pk)
+
+
+@receiver(post_save, sender=Review)
+def count_review(sender, instance, created, using, **kwargs):
+    """
+    Fold a new or edited review into its product's rating aggregates.
+    """
+    previous = getattr(instance, "_counted", None)
+    ids = {instance.product_id} | ({previous[0]} if previous and previous[0] else set())
+    if created:
+        adjust_rating(instance.product_id, instance.rating, 1, using)
+    elif previous is None or None in previous:
+        # We don't know what was counted before; recompute from scratch.
+        rebuild_ratings(Product.objects.using(using).filter(pk__in=ids))
+    else:
+        old_product_id, old_rating = previous
+        if old_product_id != instance.product_id:
+            adjust_rating(old_product_id, -old_rating, -1, using)
+            adjust_rating(instance.product_id, instance.rating, 1, using)
+        elif old_rating != instance.rating:
+            adjust_rating(instance.product_id, instance.rating - old_rating, 0, using)
+    instance._counted = (instance.product_id, instance.rating)
+    invalidate_pages(using, "reviews", *(f"product:{pk}" for pk in ids))
+
+
+@receiver(post_delete, sender=Review)
+def uncount_review(sender, instance, using, **kwargs):
+    product_id, rating = getattr(instance, "_counted", (instance.product_id, instance.rating))
+    adjust_rating(product_id, -rating, -1, using)
+    invalidate_pages(using, "reviews", f"product:{product_id}")
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_categories(sender, using, **kwargs):
+    invalidate_pages(using, "categories")
+
+
+# Page cache tags (see core.pagecache) ---------------------------------
+
+
+@receiver(post_save, sender=Product)
+def invalidate_product_pages(sender, instance, created, using, **kwargs):
+    """
+    Pages showing the product go stale. Listings only go stale when the
+    product may have joined, left or moved within them.
+    """
+    listed = tuple(getattr(instance, field) for field in Product.LISTING_FIELDS)
+    previous = getattr(instance, "_listed", None)
+    tags = [f"product:{instance.pk}"]
+    if created or listed != previous:
+        tags += ["listing:all", f"listing:category:{instance.category_id}"]
+        if previous and previous[0] != instance.category_id:
+            tags.append(f"listing:category:{previous[0]}")
+    instance._listed = listed
+    invalidate_pages(using, *tags)
+
+
+@receiver(post_save, sender=Product)
+def bump_prices(sender, instance, created, using, **kwargs):
+    """
+    Carts recheck their price snapshots when "prices" moves (see
+    cart.cart.Cart.revalidate). New products are in no cart yet.
+    """
+    priced = tuple(getattr(instance, field) for field in Product.PRICE_FIELDS)
+    if not created and priced != getattr(instance, "_priced", None):
+        invalidate_pages(using, "prices")
+    instance._priced = priced
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_deleted_product_pages(sender, instance, using, **kwargs):
+    invalidate_pages(using, f"product:{instance.pk}", "listing:all", f"listing:category:{instance.category_id}")
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def invalidate_variant_pages(sender, instance, using, **kwargs):
+    invalidate_pages(using, f"product:{instance.product_id}")
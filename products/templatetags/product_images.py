@@ -0,0 +1,43 @@
+# products/templatetags/product_images.py
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from products.images import SIZES, derivative_name, has_derivatives, srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_srcset(image, ext="webp"):
+    """
+    srcset for an image's derivatives, e.g. ``a_160w.webp 160w, ...``.
+    Falls back to the original until the derivatives exist.
+    """
+    if not image:
+        return ""
+    if not has_derivatives(image.name, image.storage):
+        return image.url
+    return srcset(image.name, ext, image.storage)
+
+
+@register.simple_tag
+def product_picture(image, alt="", size="card", sizes="100vw", **attrs):
+    """
+    <picture> with a WebP source and a JPEG fallback, both with srcset.
+
+    {% product_picture product.image alt=product.name size="thumb" sizes="64px" class="w-16 h-16" %}
+    """
+    if not image:
+        return ""
+    attrs.setdefault("loading", "lazy")
+    if not has_derivatives(image.name, image.storage):
+        return format_html('<img src="{}" alt="{}"{}>', image.url, alt, flatatt(attrs))
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}"{}></picture>',
+        srcset(image.name, "webp", image.storage), sizes,
+        image.storage.url(derivative_name(image.name, SIZES[size], "jpg")),
+        srcset(image.name, "jpg", image.storage), sizes,
+        alt, flatatt(attrs),
+    )
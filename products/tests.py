@@ -1,3 +1,519 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from PIL import Image
+
+from accounts.models import User
+from core.pagecache import page_key
+from . import images
+from .models import Category, Product, ProductVariant, Review
+from .pagination import InvalidCursor, KeysetPaginator
+from .search import search_products
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Phones")
+        cls.phone = cls.make("Mobile phone", "A fast handset with a great camera")
+        cls.case = cls.make("Phone case", "Leather cover for your mobile")
+        cls.lamp = cls.make("Desk lamp", "Warm light for reading")
+
+    @classmethod
+    def make(cls, name, description, price="10.00"):
+        return Product.objects.create(
+            category=cls.category, name=name, description=description,
+            price=Decimal(price), image="products/test.jpg",
+        )
+
+    def search(self, query):
+        return list(search_products(Product.objects.all(), query))
+
+    def test_matches_name_and_description(self):
+        self.assertCountEqual(self.search("mobile"), [self.phone, self.case])
+        self.assertEqual(self.search("reading"), [self.lamp])
+
+    def test_prefix_and_multiple_terms(self):
+        self.assertEqual(self.search("camera hand"), [self.phone])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.lamp.name = "Reading lamp with camera mount"
+        self.lamp.save()
+        self.assertIn(self.lamp, self.search("mount"))
+        self.lamp.delete()
+        self.assertEqual(self.search("mount"), [])
+
+    def test_syntax_characters_are_harmless(self):
+        self.assertEqual(self.search('"phone" (*'), self.search("phone"))
+        self.assertEqual(self.search("!!!"), [])
+
+    def test_rebuild_command_indexes_bulk_created_rows(self):
+        Product.objects.bulk_create([
+            Product(category=self.category, name="Bulk kettle", slug="bulk-kettle",
+                    price=Decimal("5.00"), image="products/test.jpg"),
+        ])
+        self.assertEqual(self.search("kettle"), [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual([p.name for p in self.search("kettle")], ["Bulk kettle"])
+
+    def test_product_list_search_with_sort(self):
+        response = self.client.get(
+            reverse("products:product_list"), {"q": "phone", "sort": "price_low"}, secure=True
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertCountEqual(response.context["products"].object_list, [self.phone, self.case])
+
+    def test_ranked_search_pages_past_the_offset_cap(self):
+        url = reverse("products:product_list")
+        response = self.client.get(url, {"q": "phone", "page": 11}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context["cursor_pagination"])
+        # Sorted results have cursors, so deep page numbers still stop there.
+        response = self.client.get(url, {"q": "phone", "sort": "newest", "page": 11}, secure=True)
+        self.assertEqual(response.status_code, 404)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Bulk")
+        prices = [Decimal("5.00"), Decimal("7.50"), Decimal("7.50"), Decimal("12.00")]
+        Product.objects.bulk_create([
+            Product(category=category, name=f"Item {i}", slug=f"item-{i}",
+                    price=prices[i % len(prices)], image="products/test.jpg")
+            for i in range(30)
+        ])
+
+    def walk(self, sort):
+        paginator = KeysetPaginator(Product.objects.all(), 7, sort)
+        seen, cursor = [], None
+        while True:
+            with self.assertNumQueries(1):
+                page = paginator.page(cursor)
+                seen.extend(p.id for p in page)
+            if not page.has_next():
+                return seen, page
+            cursor = page.next_cursor
+
+    def test_cursor_walk_matches_full_ordering(self):
+        for sort, ordering in (("newest", ("-created_at", "-id")),
+                               ("price_low", ("price", "id")),
+                               ("price_high", ("-price", "-id"))):
+            seen, _ = self.walk(sort)
+            expected = list(Product.objects.order_by(*ordering).values_list("id", flat=True))
+            self.assertEqual(seen, expected, sort)
+
+    def test_previous_cursor_returns_prior_page(self):
+        paginator = KeysetPaginator(Product.objects.all(), 7, "price_low")
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        back = paginator.page(second.previous_cursor)
+        self.assertEqual([p.id for p in back], [p.id for p in first])
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_foreign_or_tampered_cursor_rejected(self):
+        cursor = KeysetPaginator(Product.objects.all(), 7, "newest").page().next_cursor
+        with self.assertRaises(InvalidCursor):
+            KeysetPaginator(Product.objects.all(), 7, "price_low").page(cursor)
+        with self.assertRaises(InvalidCursor):
+            KeysetPaginator(Product.objects.all(), 7, "newest").page(cursor + "x")
+
+    def test_product_list_modes(self):
+        url = reverse("products:product_list")
+        response = self.client.get(url, secure=True)
+        self.assertTrue(response.context["cursor_pagination"])
+        cursor = response.context["products"].next_cursor
+        response = self.client.get(url, {"cursor": cursor}, secure=True)
+        self.assertEqual(len(response.context["products"].object_list), 12)
+
+        response = self.client.get(url, {"page": 2}, secure=True)
+        self.assertFalse(response.context["cursor_pagination"])
+        self.assertEqual(response.context["products"].number, 2)
+
+        self.assertEqual(self.client.get(url, {"page": 5000}, secure=True).status_code, 404)
+        self.assertEqual(self.client.get(url, {"cursor": "junk"}, secure=True).status_code, 404)
+
+
+class RatingAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Rated")
+        cls.product = Product.objects.create(
+            category=category, name="Rated thing", price=Decimal("3.00"), image="products/test.jpg"
+        )
+        cls.other = Product.objects.create(
+            category=category, name="Other thing", price=Decimal("3.00"), image="products/test.jpg"
+        )
+        cls.users = [User.objects.create_user(f"reviewer{i}", password="x") for i in range(3)]
+
+    def assertAggregates(self, product, rating_sum, rating_count, avg):
+        product.refresh_from_db()
+        self.assertEqual((product.rating_sum, product.rating_count), (rating_sum, rating_count))
+        self.assertEqual(product.avg_rating, Decimal(avg))
+
+    def test_create_update_delete(self):
+        r1 = Review.objects.create(product=self.product, user=self.users[0], rating=5)
+        r2 = Review.objects.create(product=self.product, user=self.users[1], rating=4)
+        Review.objects.create(product=self.product, user=self.users[2], rating=4)
+        self.assertAggregates(self.product, 13, 3, "4.33")
+
+        r2.rating = 1
+        r2.save()
+        self.assertAggregates(self.product, 10, 3, "3.33")
+
+        reloaded = Review.objects.get(pk=r1.pk)
+        reloaded.product = self.other
+        reloaded.save()
+        self.assertAggregates(self.product, 5, 2, "2.50")
+        self.assertAggregates(self.other, 5, 1, "5.00")
+
+        Review.objects.filter(product=self.product).delete()
+        self.assertAggregates(self.product, 0, 0, "0")
+
+    def test_rebuild_command(self):
+        Review.objects.create(product=self.product, user=self.users[0], rating=2)
+        Product.objects.update(rating_sum=99, rating_count=99, avg_rating=Decimal("1.00"))
+        call_command("rebuild_ratings", stdout=StringIO())
+        self.assertAggregates(self.product, 2, 1, "2.00")
+        self.assertAggregates(self.other, 0, 0, "0")
+
+    def test_detail_reads_stored_aggregates(self):
+        for user in self.users:
+            Review.objects.create(product=self.product, user=user, rating=3)
+        url = reverse("products:product_detail", args=[self.product.slug])
+        response = self.client.get(url, secure=True)
+        self.assertEqual(response.context["review_count"], 3)
+        self.assertEqual(response.context["avg_rating"], Decimal("3.0"))
+
+
+class CategoryNavigationCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        Category.objects.create(name="Garden")
+
+    def render_nav(self):
+        request = self.factory.get("/")
+        request.user = AnonymousUser()
+        request.session = {}
+        return render_to_string("core/base.html", request=request)
+
+    def test_warm_cache_runs_no_category_queries(self):
+        self.assertIn("Garden", self.render_nav())
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIn("Garden", self.render_nav())
+        self.assertFalse([q for q in queries if "products_category" in q["sql"]])
+
+    def test_category_changes_bump_version(self):
+        self.render_nav()
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Kitchen")
+        self.assertIn("Kitchen", self.render_nav())
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.get(name="Garden").delete()
+        self.assertNotIn("Garden", self.render_nav())
+
+    def test_version_is_bumped_only_on_commit(self):
+        self.render_nav()
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Kitchen")
+            # A request racing the transaction keeps the old version, so it
+            # cannot cache the old navigation under the new one.
+            self.assertNotIn("Kitchen", self.render_nav())
+        self.assertIn("Kitchen", self.render_nav())
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Lamps")
+        cls.product = Product.objects.create(
+            category=cls.category, name="Desk lamp", price=Decimal("5.00"), image="products/test.jpg"
+        )
+        cls.user = User.objects.create_user("lamp-fan", password="x")
+
+    def setUp(self):
+        cache.clear()
+        self.urls = [
+            reverse("products:product_list"),
+            reverse("products:product_list_by_category", args=[self.category.slug]),
+            reverse("products:product_detail", args=[self.product.slug]),
+            reverse("core:home"),
+        ]
+
+    def test_anonymous_pages_are_shareable(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, secure=True)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response["ETag"])
+                self.assertTrue(response["Last-Modified"])
+                self.assertIn("public", response["Cache-Control"])
+                self.assertIn("max-age=60", response["Cache-Control"])
+                self.assertIn("Cookie", response["Vary"])
+                self.assertNotIn("csrftoken", response.cookies)
+                self.assertContains(response, 'name="csrfmiddlewaretoken" value=""')
+                self.assertContains(response, reverse("core:personal"))
+
+    def test_matching_etag_returns_304_without_rendering(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url, secure=True)["ETag"]
+                cache.delete(page_key(RequestFactory().get(url)))  # only the validator query runs
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, secure=True, headers={"if-none-match": etag})
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.templates, [])
+                self.assertEqual(response["ETag"], etag)
+
+    def test_last_modified_returns_304(self):
+        url = self.urls[2]
+        last_modified = self.client.get(url, secure=True)["Last-Modified"]
+        response = self.client.get(url, secure=True, headers={"if-modified-since": last_modified})
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_move_the_etag(self):
+        url = self.urls[2]
+        etags = [self.client.get(url, secure=True)["ETag"]]
+
+        self.product.price = Decimal("6.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        etags.append(self.client.get(url, secure=True)["ETag"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.product, user=self.user, rating=5)
+        etags.append(self.client.get(url, secure=True)["ETag"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Desks")
+        etags.append(self.client.get(url, secure=True)["ETag"])
+        self.assertEqual(len(set(etags)), 4)
+
+    def test_variant_edit_moves_the_etag(self):
+        url = self.urls[2]
+        with self.captureOnCommitCallbacks(execute=True):
+            variant = ProductVariant.objects.create(product=self.product, name="Size", value="Large")
+        etag = self.client.get(url, secure=True)["ETag"]
+        variant.additional_price = Decimal("2.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            variant.save()
+        response = self.client.get(url, secure=True, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_logged_in_pages_stay_private(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.urls[0], secure=True)
+        self.assertNotIn("ETag", response)
+        self.assertIn("private", response["Cache-Control"])
+        self.assertNotContains(response, 'name="csrfmiddlewaretoken" value=""')
+
+    def test_personal_fragment(self):
+        session = self.client.session
+        session["cart"] = {str(self.product.id): {"quantity": 3, "price": "5.00"}}
+        session.save()
+        response = self.client.get(reverse("core:personal"), secure=True)
+        data = response.json()
+        self.assertEqual(data["cart_item_count"], 3)
+        self.assertTrue(data["csrf_token"])
+        self.assertIn("no-cache", response["Cache-Control"])
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.lamps = Category.objects.create(name="Lamps")
+        cls.desks = Category.objects.create(name="Desks")
+        cls.lamp = Product.objects.create(
+            category=cls.lamps, name="Desk lamp", price=Decimal("5.00"), image="products/test.jpg"
+        )
+        cls.desk = Product.objects.create(
+            category=cls.desks, name="Standing desk", price=Decimal("90.00"), image="products/test.jpg"
+        )
+        cls.user = User.objects.create_user("critic", password="x")
+
+    def setUp(self):
+        cache.clear()
+        self.lamp_url = reverse("products:product_detail", args=[self.lamp.slug])
+        self.desk_url = reverse("products:product_detail", args=[self.desk.slug])
+        self.lamps_url = reverse("products:product_list_by_category", args=[self.lamps.slug])
+        self.desks_url = reverse("products:product_list_by_category", args=[self.desks.slug])
+        self.all_url = reverse("products:product_list")
+
+    def warm(self, *urls):
+        for url in urls:
+            self.client.get(url, secure=True)
+
+    def cached(self, url):
+        return self.client.get(url, secure=True).get("X-Page-Cache") == "hit"
+
+    def test_hit_runs_no_queries(self):
+        self.assertEqual(self.client.get(self.lamp_url, secure=True)["X-Page-Cache"], "miss")
+        with self.assertNumQueries(0):
+            response = self.client.get(self.lamp_url, secure=True)
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertContains(response, "Desk lamp")
+        self.assertTrue(response["ETag"])
+        self.assertIn("public", response["Cache-Control"])
+
+        response = self.client.get(self.lamp_url, secure=True, headers={"if-none-match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+    def test_query_string_is_normalized(self):
+        self.warm(self.all_url + "?sort=price_low&q=")
+        self.assertTrue(self.cached(self.all_url + "?sort=price_low"))
+        self.assertFalse(self.cached(self.all_url + "?sort=price_high"))
+
+    def test_product_edit_invalidates_only_its_pages(self):
+        self.warm(self.lamp_url, self.desk_url, self.lamps_url, self.desks_url, self.all_url)
+        self.lamp.discount_price = Decimal("4.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lamp.save()
+        self.assertFalse(self.cached(self.lamp_url))
+        self.assertFalse(self.cached(self.lamps_url))  # shows the lamp
+        self.assertFalse(self.cached(self.all_url))
+        self.assertTrue(self.cached(self.desk_url))
+        self.assertTrue(self.cached(self.desks_url))
+
+    def test_new_product_invalidates_its_listings(self):
+        self.warm(self.lamp_url, self.lamps_url, self.desks_url, self.all_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(category=self.desks, name="Desk mat", price=Decimal("9.00"), image="products/test.jpg")
+        self.assertFalse(self.cached(self.desks_url))
+        self.assertFalse(self.cached(self.all_url))
+        self.assertTrue(self.cached(self.lamps_url))
+        self.assertTrue(self.cached(self.lamp_url))
+
+    def test_moving_category_invalidates_both_listings(self):
+        self.warm(self.lamps_url, self.desks_url)
+        lamp = Product.objects.get(pk=self.lamp.pk)
+        lamp.category = self.desks
+        with self.captureOnCommitCallbacks(execute=True):
+            lamp.save()
+        self.assertFalse(self.cached(self.lamps_url))
+        self.assertFalse(self.cached(self.desks_url))
+
+    def test_reviews_and_variants_invalidate_the_product(self):
+        self.warm(self.lamp_url, self.desk_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.lamp, user=self.user, rating=4, comment="Bright")
+        self.assertFalse(self.cached(self.lamp_url))
+        self.assertTrue(self.cached(self.desk_url))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductVariant.objects.create(product=self.desk, name="Color", value="Oak")
+        self.assertFalse(self.cached(self.desk_url))
+        self.assertTrue(self.cached(self.lamp_url))
+
+    def test_category_change_invalidates_every_page(self):
+        self.warm(self.lamp_url, self.desks_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Chairs")
+        self.assertFalse(self.cached(self.lamp_url))
+        self.assertFalse(self.cached(self.desks_url))
+
+    def test_logged_in_users_bypass_the_cache(self):
+        self.warm(self.lamp_url)
+        self.client.force_login(self.user)
+        response = self.client.get(self.lamp_url, secure=True)
+        self.assertNotIn("X-Page-Cache", response)
+        self.assertContains(response, "critic")
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, PRODUCT_IMAGE_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        self.category = Category.objects.create(name="Photos")
+
+    def upload(self, name="shoe.png", size=(1200, 900)):
+        buffer = BytesIO()
+        Image.new("RGB", size, "red").save(buffer, "PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def make_product(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Product.objects.create(
+                category=self.category, name="Shoe", slug="shoe", price=10, image=self.upload()
+            )
+
+    def test_upload_generates_every_size_and_format(self):
+        product = self.make_product()
+        for width in images.SIZES.values():
+            for ext in images.FORMATS:
+                name = images.derivative_name(product.image.name, width, ext)
+                self.assertTrue(default_storage.exists(name), name)
+                with default_storage.open(name) as fh:
+                    self.assertEqual(Image.open(fh).width, width)
+
+    def test_small_originals_are_not_upscaled(self):
+        name = default_storage.save("products/tiny.png", self.upload(size=(100, 50)))
+        images.generate_derivatives(name)
+        with default_storage.open(images.derivative_name(name, 800, "webp")) as fh:
+            self.assertEqual(Image.open(fh).size, (100, 50))
+
+    def test_srcset_lists_real_widths(self):
+        name = default_storage.save("products/narrow.png", self.upload(size=(300, 200)))
+        images.generate_derivatives(name)
+        expected = ", ".join([
+            f"{default_storage.url(images.derivative_name(name, 160, 'webp'))} 160w",
+            f"{default_storage.url(images.derivative_name(name, 400, 'webp'))} 300w",
+        ])
+        self.assertEqual(images.srcset(name, "webp"), expected)
+        cache.clear()  # read back from the original's header
+        self.assertEqual(images.srcset(name, "webp"), expected)
+
+    def test_existing_derivatives_are_skipped_unless_forced(self):
+        product = self.make_product()
+        self.assertEqual(images.generate_derivatives(product.image.name), 0)
+        self.assertEqual(images.generate_derivatives(product.image.name, force=True), 6)
+
+    def test_backfill_command(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            product = Product.objects.create(
+                category=self.category, name="Shoe", slug="shoe", price=10, image=self.upload()
+            )
+        self.assertFalse(images.has_derivatives(product.image.name))
+        out = StringIO()
+        call_command("generate_image_derivatives", stdout=out)
+        self.assertTrue(images.has_derivatives(product.image.name))
+        self.assertIn("6", out.getvalue())
+
+    def test_picture_tag(self):
+        product = self.make_product()
+        html = render_to_string(
+            "products/category_products.html", {"category": self.category, "products": [product]}
+        )
+        self.assertIn('type="image/webp"', html)
+        self.assertIn("_160w.webp 160w", html)
+        self.assertIn('loading="lazy"', html)
+
+    def test_picture_tag_falls_back_to_original(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            product = Product.objects.create(
+                category=self.category, name="Shoe", slug="shoe", price=10, image=self.upload()
+            )
+        html = render_to_string(
+            "products/category_products.html", {"category": self.category, "products": [product]}
+        )
+        self.assertNotIn("<picture>", html)
+        self.assertIn(f'src="{product.image.url}"', html)
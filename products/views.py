@@ -1,20 +1,54 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import Http404
 from django.core.paginator import Paginator
-from django.db.models import Avg, Count, Q
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 
 from .models import Product, Category, Review, Wishlist, ProductVariant
 from .forms import ReviewForm
+from .inventory import OutOfStock
+from .pagination import KEYSET_ORDERINGS, InvalidCursor, KeysetPage, KeysetPaginator
+from .search import search_products
 from cart.cart import Cart  # make sure your Cart import path is correct
+from core.cache import get_version
+from core.conditional import catalog_etag, conditional_page, listing_validator
+from core.pagecache import cache_anonymous_page, tag_page
+
+PRODUCTS_PER_PAGE = 12
+MAX_OFFSET_PAGE = 10  # deeper page numbers must use cursors
+
+
+# --------------------------
+# Conditional GET validators (see core.conditional)
+# --------------------------
+def listing_state(request, category_slug=None, slug=None):
+    products = Product.objects.filter(available=True)
+    if category_slug or slug:
+        products = products.filter(category__slug=category_slug or slug)
+    return listing_validator(products)
+
+
+def product_state(request, slug):
+    # Variants don't touch the product's updated_at; the product:<id>
+    # version (bumped by products.signals) covers them.
+    product = Product.objects.filter(slug=slug).values_list("pk", "updated_at").first()
+    if product is None:
+        return None, catalog_etag(None, 0)
+    pk, last_modified = product
+    return last_modified, catalog_etag(last_modified, pk, get_version(f"product:{pk}"))
 
 
 # --------------------------
 # Product List (search, filter, sort, pagination)
 # --------------------------
+def listing_tag(category=None):
+    return f"listing:category:{category.pk}" if category else "listing:all"
+
+
+@cache_anonymous_page
+@conditional_page(listing_state)
 def product_list(request, category_slug=None):
     category = None
-    categories = Category.objects.all()
     products = Product.objects.filter(available=True)
 
     # Filter by category
@@ -25,9 +59,7 @@ def product_list(request, category_slug=None):
     # Search filter
     query = request.GET.get("q")
     if query:
-        products = products.filter(
-            Q(name__icontains=query) | Q(description__icontains=query)
-        )
+        products = search_products(products, query)
 
     # Sorting
     sort = request.GET.get("sort")
@@ -38,30 +70,47 @@ def product_list(request, category_slug=None):
     elif sort == "newest":
         products = products.order_by("-created_at")
 
-    # Pagination
-    paginator = Paginator(products, 12)
+    # Pagination: keyset cursors by default; page numbers are still served
+    # for old shallow links, and search results keep their rank order, so
+    # they have no cursor to hand off to and are paged by number throughout.
+    keyset_sort = sort if sort in KEYSET_ORDERINGS else (None if query else "newest")
     page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    next_cursor = None
+
+    if page_number or keyset_sort is None:
+        if keyset_sort and page_number and page_number.isdigit() and int(page_number) > MAX_OFFSET_PAGE:
+            raise Http404("Use cursor links for deep pages.")
+        page_obj = Paginator(products, PRODUCTS_PER_PAGE).get_page(page_number)
+        if keyset_sort and page_obj.has_next() and page_obj.number >= MAX_OFFSET_PAGE:
+            keyset = KeysetPaginator(products, PRODUCTS_PER_PAGE, keyset_sort)
+            next_cursor = keyset.encode_cursor(page_obj.object_list[-1], "next")
+    else:
+        try:
+            page_obj = KeysetPaginator(products, PRODUCTS_PER_PAGE, keyset_sort).page(request.GET.get("cursor"))
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
 
+    tag_page(request, listing_tag(category), *(f"product:{product.pk}" for product in page_obj))
     return render(request, "products/product_list.html", {
         "category": category,
-        "categories": categories,
         "products": page_obj,
+        "cursor_pagination": isinstance(page_obj, KeysetPage),
+        "next_cursor": next_cursor,
     })
 
 
 # --------------------------
 # Product Detail (variants, reviews)
 # --------------------------
+@cache_anonymous_page
+@conditional_page(product_state)
 def product_detail(request, slug):
     product = get_object_or_404(Product, slug=slug)
+    tag_page(request, f"product:{product.pk}")
     variants = ProductVariant.objects.filter(product=product)
 
-    # Reviews
-    all_reviews = Review.objects.filter(product=product)
-    reviews = all_reviews.order_by('-created_at')[:5]
-    avg_rating = all_reviews.aggregate(avg=Avg('rating'))['avg'] or 0
-    review_count = all_reviews.aggregate(count=Count('id'))['count']
+    # Reviews (rating aggregates are stored on the product)
+    reviews = Review.objects.filter(product=product).select_related('user').order_by('-created_at')[:5]
 
     # Calculate discount percentage
     discount_percent = None
@@ -87,8 +136,8 @@ def product_detail(request, slug):
         "product": product,
         "variants": variants,
         "reviews": reviews,
-        "avg_rating": round(avg_rating, 1),
-        "review_count": review_count,
+        "avg_rating": product.average_rating(),
+        "review_count": product.rating_count,
         "review_form": review_form,
         "discount_percent": discount_percent,  # pass discount percent to template
     })
@@ -131,7 +180,11 @@ def remove_from_wishlist(request, item_id):
 def move_to_cart(request, item_id):
     wishlist_item = get_object_or_404(Wishlist, id=item_id, user=request.user)
     cart = Cart(request)
-    cart.add(product=wishlist_item.product, quantity=1, override_quantity=False)
+    try:
+        cart.add(product=wishlist_item.product, quantity=1, override_quantity=False)
+    except OutOfStock:
+        messages.error(request, f"Sorry, {wishlist_item.product.name} is out of stock.")
+        return redirect('products:wishlist')
     wishlist_item.delete()
     messages.success(request, f"{wishlist_item.product.name} moved to cart.")
     return redirect('cart:cart_detail')
@@ -142,15 +195,19 @@ def move_all_to_cart(request):
     """
     Move all wishlist items for the current user to the cart.
     """
-    wishlist_items = Wishlist.objects.filter(user=request.user)
-    if not wishlist_items.exists():
+    wishlist_items = list(Wishlist.objects.filter(user=request.user).select_related("product"))
+    if not wishlist_items:
         messages.info(request, "No items in your wishlist to move.")
         return redirect("products:wishlist")
 
     cart = Cart(request)
-    for item in wishlist_items:
-        cart.add(product=item.product, quantity=1)
-        item.delete()
+    try:
+        cart.update({item.product: cart.lines.get(item.product_id, 0) + 1 for item in wishlist_items})
+    except OutOfStock as exc:
+        names = ", ".join(item.product.name for item in wishlist_items if item.product_id in exc.product_ids)
+        messages.error(request, f"Sorry, these are out of stock: {names}.")
+        return redirect("products:wishlist")
+    Wishlist.objects.filter(pk__in=[item.pk for item in wishlist_items]).delete()
 
     messages.success(request, "All wishlist items have been moved to your cart.")
     return redirect("products:wishlist")
@@ -159,9 +216,12 @@ def move_all_to_cart(request):
 # --------------------------
 # Optional: Category Products
 # --------------------------
+@cache_anonymous_page
+@conditional_page(listing_state)
 def category_products(request, slug):
     category = get_object_or_404(Category, slug=slug)
-    products = Product.objects.filter(category=category, available=True)
+    products = list(Product.objects.filter(category=category, available=True))
+    tag_page(request, listing_tag(category), *(f"product:{product.pk}" for product in products))
     return render(request, 'products/category_products.html', {
         'category': category,
         'products': products